@@ -0,0 +1,189 @@
+"""
+Admission control for the expensive endpoints
+Each embedding runs on the worker's one ONNX thread, so a burst of semantic
+searches used to pile up behind it until uvicorn's limit_concurrency
+connections were all taken, and cheap requests (/books/{id}) were refused
+or timed out along with them. Two checks now run before the handler:
+
+- a per-client token bucket (user id from the bearer token, else client
+  IP): clients over their quota get 429 with Retry-After
+- a per-pool concurrency limit with a bounded wait queue: requests past
+  the queue, or that wait longer than ADMISSION_QUEUE_TIMEOUT_SECONDS, get
+  503 with Retry-After straight away instead of timing out
+
+Both are per worker, like the metrics registry. Queue depth, in-flight
+requests and rejections are exported at /metrics.
+
+    @app.get("/search/semantic", dependencies=[Depends(admission("search"))])
+
+Behind a proxy, request.client is the proxy unless uvicorn trusts its
+X-Forwarded-For (FORWARDED_ALLOW_IPS), so set that or every client shares
+one bucket. The Procfile and render.yaml pass --forwarded-allow-ips.
+"""
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict, deque
+
+import jwt
+from fastapi import HTTPException, Request
+
+from api.auth import ALGORITHM, SECRET_KEY
+from api.metrics import record_rejection, register_gauge, stage
+
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") == "1"
+# A full queue sheds at once; a queued request gives up after this long
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "2"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "1"))
+# Token buckets kept per pool; the least recently seen clients are dropped first
+ADMISSION_MAX_CLIENTS = int(os.getenv("ADMISSION_MAX_CLIENTS", "10000"))
+
+# pool -> (concurrent requests, queued requests, quota tokens per second, quota burst)
+# Override with ADMISSION_<POOL>_CONCURRENCY / _QUEUE / _RATE / _BURST; a rate of 0 turns the quota off.
+# search: one ONNX thread per worker, so more than 2 at once only queue on the model.
+# 2 running + 4 queued leaves 4 of uvicorn's limit_concurrency=10 for everything else.
+POOL_DEFAULTS = {
+    "search": (2, 4, 1.0, 10),
+}
+
+class Rejected(Exception):
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class ConcurrencyLimiter:
+    """At most `limit` requests at once, at most `queue` waiting (FIFO) for a slot
+
+    Runs on the worker's event loop only. A released slot is handed straight
+    to the oldest waiter, so a new arrival cannot jump the queue.
+    """
+
+    def __init__(self, limit: int, queue: int, timeout: float = ADMISSION_QUEUE_TIMEOUT_SECONDS):
+        self.limit = limit
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self):
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        if len(self._waiters) >= self.queue:
+            raise Rejected("queue_full")
+        slot = asyncio.get_running_loop().create_future()
+        self._waiters.append(slot)
+        try:
+            await asyncio.wait_for(asyncio.shield(slot), self.timeout)
+        except asyncio.TimeoutError:
+            if slot.done():
+                # Handed a slot just as the wait timed out
+                return
+            self._waiters.remove(slot)
+            raise Rejected("queue_timeout")
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if slot.done():
+                self.release()
+            else:
+                self._waiters.remove(slot)
+            raise
+
+    def release(self):
+        while self._waiters:
+            slot = self._waiters.popleft()
+            if not slot.done():
+                slot.set_result(None)
+                return
+        self.active -= 1
+
+class TokenBuckets:
+    """Per-client token buckets: `rate` tokens per second, up to `burst`"""
+
+    def __init__(self, rate: float, burst: int, max_clients: int = ADMISSION_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()   # client -> (tokens, last refill, monotonic)
+
+    def take(self, client: str) -> float:
+        """0.0 if the request may go ahead, else seconds until a token is free"""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(client, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[client] = (tokens, now)
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+def client_key(request: Request) -> str:
+    """user:<id> for a valid bearer token, otherwise ip:<address>"""
+    auth = request.headers.get("authorization", "")
+    if auth[:7].lower() == "bearer ":
+        try:
+            user_id = jwt.decode(auth[7:], SECRET_KEY, algorithms=[ALGORITHM]).get("user_id")
+            if user_id is not None:
+                return f"user:{user_id}"
+        except jwt.InvalidTokenError:
+            pass
+    return f"ip:{request.client.host if request.client else 'unknown'}"
+
+class Pool:
+    def __init__(self, name: str):
+        limit, queue, rate, burst = POOL_DEFAULTS.get(name, (4, 8, 0.0, 0))
+        env = lambda key, default: os.getenv(f"ADMISSION_{name.upper()}_{key}", str(default))
+        self.name = name
+        self.limiter = ConcurrencyLimiter(int(env("CONCURRENCY", limit)), int(env("QUEUE", queue)))
+        rate = float(env("RATE", rate))
+        self.quota = TokenBuckets(rate, int(env("BURST", burst))) if rate > 0 else None
+
+_pools = {}
+
+def _rejected(pool: str, reason: str, status: int, retry_after: float):
+    record_rejection(pool, reason)
+    detail = "Too many requests, slow down" if status == 429 else "Server busy, retry shortly"
+    raise HTTPException(status_code=status, detail=detail,
+                        headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+def admission(name: str):
+    """FastAPI dependency admitting a request to pool `name`, or rejecting it with 429 / 503"""
+    pool = _pools.get(name) or _pools.setdefault(name, Pool(name))
+
+    async def admit(request: Request):
+        if not ADMISSION_CONTROL:
+            yield
+            return
+        if pool.quota is not None:
+            wait = pool.quota.take(client_key(request))
+            if wait:
+                _rejected(name, "quota", 429, wait)
+        try:
+            # Time spent queued shows up in Server-Timing
+            with stage("queue"):
+                await pool.limiter.acquire()
+        except Rejected as e:
+            _rejected(name, e.reason, 503, ADMISSION_RETRY_AFTER_SECONDS)
+        try:
+            yield
+        finally:
+            pool.limiter.release()
+
+    return admit
+
+register_gauge("cinelibre_admission_in_flight",
+               lambda: [({"pool": name}, pool.limiter.active) for name, pool in sorted(_pools.items())])
+register_gauge("cinelibre_admission_queue_depth",
+               lambda: [({"pool": name}, pool.limiter.waiting) for name, pool in sorted(_pools.items())])
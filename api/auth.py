@@ -1,8 +1,10 @@
 import os
+import hmac
 import jwt
 import bcrypt
 from datetime import datetime, timedelta
-from fastapi import HTTPException, Security
+from typing import Optional
+from fastapi import HTTPException, Security, Header
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 
@@ -13,6 +15,9 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7  # 7 days
 
+# Shared secret for /admin endpoints; unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
 # Security
 security = HTTPBearer()
 
@@ -57,3 +62,10 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Security(securi
     if user_id is None:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     return {"user_id": user_id, "email": payload.get("email")}
+
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Guard for /admin endpoints: the X-Admin-Token header must match ADMIN_TOKEN"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
@@ -1,7 +1,12 @@
 import os
 import logging
-from supabase import create_client, Client
+import threading
+from typing import TYPE_CHECKING
 from dotenv import load_dotenv
+from api.metrics import TimedClient
+
+if TYPE_CHECKING:
+    from supabase import Client
 
 load_dotenv()
 logger = logging.getLogger(__name__)
@@ -9,17 +14,25 @@ logger = logging.getLogger(__name__)
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-# Initialize Supabase client
-supabase: Client = None
-if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logger.info("Supabase connected successfully")
-    except Exception as e:
-        logger.error(f"Supabase connection error: {e}")
+# Supabase client, created by the first get_db() call.
+# supabase pulls in httpx/postgrest/gotrue, so importing it lazily keeps
+# `import api.main` cheap for tools and tests that never touch the database.
+supabase: "Client" = None
+_lock = threading.Lock()
 
-def get_db() -> Client:
+def get_db() -> "Client":
     """Get database client"""
+    global supabase
+    if supabase is None and SUPABASE_URL and SUPABASE_KEY:
+        with _lock:
+            if supabase is None:
+                try:
+                    from supabase import create_client
+                    # Queries through the proxy are reported as the "db" stage of the request
+                    supabase = TimedClient(create_client(SUPABASE_URL, SUPABASE_KEY))
+                    logger.info("Supabase connected successfully")
+                except Exception as e:
+                    logger.error(f"Supabase connection error: {e}")
     if not supabase:
         raise Exception("Database not initialized")
     return supabase
@@ -0,0 +1,282 @@
+"""
+Embedding sidecar: one process owns the model, API workers embed over a Unix socket
+Without it every gunicorn worker holds its own ONNX session (~80MB for
+MiniLM), so the worker count is bounded by model RAM. With EMBED_SIDECAR=1
+gunicorn.conf.py starts this server before forking; workers send texts to
+it and concurrent requests are micro-batched into one model.embed call.
+
+    python -m api.embed_sidecar                       # standalone (e.g. under uvicorn)
+    EMBED_SIDECAR=1 gunicorn -w 4 -k uvicorn.workers.UvicornWorker api.main:app
+
+Wire format, big-endian lengths:
+    request   u32 length + JSON list of texts (an empty list is a ping)
+    response  u8 status + u32 length + payload
+              status 0: u32 dim + float32 (little-endian) vectors, row-major
+              status 1: UTF-8 error message
+
+SidecarEmbedder is the worker-side client. It exposes model.embed so call
+sites are unchanged, and falls back to an in-process model when the socket
+is missing or stops answering, retrying the sidecar every
+EMBED_SIDECAR_RETRY_SECONDS.
+"""
+import asyncio
+import json
+import logging
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+EMBED_SIDECAR = os.getenv("EMBED_SIDECAR", "0") == "1"
+EMBED_SIDECAR_SOCKET = os.getenv("EMBED_SIDECAR_SOCKET", "/tmp/cinelibre-embed.sock")
+# Requests that queue up while the model is busy always share the next batch;
+# a window > 0 also holds an idle model back this long to collect more
+EMBED_SIDECAR_BATCH_MS = float(os.getenv("EMBED_SIDECAR_BATCH_MS", "0"))
+EMBED_SIDECAR_MAX_BATCH = int(os.getenv("EMBED_SIDECAR_MAX_BATCH", "32"))
+EMBED_SIDECAR_THREADS = int(os.getenv("EMBED_SIDECAR_THREADS", "1"))
+EMBED_SIDECAR_TIMEOUT = float(os.getenv("EMBED_SIDECAR_TIMEOUT", "5"))
+EMBED_SIDECAR_RETRY_SECONDS = float(os.getenv("EMBED_SIDECAR_RETRY_SECONDS", "30"))
+# How long gunicorn's master waits for the sidecar before forking workers
+EMBED_SIDECAR_STARTUP_SECONDS = float(os.getenv("EMBED_SIDECAR_STARTUP_SECONDS", "120"))
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+class SidecarError(RuntimeError):
+    """The sidecar answered with an error (the model failed), as opposed to being unreachable"""
+
+# ==================== SERVER ====================
+
+class EmbedServer:
+    """Micro-batching embed server around one model instance"""
+
+    def __init__(self, model, max_batch=EMBED_SIDECAR_MAX_BATCH, batch_ms=EMBED_SIDECAR_BATCH_MS):
+        self.model = model
+        self.max_batch = max_batch
+        self.batch_s = batch_ms / 1000
+        # The model runs off the event loop so connections keep being accepted meanwhile
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self._queue = None
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "errors": 0}
+
+    def _embed(self, texts):
+        import numpy as np
+        return np.stack([np.asarray(v, dtype="<f4") for v in self.model.embed(texts, batch_size=len(texts))])
+
+    async def _batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.batch_s
+            while size < self.max_batch:
+                if not self._queue.empty():
+                    item = self._queue.get_nowait()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self._queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                batch.append(item)
+                size += len(item[0])
+
+            texts = [text for item_texts, _ in batch for text in item_texts]
+            try:
+                vectors = await loop.run_in_executor(self._executor, self._embed, texts)
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(texts)} failed: {e}")
+                self.stats["errors"] += 1
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.stats["batches"] += 1
+            self.stats["texts"] += len(texts)
+            offset = 0
+            for item_texts, future in batch:
+                future.set_result(vectors[offset:offset + len(item_texts)])
+                offset += len(item_texts)
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    (length,) = struct.unpack(">I", await reader.readexactly(4))
+                    texts = json.loads(await reader.readexactly(length))
+                except asyncio.IncompleteReadError:
+                    break
+                self.stats["requests"] += 1
+                if not texts:
+                    writer.write(struct.pack(">BII", STATUS_OK, 4, 0))
+                else:
+                    future = loop.create_future()
+                    await self._queue.put((texts, future))
+                    try:
+                        vectors = await future
+                        payload = struct.pack(">I", vectors.shape[1]) + vectors.tobytes()
+                        writer.write(struct.pack(">BI", STATUS_OK, len(payload)) + payload)
+                    except Exception as e:
+                        message = str(e).encode()
+                        writer.write(struct.pack(">BI", STATUS_ERROR, len(message)) + message)
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Dropping sidecar connection: {e}")
+        finally:
+            writer.close()
+
+    async def serve(self, path=EMBED_SIDECAR_SOCKET):
+        self._queue = asyncio.Queue()
+        if os.path.exists(path):
+            os.unlink(path)  # stale socket from a previous run
+        server = await asyncio.start_unix_server(self._handle, path=path)
+        os.chmod(path, 0o600)
+        batcher = asyncio.create_task(self._batcher())
+        logger.info(f"Embedding sidecar listening on {path} (max batch {self.max_batch}, "
+                    f"{self.batch_s * 1000:.0f}ms window)")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(path):
+                os.unlink(path)
+
+def serve(path=EMBED_SIDECAR_SOCKET):
+    """Load and warm the model, then serve until killed (the socket appears only once warm)"""
+    from api.embeddings import load_embedding_model
+
+    model = load_embedding_model(threads=EMBED_SIDECAR_THREADS)
+    list(model.embed(["warmup"]))
+    try:
+        asyncio.run(EmbedServer(model).serve(path))
+    except KeyboardInterrupt:
+        pass
+
+# ==================== CLIENT ====================
+
+def ping(path=EMBED_SIDECAR_SOCKET, timeout=1.0) -> bool:
+    """Whether a sidecar answers on path"""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(path)
+            sock.sendall(struct.pack(">I", 2) + b"[]")
+            status, length = struct.unpack(">BI", _recv_exactly(sock, 5))
+            _recv_exactly(sock, length)
+            return status == STATUS_OK
+    except OSError:
+        return False
+
+def _recv_exactly(sock, n):
+    chunks = []
+    while n:
+        chunk = sock.recv(n)
+        if not chunk:
+            raise ConnectionError("sidecar closed the connection")
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+class SidecarEmbedder:
+    """model.embed over the sidecar socket, with an in-process fallback
+
+    fallback is a zero-argument callable returning a fastembed model; it is
+    only called (once) when the sidecar is unavailable.
+    """
+
+    def __init__(self, fallback, path=EMBED_SIDECAR_SOCKET, timeout=EMBED_SIDECAR_TIMEOUT,
+                 retry_seconds=EMBED_SIDECAR_RETRY_SECONDS):
+        self.path = path
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self._fallback = fallback
+        self._local_model = None
+        self._local_lock = threading.Lock()
+        # One connection per thread: requests on a connection are strictly sequential
+        self._conn = threading.local()
+        self._retry_at = 0.0
+
+    @property
+    def mode(self):
+        return "in-process" if time.monotonic() < self._retry_at else "sidecar"
+
+    def _connection(self):
+        sock = getattr(self._conn, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.path)
+            except OSError:
+                sock.close()
+                raise
+            self._conn.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._conn, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._conn.sock = None
+
+    def _request(self, texts):
+        import numpy as np
+
+        body = json.dumps(texts).encode()
+        sock = self._connection()
+        try:
+            sock.sendall(struct.pack(">I", len(body)) + body)
+            status, length = struct.unpack(">BI", _recv_exactly(sock, 5))
+            payload = _recv_exactly(sock, length)
+        except OSError:
+            # A half-read response would desync the stream; start over next time
+            self._drop_connection()
+            raise
+        if status != STATUS_OK:
+            raise SidecarError(payload.decode(errors="replace"))
+        (dim,) = struct.unpack(">I", payload[:4])
+        return np.frombuffer(payload, dtype="<f4", offset=4).reshape(-1, dim)
+
+    def local_model(self):
+        if self._local_model is None:
+            with self._local_lock:
+                if self._local_model is None:
+                    self._local_model = self._fallback()
+        return self._local_model
+
+    def embed(self, documents, **kwargs):
+        """Same contract as fastembed's TextEmbedding.embed: an iterable of numpy vectors"""
+        texts = [documents] if isinstance(documents, str) else list(documents)
+        if not texts:
+            return iter(())
+        if time.monotonic() >= self._retry_at:
+            try:
+                return iter(self._request(texts))
+            except OSError as e:
+                self._retry_at = time.monotonic() + self.retry_seconds
+                logger.warning(f"Embedding sidecar unavailable ({e}); embedding in-process, "
+                               f"retrying the sidecar in {self.retry_seconds:.0f}s")
+        model = self.local_model()
+        if model is None:
+            raise RuntimeError("Embedding sidecar unavailable and the in-process model failed to load")
+        return model.embed(texts, **kwargs)
+
+    def wait_ready(self, timeout):
+        """Block until the sidecar answers a ping, up to timeout seconds"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if ping(self.path):
+                return True
+            time.sleep(0.2)
+        return False
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve()
@@ -0,0 +1,93 @@
+"""
+Embedding model configuration shared by the API and the sync engine
+Set EMBEDDING_MODEL to switch models; stored vectors must come from the
+same model as query vectors, so re-embed the catalog after changing it.
+"""
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+# Current production model (fp32 ONNX)
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", DEFAULT_EMBEDDING_MODEL)
+
+# movies.embedding / books.embedding are vector(384)
+EMBEDDING_DIM = 384
+
+# int8-quantized ONNX exports not in fastembed's built-in list.
+# Built-in 384-dim alternatives need no registration:
+#   BAAI/bge-small-en-v1.5 (already int8), snowflake/snowflake-arctic-embed-xs,
+#   sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2 (int8, multilingual)
+CUSTOM_MODELS = {
+    "sentence-transformers/all-MiniLM-L6-v2-int8": {
+        "hf": "Xenova/all-MiniLM-L6-v2",
+        "model_file": "onnx/model_quantized.onnx",
+        "pooling": "MEAN",
+        "size_in_gb": 0.023,
+        "description": "all-MiniLM-L6-v2 with int8 dynamic quantization",
+    },
+}
+
+_registered = False
+
+def register_custom_models():
+    """Make CUSTOM_MODELS loadable by name through fastembed (idempotent)"""
+    global _registered
+    if _registered:
+        return
+    from fastembed import TextEmbedding
+    from fastembed.common.model_description import ModelSource, PoolingType
+
+    known = {m["model"] for m in TextEmbedding.list_supported_models()}
+    for name, spec in CUSTOM_MODELS.items():
+        if name in known:
+            continue
+        TextEmbedding.add_custom_model(
+            model=name,
+            pooling=PoolingType[spec["pooling"]],
+            normalization=True,
+            sources=ModelSource(hf=spec["hf"]),
+            dim=EMBEDDING_DIM,
+            model_file=spec["model_file"],
+            description=spec["description"],
+            size_in_gb=spec["size_in_gb"],
+        )
+    _registered = True
+
+def model_dim(model_name: str) -> int:
+    """Output dimension of a fastembed model, custom variants included"""
+    from fastembed import TextEmbedding
+
+    register_custom_models()
+    for m in TextEmbedding.list_supported_models():
+        if m["model"] == model_name:
+            return m["dim"]
+    raise ValueError(f"Unknown embedding model: {model_name}")
+
+def active_embedding_model(db):
+    """Model whose vectors are in the embedding columns (embedding_models, migration 10)
+
+    None when the table is missing or empty, i.e. the model is not tracked.
+    """
+    try:
+        rows = db.table("embedding_models").select("model_name").eq("status", "active").limit(1).execute().data
+    except Exception as e:
+        logger.warning(f"Could not read embedding_models: {e}")
+        return None
+    return rows[0]["model_name"] if rows else None
+
+def load_embedding_model(model_name: str = None, **kwargs):
+    """Instantiate the configured embedding model
+
+    Refuses models whose dimension does not fit the vector(384) columns.
+    Extra kwargs go to fastembed.TextEmbedding (threads, cache_dir, ...).
+    """
+    from fastembed import TextEmbedding
+
+    name = model_name or EMBEDDING_MODEL
+    dim = model_dim(name)
+    if dim != EMBEDDING_DIM:
+        raise ValueError(f"{name} produces {dim}-dim vectors, the database stores {EMBEDDING_DIM}")
+    logger.info(f"Loading embedding model {name}")
+    return TextEmbedding(model_name=name, **kwargs)
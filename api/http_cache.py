@@ -0,0 +1,131 @@
+"""
+Persistent HTTP response cache for the sync crawler
+SQLite file keyed by URL + normalized params (credentials excluded). Entries
+younger than their TTL are served from disk without a request; older ones
+are revalidated with If-None-Match / If-Modified-Since, so an unchanged page
+costs a 304 instead of a full download.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+HTTP_CACHE = os.getenv("HTTP_CACHE", "1") == "1"
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.join(".cache", "http", "responses.sqlite3"))
+# Entries not refreshed for this long are dropped when the cache opens
+HTTP_CACHE_MAX_AGE_DAYS = float(os.getenv("HTTP_CACHE_MAX_AGE_DAYS", "45"))
+
+# Never part of the key or stored: the cache file is shared through CI caches
+SECRET_PARAMS = {"api_key", "key"}
+
+def cache_key(url: str, params=None) -> str:
+    """URL plus sorted, credential-free params"""
+    items = sorted((k, str(v)) for k, v in (params or {}).items() if k not in SECRET_PARAMS)
+    return f"{url}?{urlencode(items)}" if items else url
+
+def _response(url, status, body, headers, from_cache):
+    """Build a requests.Response so call sites keep using status_code / raise_for_status / json"""
+    res = requests.Response()
+    res.url = url
+    res.status_code = status
+    res._content = body
+    res.headers = CaseInsensitiveDict(headers)
+    res.encoding = "utf-8"
+    res.from_cache = from_cache
+    return res
+
+class HTTPCache:
+    """GET-through cache; path=None disables it (every call goes to the network)"""
+
+    def __init__(self, path=HTTP_CACHE_PATH, max_age_days=HTTP_CACHE_MAX_AGE_DAYS):
+        self.path = path
+        self.max_age_s = max_age_days * 86400
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "bytes_downloaded": 0}
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _db(self):
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    body BLOB NOT NULL,
+                    content_type TEXT,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL
+                )
+            """)
+            pruned = self._conn.execute(
+                "DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.max_age_s,)
+            ).rowcount
+            self._conn.commit()
+            logger.info(f"HTTP cache at {self.path} ({pruned} expired entries pruned)")
+        return self._conn
+
+    def get(self, url: str, params=None, ttl: float = 86400, timeout: float = 10) -> requests.Response:
+        """requests.get with caching of 200 responses for ttl seconds
+
+        The returned response has from_cache=True when no request was made.
+        Errors and non-200 responses (429, 5xx) are returned as-is and never stored.
+        """
+        if self.path is None:
+            res = requests.get(url, params=params, timeout=timeout)
+            res.from_cache = False
+            self.stats["misses"] += 1
+            self.stats["bytes_downloaded"] += len(res.content)
+            return res
+
+        key = cache_key(url, params)
+        with self._lock:
+            row = self._db().execute(
+                "SELECT body, content_type, etag, last_modified, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+
+        headers = {}
+        if row is not None:
+            body, content_type, etag, last_modified, fetched_at = row
+            if time.time() - fetched_at < ttl:
+                self.stats["hits"] += 1
+                return _response(url, 200, zlib.decompress(body), {"Content-Type": content_type}, True)
+            if etag:
+                headers["If-None-Match"] = etag
+            if last_modified:
+                headers["If-Modified-Since"] = last_modified
+
+        res = requests.get(url, params=params, headers=headers, timeout=timeout)
+        res.from_cache = False
+        if res.status_code == 304 and row is not None:
+            self.stats["revalidated"] += 1
+            with self._lock:
+                self._db().execute("UPDATE responses SET fetched_at = ? WHERE key = ?", (time.time(), key))
+                self._db().commit()
+            return _response(url, 200, zlib.decompress(body), {"Content-Type": content_type}, False)
+
+        self.stats["misses"] += 1
+        self.stats["bytes_downloaded"] += len(res.content)
+        if res.status_code == 200:
+            with self._lock:
+                self._db().execute(
+                    "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, zlib.compress(res.content), res.headers.get("Content-Type"),
+                     res.headers.get("ETag"), res.headers.get("Last-Modified"), time.time())
+                )
+                self._db().commit()
+        return res
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
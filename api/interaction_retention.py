@@ -0,0 +1,63 @@
+"""
+Partition upkeep and retention for the interactions table (migration 13)
+interactions is range-partitioned by month. This job creates the next
+months' partitions before inserts need them, then rolls every month older
+than INTERACTIONS_KEEP_MONTHS into the daily per-item / per-user aggregates
+(interaction_daily_items, interaction_daily_users) and drops it.
+
+    python -m api.interaction_retention                    # keep 6 months, create 3 ahead
+    python -m api.interaction_retention --keep-months 12 --report retention-report.json
+
+A month is only dropped once user_item_signals has folded it in, so the job
+runs the signals rollup first; months it could not drop are listed under
+waiting_for_signals. Inserts landing in a month without a partition go to
+interactions_default and are moved out on the next run.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+
+from api.precompute_recs import rollup_signals
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INTERACTIONS_KEEP_MONTHS = int(os.getenv("INTERACTIONS_KEEP_MONTHS", "6"))
+INTERACTIONS_MONTHS_AHEAD = int(os.getenv("INTERACTIONS_MONTHS_AHEAD", "3"))
+
+def maintain(db, keep_months=INTERACTIONS_KEEP_MONTHS, months_ahead=INTERACTIONS_MONTHS_AHEAD):
+    """Create upcoming partitions and expire old ones; returns the run report"""
+    report = {"keep_months": keep_months, "months_ahead": months_ahead}
+    start = time.perf_counter()
+    report["partitions_created"] = db.rpc("ensure_interaction_partitions", {"months_ahead": months_ahead}).execute().data or 0
+    report["interactions_rolled_into_signals"] = rollup_signals(db)
+    report.update(db.rpc("expire_interaction_partitions", {"keep_months": keep_months}).execute().data or {})
+    report["seconds"] = round(time.perf_counter() - start, 2)
+
+    if report.get("dropped"):
+        logger.info(f"Dropped {', '.join(report['dropped'])} "
+                    f"({report['interactions_rolled_up']} interactions kept as daily aggregates)")
+    if report.get("waiting_for_signals"):
+        logger.warning(f"Not dropped until user_item_signals catches up: {', '.join(report['waiting_for_signals'])}")
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Create upcoming interactions partitions and expire old ones")
+    parser.add_argument("--keep-months", type=int, default=INTERACTIONS_KEEP_MONTHS,
+                        help="Whole months of raw interactions kept before the current one")
+    parser.add_argument("--months-ahead", type=int, default=INTERACTIONS_MONTHS_AHEAD)
+    parser.add_argument("--report", help="Write the run report as JSON to this path")
+    args = parser.parse_args()
+
+    from api.database import get_db
+
+    report = maintain(get_db(), args.keep_months, args.months_ahead)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -6,21 +6,36 @@ os.environ["OMP_NUM_THREADS"] = "1"
 os.environ["MKL_NUM_THREADS"] = "1"
 os.environ["ONNXRUNTIME_ENABLE_TELEMETRY"] = "0"
 
+import asyncio
+import gc
 import logging
+import threading
+import time
 import requests
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
 from fastapi import FastAPI, HTTPException, Query, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastembed import TextEmbedding
+from fastapi.responses import PlainTextResponse
 from dotenv import load_dotenv
 from typing import List, Optional
 from uuid import UUID
 
 # Import local modules
 from api.database import get_db
+from api.admission import admission
 from api.auth import (
     hash_password, verify_password, create_access_token, 
-    get_current_user
+    get_current_user, require_admin
 )
+from api.ranking import (
+    MMR_LAMBDA, candidate_pool, diversity_groups, group_cap, maximal_marginal_relevance, reciprocal_rank_fusion
+)
+from api.embeddings import EMBEDDING_MODEL, active_embedding_model, load_embedding_model
+from api.embed_sidecar import EMBED_SIDECAR, SidecarEmbedder
+from api.metrics import MetricsMiddleware, TimedJSONResponse, record_cache, render_metrics, stage
+from api.memory import MEMORY_MONITOR, monitor as memory_monitor, track_load, component_breakdown, register_component, rss_mb
+from api.suggest import SUGGEST_MAX_LIMIT, Suggester, suggest
 from api.models import (
     UserRegister, UserLogin, TokenResponse, UserResponse,
     RatingCreate, RatingResponse, InteractionCreate,
@@ -34,27 +49,171 @@ logger = logging.getLogger(__name__)
 # 2. Configuration
 load_dotenv()
 
+# HNSW candidate list size for match_movies / match_books (higher = better recall, slower)
+VECTOR_EF_SEARCH = int(os.getenv("VECTOR_EF_SEARCH", "40"))
+# full = float32 HNSW; half / binary = compact index + exact rescoring (needs migration 9)
+VECTOR_SEARCH_MODE = os.getenv("VECTOR_SEARCH_MODE", "full")
+# Candidates fetched per requested result before rescoring; binary codes need more
+VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", "10" if VECTOR_SEARCH_MODE == "binary" else "4"))
+
+# External APIs (overridable so benchmarks can point at local fakes)
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+
+# How often the active model (embedding_models, migration 10) is re-read
+EMBEDDING_MODEL_CHECK_SECONDS = float(os.getenv("EMBEDDING_MODEL_CHECK_SECONDS", "60"))
+
+# Load and warm the model at import so gunicorn --preload workers share it copy-on-write
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "0") == "1"
+
+# Hybrid search: queries this short are treated as title lookups and skip the embedder
+HYBRID_SHORT_QUERY_CHARS = int(os.getenv("HYBRID_SHORT_QUERY_CHARS", "4"))
+
+# Precomputed personalized recommendations (api/precompute_recs.py, migration 11):
+# rows older than this are ignored, as are requests for more than RECS_TOP_N items
+RECS_MAX_AGE_HOURS = float(os.getenv("RECS_MAX_AGE_HOURS", "36"))
+RECS_TOP_N = int(os.getenv("RECS_TOP_N", "50"))
+
 # 3. Initialize FastEmbed
 # We use a singleton pattern to ensure the model only ever exists once in memory
 _model = None
+# Model _model runs; becomes the catalog's active model after a promote (see embedding_model_matches)
+_model_name = EMBEDDING_MODEL
+# Startup steps that failed (step -> cause), reported by /readyz
+_warmup_errors = {}
+
+def load_local_model(model_name: str = None):
+    """This worker's own model, or None if it fails to load"""
+    logger.info("Loading FastEmbed Model into RAM...")
+    try:
+        # EMBEDDING_MODEL (api/embeddings.py), all-MiniLM-L6-v2 by default (~80MB)
+        # One ONNX thread: no intra-op pool to lose across a --preload fork
+        with track_load("model"):
+            model = load_embedding_model(model_name, threads=1)
+        logger.info("Model loaded successfully.")
+        return model
+    except Exception as e:
+        logger.error(f"Model Load Failed: {e}")
+        _warmup_errors["model"] = f"{type(e).__name__}: {e}"
+        return None
 
 def get_model():
     global _model
     if _model is None:
-        logger.info("Loading FastEmbed Model into RAM...")
-        try:
-            # all-MiniLM-L6-v2 is the smallest reliable model (~80MB)
-            _model = TextEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
-            logger.info("Model loaded successfully.")
-        except Exception as e:
-            logger.error(f"Model Load Failed: {e}")
+        if EMBED_SIDECAR:
+            # Shared model in the sidecar process (api/embed_sidecar.py); the local
+            # model is only loaded if the sidecar is unreachable
+            _model = SidecarEmbedder(fallback=load_local_model)
+        else:
+            _model = load_local_model()
     return _model
 
+_model_warm = False
+
+def warm_model():
+    """Load the model and run one dummy inference so the ONNX graph is ready before traffic"""
+    global _model_warm
+    m = get_model()
+    if m is None:
+        # load_local_model logged and recorded the cause
+        return False
+    if not _model_warm:
+        start = time.perf_counter()
+        # With the sidecar, gunicorn's master waited for it before forking (gunicorn.conf.py);
+        # if it is down this falls back to loading the model in this worker.
+        try:
+            list(m.embed(["warmup"]))
+        except RuntimeError as e:
+            # Sidecar down and the local fallback failed to load; stay unready
+            logger.error(f"Model warm-up failed: {e}")
+            _warmup_errors["model"] = f"{type(e).__name__}: {e}"
+            return False
+        _model_warm = True
+        _warmup_errors.pop("model", None)
+        logger.info(f"Model warmed up in {time.perf_counter() - start:.2f}s")
+    return True
+
+# Title prefix index for /search/suggest, built on first use
+suggester = Suggester()
+register_component("suggest_index", suggester.nbytes)
+
+_active_model = {"name": None, "checked_at": float("-inf"), "switching": False}
+_switch_lock = threading.Lock()
+
+def switch_model(model_name: str):
+    """Load and warm model_name, then make it this worker's model
+
+    Runs in a background thread. The new model is always in-process: the
+    embedding sidecar keeps serving the model it started with until it is
+    restarted. A failed load is retried at the next model check.
+    """
+    global _model, _model_name
+    try:
+        model = load_local_model(model_name)
+        if model is not None:
+            list(model.embed(["warmup"]))
+            _model, _model_name = model, model_name
+            _warmup_errors.pop("model", None)
+            logger.info(f"Switched to embedding model {model_name}")
+    except Exception as e:
+        logger.error(f"Could not switch to embedding model {model_name}: {e}")
+    finally:
+        _active_model["switching"] = False
+
+def embedding_model_matches(db) -> bool:
+    """Whether query vectors from this worker's model fit the stored vectors
+
+    After promote_embedding_model the active model differs from this
+    worker's until switch_model has loaded it (seconds); vector search and
+    TMDB inserts are skipped meanwhile.
+    """
+    now = time.monotonic()
+    if now - _active_model["checked_at"] >= EMBEDDING_MODEL_CHECK_SECONDS:
+        _active_model["name"] = active_embedding_model(db)
+        _active_model["checked_at"] = now
+        if _active_model["name"] not in (None, _model_name) and not _active_model["switching"]:
+            with _switch_lock:
+                if not _active_model["switching"]:
+                    logger.warning(f"Catalog is embedded with {_active_model['name']}, this worker runs {_model_name}; "
+                                   "switching models")
+                    _active_model["switching"] = True
+                    threading.Thread(target=switch_model, args=(_active_model["name"],), daemon=True).start()
+    return _active_model["name"] in (None, _model_name)
+
+def warm_step(step: str, fn, *args):
+    """Run a startup step; a failure is logged and reported by /readyz instead of raised"""
+    try:
+        result = fn(*args)
+    except Exception as e:
+        logger.error(f"Startup step {step} failed: {e}")
+        _warmup_errors[step] = f"{type(e).__name__}: {e}"
+        return None
+    _warmup_errors.pop(step, None)
+    return result
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Uvicorn only starts accepting connections once startup finishes.
+    # Under --preload the model is already warm and this is a no-op.
+    await asyncio.to_thread(warm_model)
+    # Create the Supabase client now rather than on the first request.
+    # If it is not configured, get_db() raises again when a request needs it.
+    db = warm_step("database", get_db)
+    if db is not None:
+        await asyncio.to_thread(warm_step, "embedding_model_check", embedding_model_matches, db)
+        # Build the suggest index off the startup path; early requests wait for it
+        asyncio.get_running_loop().run_in_executor(None, warm_step, "suggest_index", suggester.get, db)
+    if MEMORY_MONITOR:
+        memory_monitor.start()
+    yield
+    memory_monitor.stop()
+
 # 4. FastAPI App
 app = FastAPI(
     title="CineLibre - Full Stack Recommendation API",
     description="MovieLens-style recommendation system for Indian cinema",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=TimedJSONResponse,
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -63,7 +222,10 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+# Added last so it wraps CORS too and times the whole request
+app.add_middleware(MetricsMiddleware)
 
 @app.get("/")
 @app.head("/")
@@ -79,6 +241,50 @@ async def health_check():
         "version": "2.0.0"
     }
 
+@app.get("/healthz")
+async def liveness():
+    """Liveness: the process is serving requests; never loads the model"""
+    return {"status": "alive"}
+
+@app.get("/readyz")
+async def readiness():
+    """Readiness: 503 until this worker's model is loaded and warmed"""
+    if not _model_warm:
+        raise HTTPException(status_code=503, detail={
+            "message": "Embedding model is not loaded yet", "warmup_errors": _warmup_errors
+        })
+    # Still ready on a mismatch: lexical search, recommendations and fallbacks keep working
+    return {
+        "status": "ready",
+        "model_loaded": True,
+        "embedding_model": _model_name,
+        "active_embedding_model": _active_model["name"],
+        # A worker that switched models (switch_model) embeds in-process even with the sidecar on
+        "embedder": getattr(get_model(), "mode", "in-process"),
+        # Failed startup steps that do not block readiness (database, suggest index)
+        "warmup_errors": _warmup_errors
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: request/stage latency histograms, response methods, cache hits"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+# ==================== ADMIN ENDPOINTS ====================
+
+@app.get("/admin/memory")
+async def memory_report(
+    limit: int = 15,
+    since: str = Query("baseline", pattern="^(baseline|previous)$"),
+    _: None = Depends(require_admin)
+):
+    """RSS history, per-component breakdown and top allocation growth (needs X-Admin-Token)"""
+    if not MEMORY_MONITOR:
+        return {"enabled": False, "rss_mb": round(rss_mb(), 1), "components": component_breakdown()}
+    # Fresh sample so the report reflects the state at request time
+    await asyncio.to_thread(memory_monitor.sample)
+    return await asyncio.to_thread(memory_monitor.report, limit, since)
+
 # ==================== AUTH ENDPOINTS ====================
 
 @app.post("/auth/register", response_model=TokenResponse)
@@ -284,43 +490,202 @@ async def track_interaction(
         # Return 200 but with success=false to not break frontend
         return {"message": "Interaction tracking failed", "success": False, "error": error_msg}
 
-@app.get("/search/semantic")
+def escape_like(text: str) -> str:
+    """text with the LIKE wildcards escaped, so an ILIKE pattern built from it matches it literally"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def match_rpc(item_type: str, filters: dict = None):
+    """Match RPC name and its tuning params for the configured VECTOR_SEARCH_MODE"""
+    rpc_function = "match_movies" if item_type == "movie" else "match_books"
+    if filters:
+        # Filtered search always runs on the full-precision index
+        return rpc_function + "_filtered", {"ef_search": VECTOR_EF_SEARCH, **filters}
+    if VECTOR_SEARCH_MODE in ("half", "binary"):
+        return rpc_function + "_compact", {
+            "ef_search": VECTOR_EF_SEARCH,
+            "quantization": VECTOR_SEARCH_MODE,
+            "rescore_factor": VECTOR_RESCORE_FACTOR
+        }
+    return rpc_function, {"ef_search": VECTOR_EF_SEARCH}
+
+def run_vector_search(db, model, q: str, type: str, limit: int, threshold: float, filters: dict):
+    """Embed the query and run the (optionally filtered) match RPC"""
+    # model is from the start of the request; switch_model may have replaced it since
+    if not embedding_model_matches(db) or model is not _model:
+        return []
+    # Generate embedding (list format for Supabase)
+    with stage("embed"):
+        query_embeddings = list(model.embed([q]))
+    query_vector = query_embeddings[0].tolist()
+
+    rpc_function, params = match_rpc(type, filters)
+    response = db.rpc(rpc_function, {
+        "query_embedding": query_vector,
+        "match_threshold": threshold,
+        "match_count": limit,
+        **params
+    }).execute()
+    return response.data or []
+
+# Columns read for re-ranking: the embedding plus the group-cap fields
+DIVERSITY_COLUMNS = {"movie": "id, embedding, language, genres", "book": "id, embedding, language, categories"}
+
+def diversify(db, candidates, limit: int, item_type: str = None, key: str = "id",
+              relevance_key: str = "similarity", capped: bool = True):
+    """MMR re-rank of a best-first candidate pool down to limit results
+
+    Embeddings (and the group-cap fields) are read in one query per item
+    type. Without MMR, or if that read fails, the pool is just truncated.
+    """
+    if MMR_LAMBDA >= 1 or len(candidates) <= 1:
+        return candidates[:limit]
+    ids = {}
+    for item in candidates:
+        if item.get(key) is not None:
+            ids.setdefault(item.get("item_type", item_type), []).append(str(item[key]))
+    rows = {}
+    try:
+        for kind, kind_ids in ids.items():
+            table = "movies" if kind == "movie" else "books"
+            for row in db.table(table).select(DIVERSITY_COLUMNS[kind]).in_("id", kind_ids).execute().data:
+                rows[str(row["id"])] = row
+    except Exception as e:
+        logger.warning(f"Diversity re-ranking skipped: {e}")
+        return candidates[:limit]
+
+    def row_of(item):
+        return rows.get(str(item.get(key)))
+
+    with stage("rerank"):
+        return maximal_marginal_relevance(
+            candidates,
+            [(row_of(item) or {}).get("embedding") for item in candidates],
+            limit,
+            relevance_key=relevance_key,
+            lambda_=MMR_LAMBDA,
+            groups=lambda item: diversity_groups(row_of(item)),
+            max_per_group=group_cap(limit) if capped else None,
+        )
+
+def run_lexical_search(db, q: str, type: str, limit: int):
+    """Trigram title (and book author) match, exact titles first"""
+    rpc_function = "search_movies_lexical" if type == "movie" else "search_books_lexical"
+    response = db.rpc(rpc_function, {"query_text": q, "match_count": limit}).execute()
+    return response.data or []
+
+# Embeds the query: per-client quota and a bounded queue so a burst cannot starve cheap routes
+@app.get("/search/semantic", dependencies=[Depends(admission("search"))])
 async def semantic_search(
     q: str = Query(..., min_length=3), 
     type: str = "movie", 
     limit: int = 12,
-    threshold: float = 0.4
+    threshold: float = 0.4,
+    mode: str = Query("semantic", pattern="^(semantic|hybrid)$"),
+    language: Optional[str] = None,
+    genre: Optional[List[str]] = Query(None),
+    year_from: Optional[int] = None,
+    year_to: Optional[int] = None,
+    category: Optional[str] = None,
+    author: Optional[str] = None
 ):
-    """Semantic search with TMDB fallback - no authentication required"""
+    """Semantic or hybrid (lexical + semantic) search with optional filters and TMDB fallback - no authentication required"""
+    # A filter the item type has no column for would otherwise be dropped without a word
+    if type == "movie":
+        ignored = [name for name, value in (("category", category), ("author", author)) if value]
+    else:
+        ignored = ["genre"] if genre else []
+    if ignored:
+        raise HTTPException(status_code=400, detail=f"Filter not supported for type={type}: {', '.join(ignored)}")
+
     m = get_model()
     db = get_db()
     if not m or not db:
         raise HTTPException(status_code=500, detail="System initializing...")
     
     try:
-        # Generate embedding (list format for Supabase)
-        query_embeddings = list(m.embed([q]))
-        query_vector = query_embeddings[0].tolist()
-
-        rpc_function = "match_movies" if type == "movie" else "match_books"
-        response = db.rpc(rpc_function, {
-            "query_embedding": query_vector,
-            "match_threshold": threshold,
-            "match_count": limit
-        }).execute()
+        # Filters are pushed into the vector query so the top-k survives filtering
+        filters = {}
+        if language:
+            filters["filter_language"] = language
+        if year_from:
+            filters["min_year"] = year_from
+        if year_to:
+            filters["max_year"] = year_to
+        if type == "movie":
+            if genre:
+                filters["filter_genres"] = genre
+        else:
+            if category:
+                filters["filter_category"] = category
+            if author:
+                filters["filter_author"] = escape_like(author)
+
+        # While this worker switches to a newly promoted model its query vectors do not fit
+        # the stored ones; serve title matches instead of sending every search to TMDB
+        if not await asyncio.to_thread(embedding_model_matches, db):
+            results = [] if filters else await asyncio.to_thread(run_lexical_search, db, q, type, limit)
+            return {"query": q, "results": results, "source": "lexical", "filters": filters}
+
+        # Hybrid mode: the lexical query runs first, since a title hit needs no embedding.
+        # Filtered searches stay semantic-only since the lexical RPCs take no filters.
+        if mode == "hybrid" and not filters:
+            lexical = await asyncio.to_thread(run_lexical_search, db, q, type, limit)
+
+            # Exact title hits answer the query; so does any hit for a short query,
+            # which is usually a title ("RRR")
+            short = len(q.strip()) <= HYBRID_SHORT_QUERY_CHARS
+            if (short and lexical) or any(r.get("exact_match") for r in lexical):
+                return {"query": q, "results": lexical, "source": "lexical", "filters": filters}
+
+            semantic = await asyncio.to_thread(
+                run_vector_search, db, m, q, type, candidate_pool(limit), threshold, filters
+            )
+            fused = reciprocal_rank_fusion([semantic, lexical], candidate_pool(limit))
+            # Search keeps the group cap off: a query often asks for one language or genre
+            results = await asyncio.to_thread(diversify, db, fused, limit, type, "id", "rrf_score", False)
+            source = "hybrid"
+        else:
+            candidates = await asyncio.to_thread(
+                run_vector_search, db, m, q, type, candidate_pool(limit), threshold, filters
+            )
+            results = await asyncio.to_thread(diversify, db, candidates, limit, type, "id", "similarity", False)
+            source = "database"
         
         # If no results found in DB and searching for movies, try TMDB
-        if (not response.data or len(response.data) == 0) and type == "movie":
+        # (skipped for filtered searches, TMDB results would ignore the filters)
+        if not results and type == "movie" and not filters:
             logger.info(f"No results in DB for '{q}', searching TMDB...")
             tmdb_results = await search_tmdb_and_add(q, limit, db, m)
             if tmdb_results:
                 return {"query": q, "results": tmdb_results, "source": "tmdb"}
         
-        return {"query": q, "results": response.data, "source": "database"}
+        return {"query": q, "results": results, "source": source, "filters": filters}
     except Exception as e:
         logger.error(f"Search Error: {e}")
         raise HTTPException(status_code=500, detail="Search processing failed.")
 
+@app.get("/search/suggest")
+async def suggest_titles(
+    prefix: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=SUGGEST_MAX_LIMIT),
+    type: Optional[str] = Query(None, pattern="^(movie|book)$")
+):
+    """Title typeahead from the in-memory prefix index (api/suggest.py) - no embedding or database call per keystroke"""
+    try:
+        if suggester.indexes is None:
+            # First request in this worker builds the index from the catalog
+            with stage("suggest_load"):
+                indexes = await asyncio.to_thread(suggester.get, get_db())
+        else:
+            # Starts a background rebuild once the index is SUGGEST_REFRESH_SECONDS old
+            indexes = suggester.get(get_db())
+        with stage("suggest"):
+            results = suggest(indexes, prefix, limit, type)
+    except Exception as e:
+        logger.error(f"Suggest error: {e}")
+        raise HTTPException(status_code=503, detail="Suggestions unavailable")
+    return {"prefix": prefix, "suggestions": results, "source": suggester.source}
+
 async def search_tmdb_and_add(query: str, limit: int, db, model):
     """Search TMDB, add results to DB, and return them"""
     tmdb_api_key = os.getenv("TMDB_API_KEY")
@@ -330,7 +695,7 @@ async def search_tmdb_and_add(query: str, limit: int, db, model):
     
     try:
         # Search TMDB
-        url = "https://api.themoviedb.org/3/search/movie"
+        url = f"{TMDB_BASE_URL}/search/movie"
         params = {
             "api_key": tmdb_api_key,
             "query": query,
@@ -339,7 +704,8 @@ async def search_tmdb_and_add(query: str, limit: int, db, model):
             "include_adult": False
         }
         
-        response = requests.get(url, params=params, timeout=5)
+        with stage("external"):
+            response = requests.get(url, params=params, timeout=5)
         if response.status_code != 200:
             logger.error(f"TMDB API error: {response.status_code}")
             return []
@@ -374,10 +740,11 @@ async def search_tmdb_and_add(query: str, limit: int, db, model):
                         "similarity": 0.9,  # High similarity since it's a direct search match
                         "release_date": existing.data[0].get("release_date")
                     })
-                else:
+                elif embedding_model_matches(db):
                     # Generate embedding for the movie
                     text = f"{movie['title']}. {movie['overview']}"
-                    embeddings = list(model.embed([text[:2000]]))
+                    with stage("embed"):
+                        embeddings = list(model.embed([text[:2000]]))
                     vector = embeddings[0].tolist()
                     
                     # Add to database
@@ -427,16 +794,21 @@ async def get_personalized_recommendations(
 ):
     """Get personalized recommendations using collaborative filtering"""
     db = get_db()
+
+    precomputed = get_precomputed_recommendations(current_user["user_id"], limit, db)
+    if precomputed is not None:
+        return precomputed
     
     try:
         # Call Supabase RPC function for collaborative filtering
         result = db.rpc("get_collaborative_recommendations", {
             "target_user_id": current_user["user_id"],
-            "recommendation_count": limit
+            "recommendation_count": candidate_pool(limit)
         }).execute()
         
         if result.data and len(result.data) > 0:
-            return {"recommendations": result.data, "method": "collaborative_filtering"}
+            recommendations = await asyncio.to_thread(diversify, db, result.data, limit, None, "item_id", "predicted_rating")
+            return {"recommendations": recommendations, "method": "collaborative_filtering"}
         else:
             # If no collaborative recommendations, try content-based on user's ratings
             logger.info("No collaborative recommendations, trying content-based")
@@ -450,15 +822,59 @@ async def get_personalized_recommendations(
             # Last resort: return empty with error method
             return {"recommendations": [], "method": "error", "message": "Unable to generate personalized recommendations"}
 
+def get_precomputed_recommendations(user_id: int, limit: int, db):
+    """The nightly batch's recommendations for user_id, or None if missing, stale or too old"""
+    if limit > RECS_TOP_N:
+        return None
+    cutoff = (datetime.now(timezone.utc) - timedelta(hours=RECS_MAX_AGE_HOURS)).isoformat()
+    try:
+        result = db.table("user_recommendations").select("recommendations, method, computed_at") \
+            .eq("user_id", user_id).eq("stale", False).gte("computed_at", cutoff).execute()
+    except Exception as e:
+        # e.g. migration 11 not applied yet
+        logger.warning(f"Precomputed recommendations unavailable: {e}")
+        return None
+    record_cache("user_recommendations", bool(result.data))
+    if not result.data:
+        return None
+    row = result.data[0]
+    return {
+        "recommendations": row["recommendations"][:limit],
+        "method": row["method"],
+        "precomputed_at": row["computed_at"],
+    }
+
+def get_signal_seeds(user_id: int, count: int, exclude: set, db) -> list:
+    """Up to count of the user's strongest implicit signals (migration 12) on items they have not rated"""
+    try:
+        signals = db.rpc("get_user_signals", {"user_ids": [user_id], "per_user": count + len(exclude)}).execute().data or []
+    except Exception as e:
+        # e.g. migration 12 not applied yet
+        logger.warning(f"Implicit signals unavailable: {e}")
+        return []
+    signals = [s for s in signals if str(s["item_id"]) not in exclude]
+    if not signals:
+        return []
+    # A low rating outweighs any number of views
+    rated = db.table("ratings").select("item_id").eq("user_id", user_id) \
+        .in_("item_id", [str(s["item_id"]) for s in signals]).execute()
+    rated_ids = {str(r["item_id"]) for r in rated.data}
+    return [s for s in signals if str(s["item_id"]) not in rated_ids][:count]
+
 async def get_content_based_recommendations(user_id: int, limit: int, db):
-    """Get recommendations based on user's rated items"""
+    """Get recommendations based on user's rated items, or on what they viewed and clicked"""
     try:
         # Get user's top-rated items
         user_ratings = db.table("ratings").select("item_id, item_type, rating").eq("user_id", user_id).gte("rating", 3.5).order("rating", desc=True).limit(5).execute()
+        seeds = list(user_ratings.data)
+        if len(seeds) < 5:
+            # Most users never rate; top up from their interactions
+            seeds += get_signal_seeds(user_id, 5 - len(seeds), {str(r["item_id"]) for r in seeds}, db)
+        method = "content_based" if user_ratings.data else "implicit_feedback"
         
-        if not user_ratings.data:
-            # No ratings at all - return diverse recent items instead of popular
-            logger.info("No user ratings, returning diverse recent items")
+        if not seeds:
+            # No ratings or interactions - return diverse recent items instead of popular
+            logger.info("No ratings or interactions, returning diverse recent items")
             movies = db.table("movies").select("id, title, poster_url, language").order("created_at", desc=True).limit(limit // 2).execute()
             books = db.table("books").select("id, title, thumbnail_url, authors").order("created_at", desc=True).limit(limit // 2).execute()
             
@@ -482,15 +898,16 @@ async def get_content_based_recommendations(user_id: int, limit: int, db):
         
         recommendations = []
         seen_ids = set()
+        pool = candidate_pool(limit)
         
-        # Add user's rated items to seen set to exclude them
-        for rating in user_ratings.data:
-            seen_ids.add(str(rating["item_id"]))
+        # Add the seed items to seen set to exclude them
+        for seed in seeds:
+            seen_ids.add(str(seed["item_id"]))
         
-        # For each highly rated item, find similar items
-        for rating in user_ratings.data:
-            item_id = rating["item_id"]
-            item_type = rating["item_type"]
+        # For each seed item, find similar items
+        for seed in seeds:
+            item_id = seed["item_id"]
+            item_type = seed["item_type"]
             
             # Get item embedding
             table = "movies" if item_type == "movie" else "books"
@@ -502,11 +919,12 @@ async def get_content_based_recommendations(user_id: int, limit: int, db):
             embedding = item.data[0]["embedding"]
             
             # Find similar items
-            rpc_function = "match_movies" if item_type == "movie" else "match_books"
+            rpc_function, params = match_rpc(item_type)
             result = db.rpc(rpc_function, {
                 "query_embedding": embedding,
                 "match_threshold": 0.3,  # Lower threshold for more results
-                "match_count": 15
+                "match_count": 15,
+                **params
             }).execute()
             
             # Add to recommendations if not already seen or rated
@@ -520,13 +938,13 @@ async def get_content_based_recommendations(user_id: int, limit: int, db):
                         "title": rec.get("title"),
                         "poster_url": rec.get("poster_url") or rec.get("thumbnail_url"),
                         "similarity": rec.get("similarity"),
-                        "based_on": rating["item_id"]  # Show what it's based on
+                        "based_on": seed["item_id"]  # Show what it's based on
                     })
                     
-                    if len(recommendations) >= limit:
+                    if len(recommendations) >= pool:
                         break
             
-            if len(recommendations) >= limit:
+            if len(recommendations) >= pool:
                 break
         
         if len(recommendations) == 0:
@@ -541,7 +959,8 @@ async def get_content_based_recommendations(user_id: int, limit: int, db):
             } for m in movies.data]
             return {"recommendations": recommendations[:limit], "method": "diverse_fallback"}
         
-        return {"recommendations": recommendations[:limit], "method": "content_based"}
+        recommendations = await asyncio.to_thread(diversify, db, recommendations, limit, None, "item_id")
+        return {"recommendations": recommendations, "method": method}
     except Exception as e:
         logger.error(f"Content-based recommendation error: {e}")
         # Return diverse content instead of popular
@@ -577,15 +996,17 @@ async def get_similar_items(
         embedding = item.data[0]["embedding"]
         
         # Find similar items
-        rpc_function = "match_movies" if item_type == "movie" else "match_books"
+        rpc_function, params = match_rpc(item_type)
         result = db.rpc(rpc_function, {
             "query_embedding": embedding,
             "match_threshold": 0.5,
-            "match_count": limit + 1  # +1 to exclude self
+            "match_count": candidate_pool(limit) + 1,  # +1 to exclude self
+            **params
         }).execute()
         
         # Filter out the item itself
-        similar = [r for r in result.data if str(r.get("id")) != str(item_id)][:limit]
+        similar = [r for r in result.data if str(r.get("id")) != str(item_id)]
+        similar = await asyncio.to_thread(diversify, db, similar, limit, item_type)
         
         return {"item_id": item_id, "similar_items": similar, "method": "content_based"}
     except Exception as e:
@@ -634,6 +1055,27 @@ async def get_popular_items(limit: int = 20):
         except:
             return {"popular_items": [], "method": "error"}
 
+@app.get("/recommendations/trending")
+async def get_trending_items(
+    window: str = Query("day", pattern="^(hour|day|week)$"),
+    limit: int = 20,
+    item_type: Optional[str] = Query(None, pattern="^(movie|book)$")
+):
+    """Get trending items from time-decayed view/click/search counters"""
+    db = get_db()
+    
+    try:
+        # Reads the trigger-maintained item_trending rollup, never the raw interactions
+        result = db.rpc("get_trending_items", {
+            "trend_window": window,
+            "item_limit": limit,
+            "filter_item_type": item_type
+        }).execute()
+        return {"trending_items": result.data, "window": window, "method": "time_decayed_interactions"}
+    except Exception as e:
+        logger.error(f"Trending items error: {e}")
+        return {"trending_items": [], "window": window, "method": "error"}
+
 # ==================== MOVIE/BOOK ENDPOINTS ====================
 
 @app.get("/movies/{movie_id}")
@@ -652,12 +1094,13 @@ async def get_movie(movie_id: str, include_details: bool = False):
             tmdb_api_key = os.getenv("TMDB_API_KEY")
             if tmdb_api_key:
                 # Fetch movie details from TMDB
-                tmdb_url = f"https://api.themoviedb.org/3/movie/{movie['tmdb_id']}"
+                tmdb_url = f"{TMDB_BASE_URL}/movie/{movie['tmdb_id']}"
                 params = {
                     "api_key": tmdb_api_key,
                     "append_to_response": "credits"
                 }
-                response = requests.get(tmdb_url, params=params, timeout=5)
+                with stage("external"):
+                    response = requests.get(tmdb_url, params=params, timeout=5)
                 
                 if response.status_code == 200:
                     tmdb_data = response.json()
@@ -719,11 +1162,20 @@ async def list_books(skip: int = 0, limit: int = 20):
     result = db.table("books").select("*").range(skip, skip + limit - 1).execute()
     return {"books": result.data, "skip": skip, "limit": limit}
 
+# gunicorn --preload imports this module once in the master process. Loading
+# here, before the fork, lets workers share the model's pages copy-on-write;
+# gc.freeze() keeps the collector from touching (and so copying) those objects.
+# With the sidecar the model lives in its own process and there is nothing to preload.
+if PRELOAD_MODEL and not EMBED_SIDECAR:
+    warm_model()
+    gc.freeze()
+
 if __name__ == "__main__":
     import uvicorn
     # Using environment variables for port to support Koyeb
     port = int(os.getenv("PORT", 8000))
-    # CRITICAL: We set workers=1 and limit concurrency to save RAM
+    # CRITICAL: We set workers=1 and limit concurrency to save RAM.
+    # Searches hold at most 6 of these slots (api/admission.py), the rest stay free for cheap routes.
     uvicorn.run(
         "api.main:app", 
         host="0.0.0.0", 
@@ -0,0 +1,166 @@
+"""
+Opt-in runtime memory monitor (MEMORY_MONITOR=1)
+Samples RSS in a background thread, optionally diffs tracemalloc snapshots,
+and breaks memory down by component so creep on the 512MB instance can be
+traced to the model, a cache or an index.
+"""
+import logging
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+from contextlib import contextmanager
+
+import psutil
+
+logger = logging.getLogger(__name__)
+
+MEMORY_MONITOR = os.getenv("MEMORY_MONITOR", "0") == "1"
+MEMORY_SAMPLE_SECONDS = float(os.getenv("MEMORY_SAMPLE_SECONDS", "30"))
+# tracemalloc slows allocations noticeably, so it is a separate switch
+MEMORY_TRACEMALLOC = os.getenv("MEMORY_TRACEMALLOC", "0") == "1"
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1"))
+# 240 samples = 2 hours at the default interval
+MEMORY_HISTORY = int(os.getenv("MEMORY_HISTORY", "240"))
+
+def rss_mb() -> float:
+    # Not cached: the pid changes when gunicorn forks workers from a preloaded app
+    return psutil.Process().memory_info().rss / 1024 / 1024
+
+def linear_slope(points):
+    """Least-squares slope of (x, y) points; 0.0 with fewer than two"""
+    n = len(points)
+    if n < 2:
+        return 0.0
+    mean_x = sum(x for x, _ in points) / n
+    mean_y = sum(y for _, y in points) / n
+    var_x = sum((x - mean_x) ** 2 for x, _ in points)
+    if var_x == 0:
+        return 0.0
+    return sum((x - mean_x) * (y - mean_y) for x, y in points) / var_x
+
+# ==================== COMPONENTS ====================
+
+_component_sizes = {}   # name -> callable returning bytes
+_component_loads = {}   # name -> RSS delta (MB) measured while loading
+
+def register_component(name: str, size_fn):
+    """Report a component's current size; size_fn returns bytes"""
+    _component_sizes[name] = size_fn
+
+@contextmanager
+def track_load(name: str):
+    """Record the RSS growth of loading a component (e.g. the model)"""
+    before = rss_mb()
+    try:
+        yield
+    finally:
+        _component_loads[name] = round(rss_mb() - before, 1)
+
+def component_breakdown():
+    breakdown = {name: {"loaded_rss_mb": delta} for name, delta in _component_loads.items()}
+    for name, size_fn in _component_sizes.items():
+        try:
+            breakdown.setdefault(name, {})["size_mb"] = round(size_fn() / 1024 / 1024, 2)
+        except Exception as e:
+            breakdown.setdefault(name, {})["error"] = str(e)
+    return breakdown
+
+# ==================== MONITOR ====================
+
+class MemoryMonitor:
+    """Background RSS sampler with optional tracemalloc snapshots"""
+
+    def __init__(self, interval=MEMORY_SAMPLE_SECONDS, history=MEMORY_HISTORY, trace=MEMORY_TRACEMALLOC):
+        self.interval = interval
+        self.trace = trace
+        self.samples = deque(maxlen=history)   # (unix time, rss MB)
+        self.started_at = None
+        self._baseline = None
+        self._previous = None
+        self._latest = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        if self.trace and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACEMALLOC_FRAMES)
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="memory-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Memory monitor started (every {self.interval}s, tracemalloc={self.trace})")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.sample()
+            self._stop.wait(self.interval)
+
+    def sample(self):
+        with self._lock:
+            self.samples.append((time.time(), rss_mb()))
+            if self.trace and tracemalloc.is_tracing():
+                snapshot = self._snapshot()
+                if self._baseline is None:
+                    self._baseline = snapshot
+                self._previous, self._latest = self._latest, snapshot
+
+    @staticmethod
+    def _snapshot():
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+
+    def rss_slope_mb_per_hour(self):
+        with self._lock:
+            points = [(t / 3600, mb) for t, mb in self.samples]
+        return round(linear_slope(points), 2)
+
+    def top_allocations(self, limit=15, since="baseline"):
+        """Largest allocation growth by source line, against the first or previous snapshot"""
+        with self._lock:
+            latest = self._latest
+            reference = self._baseline if since == "baseline" else self._previous
+        if latest is None or reference is None:
+            return []
+        stats = latest.compare_to(reference, "lineno")[:limit]
+        return [{
+            "location": str(stat.traceback[0]),
+            "size_diff_kb": round(stat.size_diff / 1024, 1),
+            "size_kb": round(stat.size / 1024, 1),
+            "count_diff": stat.count_diff,
+        } for stat in stats]
+
+    def report(self, limit=15, since="baseline"):
+        with self._lock:
+            samples = list(self.samples)
+        rss = [mb for _, mb in samples]
+        report = {
+            "enabled": True,
+            "rss_mb": round(rss_mb(), 1),
+            "rss_peak_mb": round(max(rss), 1) if rss else None,
+            "rss_slope_mb_per_hour": self.rss_slope_mb_per_hour(),
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at else None,
+            "samples": [{"t": round(t, 1), "rss_mb": round(mb, 1)} for t, mb in samples],
+            "components": component_breakdown(),
+            "tracemalloc": self.trace,
+        }
+        if self.trace and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            report["python_heap_mb"] = round(current / 1024 / 1024, 1)
+            report["python_heap_peak_mb"] = round(peak / 1024 / 1024, 1)
+            report["top_allocations"] = self.top_allocations(limit, since)
+        return report
+
+monitor = MemoryMonitor()
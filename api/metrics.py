@@ -0,0 +1,228 @@
+"""
+Request timing and Prometheus-style metrics
+- stage(): times a block (embed, db, external, serialize) for the current request
+- MetricsMiddleware: adds a Server-Timing header and records per-route histograms
+- render_metrics(): Prometheus text exposition served at /metrics
+- record_rejection() / register_gauge(): admission control (api/admission.py)
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from fastapi.responses import JSONResponse
+
+# Seconds; covers cached lookups up to a slow TMDB fallback
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestTimings:
+    """Per-request stage totals; shared with worker threads via the contextvar"""
+
+    def __init__(self):
+        self.stages = {}
+        self.outcome = None
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            total, calls = self.stages.get(name, (0.0, 0))
+            self.stages[name] = (total + seconds, calls + 1)
+
+_current = ContextVar("request_timings", default=None)
+
+@contextmanager
+def stage(name: str):
+    """Attribute the enclosed block to a stage of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings = _current.get()
+        if timings is not None:
+            timings.add(name, time.perf_counter() - start)
+
+# ==================== REGISTRY ====================
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.total = 0.0
+
+    def observe(self, value):
+        self.counts[bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.total += value
+
+class Registry:
+    """In-process metric store; one per worker, like the model singleton"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = {}   # (route, method, status) -> Histogram
+        self.stages = {}     # (route, stage) -> Histogram
+        self.outcomes = {}   # (route, outcome) -> count
+        self.cache = {}      # (cache, result) -> count
+        self.rejected = {}   # (pool, reason) -> count
+        self.gauges = {}     # name -> callable returning [(labels dict, value)]
+
+    def observe_request(self, route, method, status, seconds, timings):
+        with self._lock:
+            self.requests.setdefault((route, method, str(status)), Histogram()).observe(seconds)
+            for name, (total, _) in timings.stages.items():
+                self.stages.setdefault((route, name), Histogram()).observe(total)
+            if timings.outcome:
+                key = (route, timings.outcome)
+                self.outcomes[key] = self.outcomes.get(key, 0) + 1
+
+    def count_cache(self, cache, hit):
+        key = (cache, "hit" if hit else "miss")
+        with self._lock:
+            self.cache[key] = self.cache.get(key, 0) + 1
+
+    def count_rejection(self, pool, reason):
+        with self._lock:
+            self.rejected[(pool, reason)] = self.rejected.get((pool, reason), 0) + 1
+
+registry = Registry()
+
+def record_cache(cache: str, hit: bool):
+    """Count a cache lookup; exposed as cinelibre_cache_requests_total"""
+    registry.count_cache(cache, hit)
+
+def record_rejection(pool: str, reason: str):
+    """Count a request turned away by admission control; exposed as cinelibre_admission_rejected_total"""
+    registry.count_rejection(pool, reason)
+
+def register_gauge(name: str, values_fn):
+    """Export a gauge read at scrape time; values_fn returns [(labels dict, value)]"""
+    registry.gauges[name] = values_fn
+
+def _labels(**labels):
+    return ",".join(f'{k}="{str(v)}"' for k, v in labels.items())
+
+def _histogram_lines(name, series):
+    lines = [f"# TYPE {name} histogram"]
+    for labels, hist in series:
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS + (float("inf"),), hist.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f'{name}_bucket{{{labels},le="{le}"}} {cumulative}')
+        lines.append(f"{name}_sum{{{labels}}} {hist.total:.6f}")
+        lines.append(f"{name}_count{{{labels}}} {cumulative}")
+    return lines
+
+def render_metrics() -> str:
+    """Prometheus text format (version 0.0.4)"""
+    with registry._lock:
+        requests = sorted(registry.requests.items())
+        stages = sorted(registry.stages.items())
+        outcomes = sorted(registry.outcomes.items())
+        cache = sorted(registry.cache.items())
+        rejected = sorted(registry.rejected.items())
+        gauges = sorted(registry.gauges.items())
+
+    lines = _histogram_lines("cinelibre_request_duration_seconds", [
+        (_labels(route=route, method=method, status=status), hist) for (route, method, status), hist in requests
+    ])
+    lines += _histogram_lines("cinelibre_stage_duration_seconds", [
+        (_labels(route=route, stage=name), hist) for (route, name), hist in stages
+    ])
+    lines.append("# TYPE cinelibre_response_method_total counter")
+    lines += [f"cinelibre_response_method_total{{{_labels(route=route, method=outcome)}}} {n}" for (route, outcome), n in outcomes]
+    lines.append("# TYPE cinelibre_cache_requests_total counter")
+    lines += [f"cinelibre_cache_requests_total{{{_labels(cache=name, result=result)}}} {n}" for (name, result), n in cache]
+    lines.append("# TYPE cinelibre_admission_rejected_total counter")
+    lines += [f"cinelibre_admission_rejected_total{{{_labels(pool=pool, reason=reason)}}} {n}" for (pool, reason), n in rejected]
+    for name, values_fn in gauges:
+        lines.append(f"# TYPE {name} gauge")
+        lines += [f"{name}{{{_labels(**labels)}}} {value}" for labels, value in values_fn()]
+    return "\n".join(lines) + "\n"
+
+# ==================== INTEGRATION ====================
+
+class TimedJSONResponse(JSONResponse):
+    """JSONResponse that times rendering and notes the response's method/source"""
+
+    def render(self, content) -> bytes:
+        timings = _current.get()
+        if timings is not None and isinstance(content, dict):
+            # Fallback paths are visible through the "method" (recommendations) or "source" (search) key
+            outcome = content.get("method") or content.get("source")
+            if isinstance(outcome, str):
+                timings.outcome = outcome
+        with stage("serialize"):
+            return super().render(content)
+
+class _TimedBuilder:
+    """Wraps a postgrest builder so execute() counts as the db stage"""
+
+    def __init__(self, builder):
+        self._builder = builder
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if name == "execute":
+            def execute(*args, **kwargs):
+                with stage("db"):
+                    return attr(*args, **kwargs)
+            return execute
+        if callable(attr):
+            def chain(*args, **kwargs):
+                result = attr(*args, **kwargs)
+                return _TimedBuilder(result) if hasattr(result, "execute") else result
+            return chain
+        return attr
+
+class TimedClient:
+    """Database client proxy timing table() and rpc() queries"""
+
+    def __init__(self, client):
+        self._client = client
+
+    def table(self, name):
+        return _TimedBuilder(self._client.table(name))
+
+    def rpc(self, name, params=None, *args, **kwargs):
+        return _TimedBuilder(self._client.rpc(name, params or {}, *args, **kwargs))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: Server-Timing header plus per-route metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                parts = [
+                    f"{name};dur={total * 1000:.1f};desc=\"{calls} calls\""
+                    for name, (total, calls) in timings.stages.items()
+                ]
+                parts.append(f"total;dur={(time.perf_counter() - start) * 1000:.1f}")
+                message["headers"] = [*message.get("headers", []), (b"server-timing", ", ".join(parts).encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # Route templates keep label cardinality bounded (no raw ids)
+            registry.observe_request(
+                route.path if route is not None else "unmatched",
+                scope["method"], status, time.perf_counter() - start, timings
+            )
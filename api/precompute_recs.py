@@ -0,0 +1,483 @@
+"""
+Precompute personalized recommendations for recently active users
+Runs after the nightly sync. Loads every rating and the catalog embedding
+matrix once, scores all active users in blocks with numpy, and stores the
+top-N per user in user_recommendations (migration 11), which
+/recommendations/personalized serves from. Users with no row, or whose row
+is stale (they rated since) or older than RECS_MAX_AGE_HOURS, still get the
+live RPC path.
+
+    python -m api.precompute_recs                      # users active in the last 30 days
+    python -m api.precompute_recs --days 7 --top-n 50 --report recs-report.json
+
+Scoring mirrors the live path:
+- collaborative: user-user Pearson correlation over co-rated items (>= 2 in
+  common, > 0.2, top 50 neighbours) and similarity-weighted mean ratings,
+  like get_collaborative_recommendations
+- content-based, for users without collaborative results: items most
+  similar to their (up to 5) best ratings >= 3.5, same type, similarity > 0.3,
+  topped up with their strongest implicit signals (user_item_signals,
+  migration 12), so users who never rate still get recommendations
+Each list is scored MMR_POOL_FACTOR times deeper and re-ranked for
+diversity like the live results (api/ranking.py).
+
+Before scoring, the job folds new interactions into user_item_signals
+(rollup_user_item_signals) so the signals are current as of the snapshot.
+
+Ratings are held as sparse users x rated-items matrices, so memory grows
+with the number of ratings; only the score blocks are dense.
+"""
+import argparse
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+from scipy import sparse
+
+from api.ranking import MMR_LAMBDA, candidate_pool, diversity_groups, group_cap, maximal_marginal_relevance
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Recommendations stored per user; the API serves requests up to this limit (RECS_TOP_N there too)
+RECS_TOP_N = int(os.getenv("RECS_TOP_N", "50"))
+RECS_ACTIVE_DAYS = int(os.getenv("RECS_ACTIVE_DAYS", "30"))
+# PostgREST caps responses at 1000 rows by default
+RECS_PAGE_SIZE = int(os.getenv("RECS_PAGE_SIZE", "1000"))
+RECS_WRITE_BATCH = int(os.getenv("RECS_WRITE_BATCH", "100"))
+# Upper bound on the cells of each score block (users in the block x users or items).
+# Peak memory is about 16 float64 matrices of this size (~130MB at the default)
+RECS_BLOCK_CELLS = int(os.getenv("RECS_BLOCK_CELLS", str(1 << 20)))
+# Interactions folded into user_item_signals per rollup call
+SIGNALS_ROLLUP_BATCH = int(os.getenv("SIGNALS_ROLLUP_BATCH", "50000"))
+
+# get_collaborative_recommendations
+CF_MIN_COMMON = 2
+CF_MIN_SIMILARITY = 0.2
+CF_NEIGHBOURS = 50
+CF_MIN_AVG_RATING = 3.0
+
+# get_content_based_recommendations in api/main.py
+CB_MIN_RATING = 3.5
+CB_SEEDS = 5
+CB_THRESHOLD = 0.3
+
+# item_type -> (table, poster column, diversity group columns)
+TYPES = {
+    "movie": ("movies", "poster_url", "language, genres"),
+    "book": ("books", "thumbnail_url", "language, categories"),
+}
+
+# ==================== LOADING ====================
+
+def fetch_pages(db, table, columns, page_size=RECS_PAGE_SIZE):
+    """Yield pages of table in id order (keyset pagination)"""
+    last_id = None
+    while True:
+        query = db.table(table).select(columns)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1]["id"]
+
+def parse_vector(value):
+    """pgvector columns come back from PostgREST as text"""
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+class Catalog:
+    """Every movie and book: (item_type, id) keys, display fields, diversity groups and unit-norm embeddings
+
+    Rows without an embedding get a zero vector, so they never pass the
+    content-based similarity threshold.
+    """
+
+    def __init__(self, db, page_size=RECS_PAGE_SIZE):
+        self.keys, self.titles, self.posters, self.groups, vectors, is_book = [], [], [], [], [], []
+        dim = None
+        for item_type, (table, poster_column, group_columns) in TYPES.items():
+            columns = f"id, title, {poster_column}, {group_columns}, embedding"
+            for rows in fetch_pages(db, table, columns, page_size):
+                for row in rows:
+                    self.keys.append((item_type, str(row["id"])))
+                    self.titles.append(row["title"])
+                    self.posters.append(row.get(poster_column))
+                    self.groups.append(diversity_groups(row))
+                    vector = parse_vector(row["embedding"]) if row.get("embedding") else None
+                    if vector is not None:
+                        dim = len(vector)
+                    vectors.append(vector)
+                    is_book.append(item_type == "book")
+        dim = dim or 1
+        self.vectors = np.zeros((len(self.keys), dim), dtype=np.float32)
+        for i, vector in enumerate(vectors):
+            if vector is not None:
+                norm = np.linalg.norm(vector)
+                if norm:
+                    self.vectors[i] = vector / norm
+        self.is_book = np.array(is_book, dtype=bool)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+
+    def __len__(self):
+        return len(self.keys)
+
+class Ratings:
+    """All ratings as sparse (CSR) users x rated-items matrices
+
+    values holds ratings minus their global mean (Pearson sums over
+    co-rated items lose less precision around zero) and mask is 1 where a
+    rating exists. Both share one sparsity structure, so a rating equal to
+    the mean is still stored. Items missing from the catalog still count
+    towards user similarity but are never recommended (item_catalog is -1
+    for them).
+    """
+
+    def __init__(self, db, catalog, page_size=RECS_PAGE_SIZE):
+        user_ids, item_keys, values = [], [], []
+        for rows in fetch_pages(db, "ratings", "id, user_id, item_id, item_type, rating", page_size):
+            for row in rows:
+                user_ids.append(row["user_id"])
+                item_keys.append((row["item_type"], str(row["item_id"])))
+                values.append(float(row["rating"]))
+
+        self.user_ids = sorted(set(user_ids))
+        self.user_index = {u: i for i, u in enumerate(self.user_ids)}
+        self.item_keys = sorted(set(item_keys))
+        item_index = {k: i for i, k in enumerate(self.item_keys)}
+        self.item_catalog = np.array([catalog.index.get(k, -1) for k in self.item_keys], dtype=np.int64)
+
+        rows = np.array([self.user_index[u] for u in user_ids], dtype=np.int64)
+        cols = np.array([item_index[k] for k in item_keys], dtype=np.int64)
+        ratings = np.array(values, dtype=np.float64)
+        self.mean = float(ratings.mean()) if len(ratings) else 0.0
+        shape = (len(self.user_ids), len(self.item_keys))
+        # (user_id, item_id, item_type) is unique, so no entries are summed
+        self.values = sparse.csr_matrix((ratings - self.mean, (rows, cols)), shape=shape)
+        self.values.sort_indices()
+        self.mask = self.values.copy()
+        self.mask.data[:] = 1.0
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def nbytes(self):
+        return sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes for m in (self.values, self.mask))
+
+    def row(self, row):
+        """Item columns (ascending) and mean-centred ratings of one user row"""
+        start, end = self.values.indptr[row], self.values.indptr[row + 1]
+        return self.values.indices[start:end], self.values.data[start:end]
+
+def rollup_signals(db, batch_size=SIGNALS_ROLLUP_BATCH):
+    """Fold interactions past the watermark into user_item_signals; returns how many"""
+    folded = 0
+    while True:
+        count = db.rpc("rollup_user_item_signals", {"batch_size": batch_size}).execute().data or 0
+        folded += count
+        if count < batch_size:
+            return folded
+
+def load_signals(db, catalog, users, per_user=CB_SEEDS, page_size=RECS_PAGE_SIZE):
+    """Each user's strongest implicit signals as catalog indices, strongest first"""
+    signals = {}
+    chunk = max(1, page_size // per_user)
+    for start in range(0, len(users), chunk):
+        rows = db.rpc("get_user_signals", {
+            "user_ids": users[start:start + chunk], "per_user": per_user,
+        }).execute().data or []
+        for row in rows:
+            c = catalog.index.get((row["item_type"], str(row["item_id"])))
+            if c is not None:
+                signals.setdefault(row["user_id"], []).append(c)
+    return signals
+
+# ==================== SCORING ====================
+
+def top_indices(scores, n):
+    """Column indices of the n highest finite scores per row, best first (-1 pads)"""
+    n = min(n, scores.shape[1])
+    if n == 0:
+        return np.full((scores.shape[0], 0), -1, dtype=np.int64)
+    idx = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    picked = np.take_along_axis(scores, idx, axis=1)
+    order = np.argsort(-picked, axis=1, kind="stable")
+    idx = np.take_along_axis(idx, order, axis=1)
+    picked = np.take_along_axis(picked, order, axis=1)
+    return np.where(np.isfinite(picked), idx, -1)
+
+class NeighbourPool:
+    """Users with enough ratings to ever be a neighbour, and their (sparse) rating rows"""
+
+    def __init__(self, ratings):
+        # Fewer than CF_MIN_COMMON ratings can never share enough items with anyone
+        self.rows = np.nonzero(np.diff(ratings.mask.indptr) >= CF_MIN_COMMON)[0]
+        self.values = ratings.values[self.rows]
+        self.mask = ratings.mask[self.rows]
+        self.squares = self.values.multiply(self.values).tocsr()
+
+    def __len__(self):
+        return len(self.rows)
+
+def collaborative_block(ratings, rows, pool, top_n):
+    """Predicted ratings for users rows (indices into ratings): (item columns, scores) per user
+
+    The block's rows are dense, the pool stays sparse: each product below
+    is sparse x dense, written pool-first so its cost follows the pool's
+    ratings rather than pool x items.
+    """
+    a, am = ratings.values[rows].toarray(), ratings.mask[rows].toarray()
+    pv, pm = pool.values, pool.mask
+
+    # Pearson correlation of each (user, neighbour) pair over the items both rated
+    n, sx, sxx = np.split((pm @ np.vstack([am, a, a * a]).T).T, 3)
+    sy, sxy = np.split((pv @ np.vstack([am, a]).T).T, 2)
+    syy = (pool.squares @ am.T).T
+    cov = n * sxy - sx * sy
+    var = (n * sxx - sx * sx) * (n * syy - sy * sy)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        corr = np.where((n >= CF_MIN_COMMON) & (var > 1e-9), cov / np.sqrt(var), -np.inf)
+    corr[rows[:, None] == pool.rows[None, :]] = -np.inf
+    corr[corr <= CF_MIN_SIMILARITY] = -np.inf
+
+    neighbours = top_indices(corr, CF_NEIGHBOURS)
+    weights = np.zeros_like(corr)
+    valid = neighbours >= 0
+    block_rows = np.nonzero(valid)[0]
+    weights[block_rows, neighbours[valid]] = corr[block_rows, neighbours[valid]]
+
+    # Similarity-weighted mean rating over the neighbours who rated each item;
+    # HAVING AVG(rating) >= 3 is the neighbours' plain mean
+    raters = (weights > 0).astype(np.float64)
+    rated_by, raters_n = np.split((pm.T @ np.vstack([weights, raters]).T).T, 2)
+    weighted, raters_sum = np.split((pv.T @ np.vstack([weights, raters]).T).T, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        predicted = weighted / rated_by + ratings.mean
+        plain_mean = raters_sum / raters_n + ratings.mean
+    candidate = (rated_by > 0) & (plain_mean >= CF_MIN_AVG_RATING) & (am == 0) & (ratings.item_catalog >= 0)
+    scores = np.where(candidate, predicted, -np.inf)
+    items = top_indices(scores, top_n)
+    return items, np.take_along_axis(scores, np.maximum(items, 0), axis=1)
+
+def rated_items(ratings, user_id):
+    """Catalog indices of every item user_id rated"""
+    row = ratings.user_index.get(user_id)
+    if row is None:
+        return np.zeros(0, dtype=np.int64)
+    rated = ratings.item_catalog[ratings.row(row)[0]]
+    return rated[rated >= 0]
+
+def content_seeds(ratings, catalog, users, signals):
+    """Each user's seed items as catalog indices (-1 pads), and which users have only implicit seeds
+
+    Seeds are the user's best ratings >= CB_MIN_RATING (up to CB_SEEDS),
+    topped up with their strongest signals on items they have not rated.
+    """
+    seeds = np.full((len(users), CB_SEEDS), -1, dtype=np.int64)
+    implicit = np.zeros(len(users), dtype=bool)
+    for i, user_id in enumerate(users):
+        liked = []
+        row = ratings.user_index.get(user_id)
+        if row is not None:
+            columns, values = ratings.row(row)
+            good = np.nonzero((values + ratings.mean >= CB_MIN_RATING) & (ratings.item_catalog[columns] >= 0))[0]
+            liked = ratings.item_catalog[columns[good[np.argsort(-values[good], kind="stable")]][:CB_SEEDS]].tolist()
+        rated = set(rated_items(ratings, user_id).tolist())
+        picked = (liked + [c for c in signals.get(user_id, ()) if c not in rated])[:CB_SEEDS]
+        seeds[i, :len(picked)] = picked
+        implicit[i] = bool(picked) and not liked
+    return seeds, implicit
+
+def content_block(ratings, catalog, users, signals, top_n):
+    """Catalog items most similar to each user's seeds: (items, similarities, seed per item, implicit)"""
+    seeds, implicit = content_seeds(ratings, catalog, users, signals)
+    # One 2-D GEMM (a stacked users x seeds matmul skips BLAS), reshaped to users x seeds x items
+    sims = (catalog.vectors[np.maximum(seeds, 0).ravel()] @ catalog.vectors.T).reshape(len(users), CB_SEEDS, -1)
+    # Only the seed's own type, like the per-seed match RPC
+    sims[catalog.is_book[np.maximum(seeds, 0)][:, :, None] != catalog.is_book[None, None, :]] = -np.inf
+    sims[seeds < 0] = -np.inf
+    best_seed = sims.argmax(axis=1)
+    scores = np.take_along_axis(sims, best_seed[:, None, :], axis=1)[:, 0, :]
+
+    for i, user_id in enumerate(users):
+        # Rated items, and items the user already interacted with enough to seed from
+        scores[i, rated_items(ratings, user_id)] = -np.inf
+        scores[i, seeds[i][seeds[i] >= 0]] = -np.inf
+    scores[scores <= CB_THRESHOLD] = -np.inf
+    items = top_indices(scores, top_n)
+    safe = np.maximum(items, 0)
+    similarity = np.take_along_axis(scores, safe, axis=1)
+    based_on = seeds[np.arange(len(users))[:, None], np.take_along_axis(best_seed, safe, axis=1)]
+    return items, similarity, based_on, implicit
+
+# ==================== JOB ====================
+
+def blocks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def diversify(recs, items, catalog, top_n, relevance_key):
+    """MMR re-rank (api/ranking.py) of a user's candidates, items being their catalog rows"""
+    if MMR_LAMBDA >= 1:
+        return recs[:top_n]
+    groups = {rec["item_id"]: catalog.groups[c] for rec, c in zip(recs, items)}
+    return maximal_marginal_relevance(
+        recs, catalog.vectors[items], top_n, relevance_key,
+        groups=lambda rec: groups[rec["item_id"]], max_per_group=group_cap(top_n),
+    )
+
+def recommend_users(ratings, catalog, users, top_n=RECS_TOP_N, stats=None, signals=None):
+    """Yield (user_id, recommendations, method) for users that get any recommendation
+
+    signals maps user ids to their implicit-signal catalog indices (load_signals).
+    """
+    stats = stats if stats is not None else {}
+    signals = signals or {}
+    for key in ("collaborative_filtering", "content_based", "implicit_feedback", "no_history", "empty"):
+        stats.setdefault(key, 0)
+    rows = np.array([ratings.user_index[u] for u in users if u in ratings.user_index], dtype=np.int64)
+    # Users who never rated can still be seeded from what they viewed and clicked
+    content_users = [u for u in users if u not in ratings.user_index and u in signals]
+    stats["no_history"] += len(users) - len(rows) - len(content_users)
+    pool = NeighbourPool(ratings)
+
+    cf_size = max(1, RECS_BLOCK_CELLS // max(len(pool), len(ratings.item_keys), 1))
+    cb_size = max(1, RECS_BLOCK_CELLS // max(CB_SEEDS * len(catalog), 1))
+    for block in blocks(rows, cf_size):
+        items, scores = collaborative_block(ratings, block, pool, candidate_pool(top_n)) if len(pool) else (None, None)
+        for i, row in enumerate(block):
+            picked = [] if items is None else [(j, s) for j, s in zip(items[i], scores[i]) if j >= 0]
+            if not picked:
+                content_users.append(ratings.user_ids[row])
+                continue
+            recs, picked_items = [], []
+            for j, score in picked:
+                c = ratings.item_catalog[j]
+                picked_items.append(c)
+                item_type, item_id = catalog.keys[c]
+                recs.append({
+                    "item_id": item_id,
+                    "item_type": item_type,
+                    "title": catalog.titles[c],
+                    "predicted_rating": round(float(score), 4),
+                    "poster_url": catalog.posters[c],
+                })
+            stats["collaborative_filtering"] += 1
+            recs = diversify(recs, picked_items, catalog, top_n, "predicted_rating")
+            yield int(ratings.user_ids[row]), recs, "collaborative_filtering"
+
+    for block in blocks(content_users, cb_size):
+        items, similarity, based_on, implicit = content_block(ratings, catalog, block, signals, candidate_pool(top_n))
+        for i, user_id in enumerate(block):
+            recs = []
+            for c, score, seed in zip(items[i], similarity[i], based_on[i]):
+                if c < 0:
+                    break
+                item_type, item_id = catalog.keys[c]
+                recs.append({
+                    "item_id": item_id,
+                    "item_type": item_type,
+                    "title": catalog.titles[c],
+                    "poster_url": catalog.posters[c],
+                    "similarity": round(float(score), 4),
+                    "based_on": catalog.keys[seed][1],
+                })
+            if not recs:
+                # The live path answers these with recent items; nothing worth storing
+                stats["empty"] += 1
+                continue
+            method = "implicit_feedback" if implicit[i] else "content_based"
+            stats[method] += 1
+            recs = diversify(recs, items[i][:len(recs)], catalog, top_n, "similarity")
+            yield int(user_id), recs, method
+
+def active_users(db, days):
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    return db.rpc("get_active_user_ids", {"since": since}).execute().data or []
+
+def precompute(db, days=RECS_ACTIVE_DAYS, top_n=RECS_TOP_N, page_size=RECS_PAGE_SIZE,
+               write_batch=RECS_WRITE_BATCH):
+    """Score and store recommendations for users active in the last days; returns the run report"""
+    report = {"days": days, "top_n": top_n, "timings_s": {}}
+    timings = report["timings_s"]
+    start = time.perf_counter()
+
+    t = time.perf_counter()
+    report["interactions_rolled_up"] = rollup_signals(db)
+    timings["rollup"] = round(time.perf_counter() - t, 2)
+
+    t = time.perf_counter()
+    users = active_users(db, days)
+    # Results reflect the ratings as of now; anything rated later invalidates them
+    snapshot_at = datetime.now(timezone.utc).isoformat()
+    catalog = Catalog(db, page_size)
+    ratings = Ratings(db, catalog, page_size)
+    signals = load_signals(db, catalog, users, page_size=page_size)
+    timings["load"] = round(time.perf_counter() - t, 2)
+    logger.info(f"{len(users)} active users; {len(catalog)} catalog items, {ratings.values.nnz} ratings "
+                f"by {len(ratings)} users on {len(ratings.item_keys)} items "
+                f"({ratings.nbytes / 1e6:.1f}MB rating matrices); "
+                f"{len(signals)} users with implicit signals")
+
+    stats = {}
+    written = 0
+    score_s = write_s = 0.0
+    batch = []
+    t = time.perf_counter()
+    for user_id, recs, method in recommend_users(ratings, catalog, users, top_n, stats, signals):
+        batch.append({"user_id": user_id, "recommendations": recs, "method": method})
+        if len(batch) >= write_batch:
+            score_s += time.perf_counter() - t
+            t = time.perf_counter()
+            written += db.rpc("write_user_recommendations", {"items": batch, "snapshot_at": snapshot_at}).execute().data or 0
+            write_s += time.perf_counter() - t
+            logger.info(f"Stored recommendations for {written} users")
+            batch = []
+            t = time.perf_counter()
+    score_s += time.perf_counter() - t
+    if batch:
+        t = time.perf_counter()
+        written += db.rpc("write_user_recommendations", {"items": batch, "snapshot_at": snapshot_at}).execute().data or 0
+        write_s += time.perf_counter() - t
+
+    timings["score"] = round(score_s, 2)
+    timings["write"] = round(write_s, 2)
+    report.update({
+        "snapshot_at": snapshot_at,
+        "active_users": len(users),
+        "catalog_items": len(catalog),
+        "rated_items": len(ratings.item_keys),
+        "users_with_signals": len(signals),
+        "methods": stats,
+        "written": written,
+        "seconds": round(time.perf_counter() - start, 2),
+    })
+    scored = len(users) - stats.get("no_history", 0)
+    report["users_per_s"] = round(scored / score_s, 1) if score_s else None
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="Precompute personalized recommendations for active users")
+    parser.add_argument("--days", type=int, default=RECS_ACTIVE_DAYS, help="Users who rated or interacted within this many days")
+    parser.add_argument("--top-n", type=int, default=RECS_TOP_N, help="Recommendations stored per user")
+    parser.add_argument("--page-size", type=int, default=RECS_PAGE_SIZE)
+    parser.add_argument("--report", help="Write the run report as JSON to this path")
+    args = parser.parse_args()
+
+    from api.database import get_db
+
+    report = precompute(get_db(), args.days, args.top_n, args.page_size)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Result ranking helpers shared by the search and recommendation endpoints
+"""
+import json
+import math
+import os
+from typing import Callable, Dict, Iterable, List, Optional
+
+# Standard RRF damping constant; keeps one list's top hit from dominating
+RRF_K = 60
+
+def reciprocal_rank_fusion(result_lists: List[List[Dict]], limit: int, key: str = "id", k: int = RRF_K) -> List[Dict]:
+    """Merge ranked result lists by reciprocal rank fusion
+
+    Each item scores sum(1 / (k + rank)) over the lists it appears in. The
+    first occurrence of an item is kept and annotated with `rrf_score`.
+    """
+    scores = {}
+    items = {}
+    for results in result_lists:
+        for rank, item in enumerate(results, start=1):
+            item_id = str(item.get(key))
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+            items.setdefault(item_id, item)
+
+    ranked = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [{**items[item_id], "rrf_score": round(scores[item_id], 6)} for item_id in ranked]
+
+# Maximal marginal relevance re-ranking: relevance weight (1 ranks by relevance
+# alone, i.e. disables it), candidates fetched per returned result, and the
+# share of a recommendation page one language / genre / category may fill.
+# Off by default: the re-rank fetches every candidate's embedding in a second
+# round trip, which roughly doubles the latency of the endpoints that use it
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", "1"))
+MMR_POOL_FACTOR = int(os.getenv("MMR_POOL_FACTOR", "3"))
+MMR_MAX_GROUP_SHARE = float(os.getenv("MMR_MAX_GROUP_SHARE", "0.5"))
+
+def candidate_pool(limit: int) -> int:
+    """Candidates to fetch for a page of limit results"""
+    return limit * MMR_POOL_FACTOR if MMR_LAMBDA < 1 else limit
+
+def group_cap(limit: int) -> Optional[int]:
+    """Picks allowed per language / genre / category on a page of limit results"""
+    return math.ceil(MMR_MAX_GROUP_SHARE * limit) if MMR_MAX_GROUP_SHARE < 1 else None
+
+def diversity_groups(row: Optional[Dict]) -> List:
+    """Values a page should not be dominated by: language, and genres (movies) or category (books)"""
+    if not row:
+        return []
+    values = [("language", row.get("language")), ("category", row.get("categories"))] + \
+        [("genre", genre) for genre in row.get("genres") or []]
+    return [(kind, value) for kind, value in values if value]
+
+def _vector(value):
+    """pgvector text from PostgREST, a list or an array; None if missing"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = json.loads(value)
+    return value
+
+def maximal_marginal_relevance(
+    items: List[Dict],
+    embeddings: List,
+    limit: int,
+    relevance_key: Optional[str] = "similarity",
+    lambda_: float = MMR_LAMBDA,
+    groups: Optional[Callable[[Dict], Iterable]] = None,
+    max_per_group: Optional[int] = None,
+) -> List[Dict]:
+    """Re-rank a best-first candidate pool for diversity, returning up to limit items
+
+    Greedy MMR: each step takes the candidate maximising
+    lambda * relevance - (1 - lambda) * (max cosine similarity to the picks so far).
+    Relevance is item[relevance_key] (rank order when missing), divided by
+    the pool's best so lambda means much the same for cosine similarities,
+    predicted ratings and RRF scores. Redundancy is kept as a running max,
+    so each step costs one matrix-vector product against the latest pick
+    rather than a pass over every pair.
+
+    groups maps an item to the values it counts against (e.g. its language
+    and genres); no value is used by more than max_per_group picks while
+    another candidate can fill the slot. Candidates without an embedding
+    are never penalised. Picks are annotated with `mmr_score`.
+    """
+    import numpy as np
+
+    n = len(items)
+    if n <= 1 or limit <= 0:
+        return items[:max(limit, 0)]
+
+    if isinstance(embeddings, np.ndarray):
+        vectors = embeddings.astype(np.float32)
+    else:
+        rows = [_vector(e) for e in embeddings]
+        if all(row is not None for row in rows):
+            vectors = np.array(rows, dtype=np.float32)
+        else:
+            dim = next((len(r) for r in rows if r is not None), 0)
+            vectors = np.zeros((n, dim), dtype=np.float32)
+            for i, row in enumerate(rows):
+                if row is not None:
+                    vectors[i] = row
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors /= np.where(norms > 0, norms, 1.0)
+
+    if relevance_key and all(item.get(relevance_key) is not None for item in items):
+        relevance = np.array([float(item[relevance_key]) for item in items])
+    else:
+        relevance = 1.0 - np.arange(n) / n
+    top = relevance.max()
+    relevance = relevance / top if top > 0 else np.ones(n)
+
+    members = {}
+    if groups is not None and max_per_group:
+        for i, item in enumerate(items):
+            for value in set(groups(item) or ()):
+                if value is not None:
+                    members.setdefault(value, []).append(i)
+    members = {value: np.array(indices) for value, indices in members.items()}
+    used = dict.fromkeys(members, 0)
+
+    base = lambda_ * relevance
+    # 0, or -inf once a candidate is picked / once one of its groups is full
+    taken = np.zeros(n)
+    capped = np.zeros(n)
+    redundancy = np.zeros(n)
+    picked = []
+    for _ in range(min(limit, n)):
+        score = base - (1 - lambda_) * redundancy + taken
+        best = int(np.argmax(score + capped))
+        if capped[best]:
+            # Every candidate left is capped: relax the cap rather than return fewer results
+            best = int(np.argmax(score))
+        picked.append((best, float(score[best])))
+        taken[best] = -np.inf
+        np.maximum(redundancy, vectors @ vectors[best], out=redundancy)
+        if members:
+            for value in set(groups(items[best]) or ()):
+                if value in used:
+                    used[value] += 1
+                    if used[value] == max_per_group:
+                        capped[members[value]] = -np.inf
+    return [{**items[i], "mmr_score": round(score, 6)} for i, score in picked]
@@ -0,0 +1,147 @@
+"""
+Re-embed the catalog with a new model, without downtime
+Streams movies/books in keyset pages, embeds title + overview/description
+with the new model (the sync engine's process pool) and writes the vectors
+into the embedding_next shadow column while the API keeps serving embedding.
+Rows that already have embedding_next are skipped, so an interrupted run
+resumes where it stopped. --promote then swaps the columns atomically
+(promote_embedding_model, migration 10).
+
+    python -m api.reembed --model BAAI/bge-small-en-v1.5
+    python -m api.reembed --model BAAI/bge-small-en-v1.5 --promote
+    # then redeploy the sync job (and the API) with EMBEDDING_MODEL=BAAI/bge-small-en-v1.5
+
+API workers notice the promote within EMBEDDING_MODEL_CHECK_SECONDS and
+switch to the new model in the background, serving lexical matches while
+it loads (see embedding_model_matches in api/main.py). Rolling back is a
+promote of the previous model, whose vectors stay in embedding_next.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from api.embeddings import EMBEDDING_DIM, active_embedding_model, model_dim
+from api.sync_engine import SyncContext, iter_embeddings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+REEMBED_PAGE_SIZE = int(os.getenv("REEMBED_PAGE_SIZE", "256"))
+
+# Same text the sync engine embeds: "<title>. <text column>"
+TEXT_COLUMNS = {"movies": "overview", "books": "description"}
+
+def item_text(table, row):
+    return f"{row['title']}. {row.get(TEXT_COLUMNS[table]) or ''}"
+
+def remaining(db, table):
+    return db.table(table).select("id", count="exact").is_("embedding_next", "null").limit(1).execute().count or 0
+
+def claim_shadow(db, model_name, reset=False):
+    """Make model_name the 'next' model, refusing to overwrite another model's shadow vectors"""
+    rows = db.table("embedding_models").select("model_name, status").in_("status", ["active", "next"]).execute().data
+    by_status = {r["status"]: r["model_name"] for r in rows}
+    if by_status.get("active") == model_name:
+        sys.exit(f"{model_name} is already the active model")
+    current = by_status.get("next")
+    if current and current != model_name:
+        if not reset:
+            sys.exit(f"embedding_next holds {current} vectors; pass --reset to discard them")
+        logger.info(f"Discarding {current} shadow vectors...")
+        db.rpc("reset_next_embeddings", {}).execute()
+        current = None
+    if current is None:
+        db.table("embedding_models").upsert(
+            {"model_name": model_name, "status": "next", "dim": EMBEDDING_DIM}, on_conflict="model_name"
+        ).execute()
+
+def backfill_table(db, ctx, table, page_size, stats):
+    """Fill embedding_next for every row of table that lacks it, in id order"""
+    total = remaining(db, table)
+    logger.info(f"{table}: {total} rows to embed")
+    entry = stats.setdefault(table, {"rows": 0, "failed": 0, "fetch_s": 0.0, "embed_s": 0.0, "write_s": 0.0})
+    start = time.perf_counter()
+    last_id = None
+    while True:
+        t = time.perf_counter()
+        query = db.table(table).select(f"id, title, {TEXT_COLUMNS[table]}").is_("embedding_next", "null")
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        rows = query.order("id").limit(page_size).execute().data
+        entry["fetch_s"] += time.perf_counter() - t
+        if not rows:
+            break
+        last_id = rows[-1]["id"]
+
+        t = time.perf_counter()
+        vectors = list(iter_embeddings([item_text(table, r) for r in rows], ctx))
+        entry["embed_s"] += time.perf_counter() - t
+
+        items = [{"id": r["id"], "embedding": v} for r, v in zip(rows, vectors) if v is not None]
+        entry["failed"] += len(rows) - len(items)
+        t = time.perf_counter()
+        if items:
+            db.rpc("write_next_embeddings", {"target_table": table, "items": items}).execute()
+        entry["write_s"] += time.perf_counter() - t
+        entry["rows"] += len(items)
+
+        elapsed = time.perf_counter() - start
+        rate = entry["rows"] / elapsed if elapsed else 0.0
+        eta = (total - entry["rows"]) / rate if rate else 0.0
+        logger.info(f"{table}: {entry['rows']}/{total} ({rate:.1f} rows/s, ETA {eta / 60:.1f} min; "
+                    f"fetch {entry['fetch_s']:.1f}s, embed {entry['embed_s']:.1f}s, write {entry['write_s']:.1f}s)")
+    entry["seconds"] = round(time.perf_counter() - start, 2)
+    entry["rows_per_s"] = round(entry["rows"] / entry["seconds"], 2) if entry["seconds"] else None
+    for key in ("fetch_s", "embed_s", "write_s"):
+        entry[key] = round(entry[key], 2)
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill embedding_next with a new embedding model")
+    parser.add_argument("--model", required=True, help="fastembed model name (384-dim)")
+    parser.add_argument("--page-size", type=int, default=REEMBED_PAGE_SIZE)
+    parser.add_argument("--tables", nargs="+", default=["movies", "books"], choices=["movies", "books"])
+    parser.add_argument("--reset", action="store_true", help="Discard another model's shadow vectors first")
+    parser.add_argument("--promote", action="store_true", help="Swap embedding_next in once the backfill is complete")
+    parser.add_argument("--report", help="Write the throughput report as JSON to this path")
+    args = parser.parse_args()
+
+    # Fail before touching the database if the model cannot fit vector(384)
+    if model_dim(args.model) != EMBEDDING_DIM:
+        sys.exit(f"{args.model} does not produce {EMBEDDING_DIM}-dim vectors")
+
+    ctx = SyncContext(model_name=args.model)
+    db = ctx.db
+    claim_shadow(db, args.model, args.reset)
+
+    stats = {}
+    start = time.perf_counter()
+    for table in args.tables:
+        backfill_table(db, ctx, table, args.page_size, stats)
+
+    report = {
+        "model": args.model,
+        "previous_model": active_embedding_model(db),
+        "tables": stats,
+    }
+    if args.promote:
+        # Rows the sync or the TMDB fallback inserted meanwhile can sit behind the
+        # keyset cursor (ids are random UUIDs); top them up. promote_embedding_model
+        # re-checks under a lock and refuses if anything is still missing.
+        for table in ("movies", "books"):
+            if remaining(db, table):
+                backfill_table(db, ctx, table, args.page_size, stats)
+        report["promoted"] = db.rpc("promote_embedding_model", {"new_model": args.model}).execute().data
+        logger.info(f"Promoted {args.model}; the API switches on its own, redeploy the sync job "
+                    f"(and the API) with EMBEDDING_MODEL={args.model}")
+    ctx.close()
+    report["seconds"] = round(time.perf_counter() - start, 2)
+    print(json.dumps(report, indent=2))
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
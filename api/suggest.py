@@ -0,0 +1,253 @@
+"""
+In-memory title prefix index for /search/suggest (typeahead)
+Every movie and book title is normalized (accents stripped, case-folded,
+punctuation collapsed) and indexed under each of its words, so "baahu" and
+"beginning" both find "Baahubali: The Beginning". Keys live in one sorted
+list and a prefix is answered with two bisects plus a scan of the matching
+range; the most common short prefixes (SUGGEST_PRECOMPUTED_CHARS) have their
+top results precomputed, so no lookup scans a large share of the catalog.
+
+Results are ranked by popularity (ratings plus this week's decayed
+interactions, get_suggest_titles, migration 14), with titles that start with
+the prefix ahead of titles where only a later word does.
+
+The index is loaded once per worker and rebuilt in the background every
+SUGGEST_REFRESH_SECONDS, so titles added by the nightly sync show up within
+that interval. With SUGGEST_SNAPSHOT set, a rebuild from the database also
+writes the rows to that file and workers load from it while it is fresh,
+so one worker pays for the database read per interval:
+
+    python -m api.suggest --snapshot /tmp/suggest.json   # e.g. after the sync
+"""
+import argparse
+import heapq
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "3600"))
+SUGGEST_SNAPSHOT = os.getenv("SUGGEST_SNAPSHOT")
+# Prefixes up to this long match too much of the catalog to scan per request
+SUGGEST_PRECOMPUTED_CHARS = int(os.getenv("SUGGEST_PRECOMPUTED_CHARS", "2"))
+SUGGEST_MAX_LIMIT = 20
+# PostgREST caps responses at 1000 rows by default
+SUGGEST_PAGE_SIZE = int(os.getenv("SUGGEST_PAGE_SIZE", "1000"))
+
+ITEM_TYPES = ("movie", "book")
+
+_NON_WORD = re.compile(r"[\W_]+")
+
+def normalize(text: str) -> str:
+    """Case-folded, accent-free words separated by single spaces"""
+    text = (text or "").casefold()
+    if text.isascii():
+        return _NON_WORD.sub(" ", text).strip()
+    chars, previous = [], " "
+    for c in unicodedata.normalize("NFKD", text):
+        if unicodedata.category(c)[0] == "M":
+            # Accents on Latin letters go; vowel signs in Indic scripts are part of the word
+            if previous.isascii():
+                continue
+        elif not c.isalnum():
+            c = " "
+        chars.append(c)
+        previous = c
+    return " ".join("".join(chars).split())
+
+class SuggestIndex:
+    """Sorted prefix index over one item type's titles
+
+    items are kept most popular first, so an item's position is its rank.
+    Each key (the normalized title from one of its words on) maps to a code:
+    the item's position for keys that are the whole title, position +
+    len(items) for keys starting at a later word. The smallest codes in a
+    key range are therefore the best matches, in order.
+    """
+
+    def __init__(self, rows: List[Dict]):
+        self.items = sorted(rows, key=lambda r: (-(r.get("popularity") or 0), r["title"]))
+        n = len(self.items)
+        keyed = []
+        for position, item in enumerate(self.items):
+            words = normalize(item["title"]).split(" ")
+            for start in range(len(words)):
+                if words[start]:
+                    keyed.append((" ".join(words[start:]), position + (n if start else 0)))
+        keyed.sort()
+        self.keys = [key for key, _ in keyed]
+        self.codes = array("I", (code for _, code in keyed))
+
+        # Short prefixes: the best SUGGEST_MAX_LIMIT codes, computed once
+        prefixes = {key[:length] for key in self.keys for length in range(1, SUGGEST_PRECOMPUTED_CHARS + 1)}
+        self.precomputed = {
+            prefix: array("I", heapq.nsmallest(SUGGEST_MAX_LIMIT * 2, self.codes[slice(*self._range(prefix))]))
+            for prefix in prefixes
+        }
+
+    def __len__(self):
+        return len(self.items)
+
+    def nbytes(self) -> int:
+        """Approximate size of the index structures (not the item dicts)"""
+        return (sum(sys.getsizeof(k) for k in self.keys) + sys.getsizeof(self.keys)
+                + self.codes.itemsize * len(self.codes)
+                + sum(a.itemsize * len(a) for a in self.precomputed.values()))
+
+    def _range(self, prefix: str):
+        """Positions of the keys starting with prefix"""
+        lo = bisect_left(self.keys, prefix)
+        return lo, bisect_right(self.keys, prefix + "\U0010ffff", lo)
+
+    def lookup(self, prefix: str, limit: int) -> List[Dict]:
+        """Best items whose title, or a word in it onwards, starts with prefix"""
+        if not prefix:
+            return []
+        codes = self.precomputed.get(prefix)
+        if codes is None:
+            # Twice the limit so an item matched by two of its words cannot crowd out others
+            codes = heapq.nsmallest(limit * 2, self.codes[slice(*self._range(prefix))])
+        n = len(self.items)
+        results, seen = [], set()
+        for code in codes:
+            position = code % n
+            if position in seen:
+                continue
+            seen.add(position)
+            results.append({**self.items[position], "title_match": code < n})
+            if len(results) == limit:
+                break
+        return results
+
+def suggest(indexes: Dict[str, SuggestIndex], prefix: str, limit: int, item_type: Optional[str] = None) -> List[Dict]:
+    """Merge the per-type lookups: title matches first, then by popularity"""
+    key = normalize(prefix)
+    results = []
+    for t in ([item_type] if item_type else ITEM_TYPES):
+        if t in indexes:
+            results.extend(indexes[t].lookup(key, limit))
+    results.sort(key=lambda r: (not r["title_match"], -(r.get("popularity") or 0)))
+    return results[:limit]
+
+# ==================== LOADING ====================
+
+def fetch_titles(db, page_size=SUGGEST_PAGE_SIZE) -> Dict[str, List[Dict]]:
+    """Every title with its popularity, by item type (keyset pages of get_suggest_titles)"""
+    rows = {}
+    for item_type in ITEM_TYPES:
+        rows[item_type], after_id = [], None
+        while True:
+            page = db.rpc("get_suggest_titles", {
+                "filter_item_type": item_type, "after_id": after_id, "page_size": page_size
+            }).execute().data or []
+            for row in page:
+                rows[item_type].append({
+                    "id": row["item_id"], "item_type": item_type, "title": row["title"],
+                    "year": row.get("year"), "poster_url": row.get("poster_url"),
+                    "popularity": round(row.get("popularity") or 0.0, 3),
+                })
+            if len(page) < page_size:
+                break
+            after_id = page[-1]["item_id"]
+    return rows
+
+def write_snapshot(path: str, rows: Dict[str, List[Dict]]):
+    """Write rows atomically, so a worker never reads a half-written file"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"built_at": time.time(), "rows": rows}, f, separators=(",", ":"))
+    os.replace(tmp, path)
+
+def read_snapshot(path: str, max_age: float) -> Optional[Dict[str, List[Dict]]]:
+    """Rows from a snapshot younger than max_age seconds, else None"""
+    try:
+        with open(path) as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - snapshot.get("built_at", 0) > max_age:
+        return None
+    return snapshot.get("rows")
+
+class Suggester:
+    """The current indexes plus their background refresh
+
+    The first request builds the indexes; after that, a request that finds
+    them older than SUGGEST_REFRESH_SECONDS starts a rebuild in a thread and
+    keeps serving the old ones until it is done.
+    """
+
+    def __init__(self, refresh_seconds=SUGGEST_REFRESH_SECONDS, snapshot=SUGGEST_SNAPSHOT):
+        self.refresh_seconds = refresh_seconds
+        self.snapshot = snapshot
+        self.indexes = None
+        self.source = None
+        self.built_at = float("-inf")
+        self._lock = threading.Lock()
+        self._refreshing = False
+
+    def load(self, db):
+        """Build the indexes from a fresh snapshot or the database"""
+        start = time.perf_counter()
+        rows = read_snapshot(self.snapshot, self.refresh_seconds) if self.snapshot else None
+        source = "snapshot"
+        if rows is None:
+            rows, source = fetch_titles(db), "database"
+            if self.snapshot:
+                try:
+                    write_snapshot(self.snapshot, rows)
+                except OSError as e:
+                    logger.warning(f"Could not write suggest snapshot {self.snapshot}: {e}")
+        indexes = {item_type: SuggestIndex(rows.get(item_type, [])) for item_type in ITEM_TYPES}
+        self.indexes, self.source, self.built_at = indexes, source, time.monotonic()
+        logger.info(f"Suggest index: {sum(map(len, indexes.values()))} titles from {source} "
+                    f"in {time.perf_counter() - start:.2f}s")
+        return indexes
+
+    def _refresh(self, db):
+        try:
+            self.load(db)
+        except Exception as e:
+            logger.error(f"Suggest index refresh failed: {e}")
+        finally:
+            self._refreshing = False
+
+    def get(self, db) -> Dict[str, SuggestIndex]:
+        """The current indexes, building them on first use"""
+        if self.indexes is None:
+            with self._lock:
+                if self.indexes is None:
+                    self.load(db)
+        elif time.monotonic() - self.built_at >= self.refresh_seconds and not self._refreshing:
+            with self._lock:
+                if not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh, args=(db,), daemon=True).start()
+        return self.indexes
+
+    def nbytes(self) -> int:
+        return sum(index.nbytes() for index in (self.indexes or {}).values())
+
+def main():
+    parser = argparse.ArgumentParser(description="Write the title suggestion snapshot the API workers load")
+    parser.add_argument("--snapshot", default=SUGGEST_SNAPSHOT, required=SUGGEST_SNAPSHOT is None)
+    args = parser.parse_args()
+
+    from api.database import get_db
+
+    logging.basicConfig(level=logging.INFO)
+    rows = fetch_titles(get_db())
+    write_snapshot(args.snapshot, rows)
+    print(json.dumps({item_type: len(r) for item_type, r in rows.items()}))
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,16 @@
+import argparse
+import json
 import os
-import requests
+import sys
 import time
 import logging
-from supabase import create_client, Client
-from fastembed import TextEmbedding
+import multiprocessing as mp
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from api.embeddings import EMBEDDING_MODEL, active_embedding_model, load_embedding_model
+from api.http_cache import HTTP_CACHE, HTTP_CACHE_PATH, HTTPCache
+from api.sync_telemetry import SyncTelemetry
 
 # Setup Logging
 logging.basicConfig(level=logging.INFO)
@@ -13,40 +20,278 @@ logger = logging.getLogger(__name__)
 TMDB_API_KEY = os.getenv("TMDB_API_KEY")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# Overridable so benchmarks can crawl local fakes instead of burning API quota
+TMDB_BASE_URL = os.getenv("TMDB_BASE_URL", "https://api.themoviedb.org/3")
+GOOGLE_BOOKS_BASE_URL = os.getenv("GOOGLE_BOOKS_BASE_URL", "https://www.googleapis.com/books/v1")
 
-# Initialize FastEmbed & Supabase
-logger.info("Initializing FastEmbed for Data Sync...")
-model = TextEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# On-disk response cache TTLs (seconds); stale entries are revalidated with ETags
+TTL_TMDB_DISCOVER = int(os.getenv("TTL_TMDB_DISCOVER", str(3 * 86400)))
+TTL_TMDB_DETAILS = int(os.getenv("TTL_TMDB_DETAILS", str(30 * 86400)))
+TTL_GOOGLE_BOOKS = int(os.getenv("TTL_GOOGLE_BOOKS", str(7 * 86400)))
+# Partial Google Books responses: only the fields run_sync stores
+GOOGLE_BOOKS_FIELDS = (
+    "totalItems,items(id,volumeInfo(title,authors,description,imageLinks/thumbnail,"
+    "publishedDate,categories,language))"
+)
 
-def get_embedding(text: str):
-    """Generate embedding using FastEmbed local inference"""
+# Embedding runs in a process pool so the sync uses every core on the runner
+# (the API stays single-threaded). Each worker holds its own ONNX session.
+SYNC_EMBED_WORKERS = int(os.getenv("SYNC_EMBED_WORKERS", str(os.cpu_count() or 1)))
+# ONNX intra-op threads per worker; workers * threads should not exceed the cores
+SYNC_EMBED_THREADS = int(os.getenv("SYNC_EMBED_THREADS", str(max(1, (os.cpu_count() or 1) // SYNC_EMBED_WORKERS))))
+SYNC_EMBED_BATCH = int(os.getenv("SYNC_EMBED_BATCH", "64"))
+# Batches queued per worker: keeps the workers busy without holding every vector in memory
+SYNC_EMBED_INFLIGHT = int(os.getenv("SYNC_EMBED_INFLIGHT", "2"))
+# Pools rebuilt after a worker dies; past that the run embeds in-process
+SYNC_EMBED_POOL_RESTARTS = int(os.getenv("SYNC_EMBED_POOL_RESTARTS", "1"))
+# Retries of a rate-limited (429) request before the page is given up
+SYNC_MAX_RETRIES = int(os.getenv("SYNC_MAX_RETRIES", "3"))
+
+# Crawl plan. Each language x strategy x year range (movies) and category x
+# order (books) is one work unit; --shard i/n crawls every n-th unit. Adding a
+# language or category at the end keeps every existing unit on its shard (and
+# that shard's HTTP cache warm); other edits reshuffle the assignment.
+MOVIE_LANGUAGES = ['en', 'te', 'hi', 'ta', 'kn', 'ml']  # English, Telugu, Hindi, Tamil, Kannada, Malayalam
+MOVIE_STRATEGIES = [
+    {'sort_by': 'primary_release_date.desc', 'name': 'Recent'},
+    {'sort_by': 'popularity.desc', 'name': 'Popular'},
+    {'sort_by': 'vote_average.desc', 'vote_count.gte': 10, 'name': 'Top Rated'},
+    {'sort_by': 'revenue.desc', 'name': 'Box Office'},
+]
+MOVIE_YEAR_RANGES = [
+    (2020, 2026),  # Recent
+    (2015, 2019),  # Mid-range
+    (2010, 2014),  # Older
+    (2000, 2009),  # Classic
+    (1990, 1999),  # Vintage
+]
+BOOK_CATEGORIES = [
+    "fiction", "mystery", "history", "science", "biography", "thriller",
+    "philosophy", "technology", "romance", "fantasy", "business", "self-help",
+    "poetry", "drama", "adventure", "horror", "crime", "psychology",
+    "art", "cooking", "travel", "health", "education", "religion",
+    "politics", "economics", "sociology", "mathematics", "physics",
+    "literature", "classics", "contemporary", "young adult", "children",
+    "sports", "music", "photography", "design", "engineering", "medicine"
+]
+BOOK_ORDERS = ['newest', 'relevance']
+
+class Shard:
+    """Shard index / count of a sync run, 1-based like the --shard flag ("2/6")"""
+
+    def __init__(self, index=1, count=1):
+        if count < 1 or not 1 <= index <= count:
+            raise ValueError(f"invalid shard {index}/{count}")
+        self.index = index
+        self.count = count
+
+    @classmethod
+    def parse(cls, spec: str):
+        try:
+            index, count = (int(part) for part in spec.split("/"))
+        except ValueError:
+            raise ValueError(f"shard must look like 2/6, got {spec!r}")
+        return cls(index, count)
+
+    def take(self, units):
+        """Round-robin slice of an ordered unit list; the shards together cover it exactly once"""
+        return units[self.index - 1::self.count]
+
+    def target(self, total):
+        """This shard's share of a whole-run target; the shares add up to total exactly"""
+        return total // self.count + (1 if self.index <= total % self.count else 0)
+
+    def __str__(self):
+        return f"{self.index}/{self.count}"
+
+FULL_RUN = Shard()
+
+def movie_work_units(shard=FULL_RUN):
+    """(language, strategy, year range) units to crawl, in crawl order"""
+    units = [
+        (lang, strategy, years)
+        for lang in MOVIE_LANGUAGES
+        for strategy in MOVIE_STRATEGIES
+        for years in MOVIE_YEAR_RANGES
+    ]
+    return shard.take(units)
+
+def book_work_units(shard=FULL_RUN):
+    """(category, order) units to crawl, in crawl order"""
+    return shard.take([(cat, order) for cat in BOOK_CATEGORIES for order in BOOK_ORDERS])
+
+class SyncContext:
+    """FastEmbed model and Supabase client for a sync run, created on first use
+
+    Importing this module stays cheap (no model load, no supabase import), so
+    tools that only need the crawlers or helpers do not pay for them.
+    Pass db / model to inject ready-made clients (benchmarks, tests); an
+    injected model always embeds in this process. model_name defaults to
+    EMBEDDING_MODEL (api/reembed.py passes the model being backfilled).
+    """
+
+    def __init__(self, db=None, model=None, embed_workers=None, http=None, model_name=None):
+        self._db = db
+        self._model = model
+        self.model_name = model_name or EMBEDDING_MODEL
+        self._pool = None
+        self.pool_restarts = 0
+        self.http = http or HTTPCache(HTTP_CACHE_PATH if HTTP_CACHE else None)
+        self.telemetry = SyncTelemetry()
+        if model is not None:
+            self.embed_workers = 1
+        else:
+            self.embed_workers = SYNC_EMBED_WORKERS if embed_workers is None else embed_workers
+
+    @property
+    def model(self):
+        if self._model is None:
+            logger.info("Initializing FastEmbed for Data Sync...")
+            self._model = load_embedding_model(self.model_name)
+        return self._model
+
+    @property
+    def db(self):
+        if self._db is None:
+            from supabase import create_client
+            self._db = create_client(SUPABASE_URL, SUPABASE_KEY)
+        return self._db
+
+    @property
+    def pool(self):
+        """Embedding process pool, or None to embed in this process"""
+        if self._pool is None and self.embed_workers > 1:
+            logger.info(f"Starting {self.embed_workers} embedding workers ({SYNC_EMBED_THREADS} threads each)...")
+            # spawn: ONNX Runtime sessions and thread pools do not survive fork
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.embed_workers,
+                mp_context=mp.get_context("spawn"),
+                initializer=_init_embed_worker,
+                initargs=(self.model_name, SYNC_EMBED_THREADS)
+            )
+            # Surfaces a model that cannot load now instead of on the first batch
+            self._pool.submit(_embed_in_worker, ["warmup"]).result()
+        return self._pool
+
+    def discard_pool(self, error):
+        """Drop a pool whose worker died; the next one is rebuilt, or embedding moves in-process"""
+        logger.error(f"Embedding worker died ({error or 'no details'})")
+        self.telemetry.fail("embed", "worker_died")
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+        self.pool_restarts += 1
+        if self.pool_restarts > SYNC_EMBED_POOL_RESTARTS:
+            logger.warning("Embedding in-process for the rest of the run")
+            self.embed_workers = 1
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.http.close()
+
+context = SyncContext()
+
+def embed_batch(texts, model=None):
+    """Embed a batch of texts with FastEmbed; a failed batch gives None per text"""
     try:
-        # FastEmbed is optimized for batching
-        embeddings = list(model.embed([text[:2000]])) # Truncate for efficiency
-        return embeddings[0].tolist()
+        model = model or context.model
+        # Truncate for efficiency
+        return [v.tolist() for v in model.embed([t[:2000] for t in texts], batch_size=len(texts))]
     except Exception as e:
         logger.error(f"Embedding Error: {e}")
-        return None
+        return [None] * len(texts)
+
+_worker_model = None
+
+def _init_embed_worker(model_name, threads):
+    global _worker_model
+    _worker_model = load_embedding_model(model_name, threads=threads)
+
+def _embed_in_worker(texts):
+    return embed_batch(texts, _worker_model)
+
+def iter_embeddings(texts, ctx=None):
+    """Vectors (or None on failure) for texts, in input order
+
+    Up to SYNC_EMBED_INFLIGHT batches per worker are submitted ahead, so
+    embedding runs while the caller fetches details and writes rows, but
+    vectors never pile up faster than the caller consumes them. Batches lost
+    to a dead worker are resubmitted to a new pool (see discard_pool).
+    """
+    ctx = ctx or context
+    batches = deque(texts[i:i + SYNC_EMBED_BATCH] for i in range(0, len(texts), SYNC_EMBED_BATCH))
+    in_flight = deque()   # (batch, future), in input order
+    while batches or in_flight:
+        try:
+            pool = ctx.pool
+            while pool and batches and len(in_flight) < ctx.embed_workers * SYNC_EMBED_INFLIGHT:
+                batch = batches.popleft()
+                in_flight.append((batch, pool.submit(_embed_in_worker, batch)))
+            if not in_flight:
+                yield from embed_batch(batches.popleft(), ctx.model)
+                continue
+            vectors = in_flight[0][1].result()
+        except BrokenProcessPool as e:
+            batches.extendleft(batch for batch, _ in reversed(in_flight))
+            in_flight.clear()
+            ctx.discard_pool(e)
+            continue
+        in_flight.popleft()
+        yield from vectors
+
+def pause(seconds, reason):
+    """time.sleep that is accounted for in the run report"""
+    context.telemetry.wait(reason, seconds)
+    time.sleep(seconds)
+
+def fetch(source, url, params, ttl, backoff):
+    """context.http.get that retries 429s up to SYNC_MAX_RETRIES times, with telemetry
+
+    Waits Retry-After (capped at a minute) or backoff seconds between
+    attempts. Returns the last response, so callers still see a final 429.
+    """
+    for attempt in range(SYNC_MAX_RETRIES + 1):
+        try:
+            res = context.http.get(url, params=params, ttl=ttl)
+        except Exception:
+            context.telemetry.request(source, retry=attempt > 0, error=True)
+            raise
+        context.telemetry.request(source, res.status_code, res.from_cache, retry=attempt > 0,
+                                  error=res.status_code >= 400 and res.status_code != 429)
+        if res.status_code != 429 or attempt == SYNC_MAX_RETRIES:
+            return res
+        retry_after = res.headers.get("Retry-After", "")
+        wait = min(int(retry_after), 60) if retry_after.isdigit() else backoff
+        logger.warning(f"Rate limit hit ({source}), waiting {wait}s...")
+        pause(wait, "rate_limit")
+
+def get_embedding(text: str):
+    """Generate embedding using FastEmbed local inference"""
+    return embed_batch([text])[0]
 
 def get_movie_details(tmdb_id: int):
     """Fetch detailed movie information including cast and crew from TMDB"""
     try:
         # Get movie details with credits
-        url = f"https://api.themoviedb.org/3/movie/{tmdb_id}"
+        url = f"{TMDB_BASE_URL}/movie/{tmdb_id}"
         params = {
             'api_key': TMDB_API_KEY,
             'append_to_response': 'credits'
         }
-        res = requests.get(url, params=params, timeout=10)
+        res = fetch("tmdb_details", url, params, TTL_TMDB_DETAILS, backoff=2)
         
         if res.status_code == 429:
-            time.sleep(2)
             return None
             
         res.raise_for_status()
         data = res.json()
         
+        # Rate limiting for TMDB API (cached responses cost no quota)
+        if not res.from_cache:
+            pause(0.3, "pacing")
+        
         # Extract cast (top 10 actors)
         cast = []
         if 'credits' in data and 'cast' in data['credits']:
@@ -85,188 +330,185 @@ def get_movie_details(tmdb_id: int):
         logger.error(f"Error fetching movie details for {tmdb_id}: {e}")
         return None
 
-def get_indian_movies(total_target=10000):
+def get_indian_movies(total_target=10000, shard=FULL_RUN):
     """Massive crawl of Indian regional movies across languages and genres"""
-    logger.info(f"Targeting {total_target} Indian movies...")
+    units = movie_work_units(shard)
+    logger.info(f"Targeting {total_target} Indian movies from {len(units)} crawl units (shard {shard})...")
     all_movies = []
     seen_ids = set()
     
-    # Selected Indian languages: English, Telugu, Hindi, Tamil, Kannada, Malayalam
-    languages = ['en', 'te', 'hi', 'ta', 'kn', 'ml']
-    
-    # Multiple discovery strategies
-    strategies = [
-        {'sort_by': 'primary_release_date.desc', 'name': 'Recent'},
-        {'sort_by': 'popularity.desc', 'name': 'Popular'},
-        {'sort_by': 'vote_average.desc', 'vote_count.gte': 10, 'name': 'Top Rated'},
-        {'sort_by': 'revenue.desc', 'name': 'Box Office'},
-    ]
-    
-    # Year ranges for better coverage
-    year_ranges = [
-        (2020, 2026),  # Recent
-        (2015, 2019),  # Mid-range
-        (2010, 2014),  # Older
-        (2000, 2009),  # Classic
-        (1990, 1999),  # Vintage
-    ]
-    
-    for lang in languages:
-        logger.info(f"Crawling language: {lang}")
+    for lang, strategy, (year_start, year_end) in units:
+        pages = 25 if year_start >= 2015 else 15  # More pages for recent content
         
-        for strategy in strategies:
-            for year_start, year_end in year_ranges:
-                pages = 25 if year_start >= 2015 else 15  # More pages for recent content
+        for page in range(1, pages + 1):
+            try:
+                params = {
+                    'api_key': TMDB_API_KEY,
+                    'region': 'IN',
+                    'with_original_language': lang,
+                    'page': page,
+                    'sort_by': strategy['sort_by'],
+                    'include_adult': 'false',
+                    'primary_release_date.gte': f'{year_start}-01-01',
+                    'primary_release_date.lte': f'{year_end}-12-31',
+                }
                 
-                for page in range(1, pages + 1):
-                    try:
-                        params = {
-                            'api_key': TMDB_API_KEY,
-                            'region': 'IN',
-                            'with_original_language': lang,
-                            'page': page,
-                            'sort_by': strategy['sort_by'],
-                            'include_adult': 'false',
-                            'primary_release_date.gte': f'{year_start}-01-01',
-                            'primary_release_date.lte': f'{year_end}-12-31',
-                        }
-                        
-                        if 'vote_count.gte' in strategy:
-                            params['vote_count.gte'] = strategy['vote_count.gte']
-                        
-                        url = f"https://api.themoviedb.org/3/discover/movie"
-                        res = requests.get(url, params=params, timeout=10)
-                        
-                        if res.status_code == 429:
-                            logger.warning("Rate limit hit, waiting...")
-                            time.sleep(3)
-                            continue
-                            
-                        res.raise_for_status()
-                        data = res.json()
-                        results = data.get('results', [])
-                        
-                        if not results:
-                            break
-                        
-                        # Deduplicate
-                        for movie in results:
-                            if movie['id'] not in seen_ids:
-                                seen_ids.add(movie['id'])
-                                all_movies.append(movie)
-                        
-                        logger.info(f"{lang} - {strategy['name']} - {year_start}-{year_end} - Page {page}: {len(all_movies)} total")
-                        
-                        if len(all_movies) >= total_target:
-                            logger.info(f"Target reached: {len(all_movies)} movies")
-                            return all_movies
-                        
-                        time.sleep(0.25)  # Rate limiting
-                        
-                    except Exception as e:
-                        logger.error(f"TMDB Fetch Error: {e}")
-                        continue
+                if 'vote_count.gte' in strategy:
+                    params['vote_count.gte'] = strategy['vote_count.gte']
+                
+                url = f"{TMDB_BASE_URL}/discover/movie"
+                res = fetch("tmdb_discover", url, params, TTL_TMDB_DISCOVER, backoff=3)
+                
+                if res.status_code == 429:
+                    # Retries exhausted; skip the page
+                    context.telemetry.fail("crawl_movies", "rate_limited")
+                    continue
+                    
+                res.raise_for_status()
+                data = res.json()
+                results = data.get('results', [])
+                
+                if not results:
+                    break
+                
+                # Deduplicate
+                for movie in results:
+                    if movie['id'] not in seen_ids:
+                        seen_ids.add(movie['id'])
+                        all_movies.append(movie)
+                
+                logger.info(f"{lang} - {strategy['name']} - {year_start}-{year_end} - Page {page}: {len(all_movies)} total")
+                context.telemetry.progress("crawl_movies", len(all_movies), total_target,
+                                           unit=f"{lang}/{strategy['name']}/{year_start}-{year_end}/page {page}")
+                
+                if len(all_movies) >= total_target:
+                    # The last page can overshoot; every shard doing so adds up across the run
+                    logger.info(f"Target reached: {total_target} movies")
+                    return all_movies[:total_target]
+                
+                if not res.from_cache:
+                    pause(0.25, "pacing")  # Rate limiting
+                
+            except Exception as e:
+                logger.error(f"TMDB Fetch Error: {e}")
+                context.telemetry.fail("crawl_movies", type(e).__name__)
+                continue
     
     logger.info(f"Collected {len(all_movies)} unique movies")
     return all_movies
 
-def get_global_books(total_target=5000):
+def get_global_books(total_target=5000, shard=FULL_RUN):
     """Crawl global books across various categories and languages"""
-    logger.info(f"Targeting {total_target} English books...")
+    units = book_work_units(shard)
+    logger.info(f"Targeting {total_target} English books from {len(units)} crawl units (shard {shard})...")
     all_books = []
     seen_ids = set()
     
-    # Expanded categories
-    categories = [
-        "fiction", "mystery", "history", "science", "biography", "thriller",
-        "philosophy", "technology", "romance", "fantasy", "business", "self-help",
-        "poetry", "drama", "adventure", "horror", "crime", "psychology",
-        "art", "cooking", "travel", "health", "education", "religion",
-        "politics", "economics", "sociology", "mathematics", "physics",
-        "literature", "classics", "contemporary", "young adult", "children",
-        "sports", "music", "photography", "design", "engineering", "medicine"
-    ]
-    
-    # Multiple search strategies
-    order_types = ['newest', 'relevance']
-    
     # Only English books
     lang = 'en'
     
-    for cat in categories:
-        for order in order_types:
-            logger.info(f"Crawling: {cat} ({order}, {lang})")
+    for cat, order in units:
+        logger.info(f"Crawling: {cat} ({order}, {lang})")
+        
+        # Fetch up to 400 books per category/order combination (increased from 200)
+        for start in range(0, 400, 40):
+            try:
+                params = {
+                    'q': f'subject:{cat}',
+                    'orderBy': order,
+                    'maxResults': 40,
+                    'startIndex': start,
+                    'langRestrict': lang,
+                    'printType': 'books',
+                    'filter': 'ebooks',  # Focus on ebooks which have better metadata
+                    'fields': GOOGLE_BOOKS_FIELDS
+                }
                 
-            # Fetch up to 400 books per category/order combination (increased from 200)
-            for start in range(0, 400, 40):
-                try:
-                    params = {
-                        'q': f'subject:{cat}',
-                        'orderBy': order,
-                        'maxResults': 40,
-                        'startIndex': start,
-                        'langRestrict': lang,
-                        'printType': 'books',
-                        'filter': 'ebooks'  # Focus on ebooks which have better metadata
-                    }
-                    
-                    url = "https://www.googleapis.com/books/v1/volumes"
-                    res = requests.get(url, params=params, timeout=10)
-                    res.raise_for_status()
-                    data = res.json()
-                    items = data.get('items', [])
-                    
-                    if not items:
-                        break
-                    
-                    # Deduplicate
-                    for book in items:
-                        if book['id'] not in seen_ids:
-                            seen_ids.add(book['id'])
-                            all_books.append(book)
-                    
-                    logger.info(f"{cat} - {order}: {len(all_books)} total books")
-                    
-                    if len(all_books) >= total_target:
-                        logger.info(f"Target reached: {len(all_books)} books")
-                        return all_books
-                    
-                    time.sleep(0.3)  # Reduced delay for faster fetching
-                    
-                except Exception as e:
-                    logger.error(f"Google Books Fetch Error: {e}")
-                    time.sleep(1)
-                    continue
-    
+                url = f"{GOOGLE_BOOKS_BASE_URL}/volumes"
+                res = fetch("google_books", url, params, TTL_GOOGLE_BOOKS, backoff=2)
+                res.raise_for_status()
+                data = res.json()
+                items = data.get('items', [])
+                
+                if not items:
+                    break
+                
+                # Deduplicate
+                for book in items:
+                    if book['id'] not in seen_ids:
+                        seen_ids.add(book['id'])
+                        all_books.append(book)
+                
+                logger.info(f"{cat} - {order}: {len(all_books)} total books")
+                context.telemetry.progress("crawl_books", len(all_books), total_target,
+                                           unit=f"{cat}/{order}/start {start}")
+                
+                if len(all_books) >= total_target:
+                    logger.info(f"Target reached: {total_target} books")
+                    return all_books[:total_target]
+                
+                if not res.from_cache:
+                    pause(0.3, "pacing")  # Reduced delay for faster fetching
+                
+            except Exception as e:
+                logger.error(f"Google Books Fetch Error: {e}")
+                context.telemetry.fail("crawl_books", type(e).__name__)
+                pause(1, "backoff")
+                continue
+
     logger.info(f"Collected {len(all_books)} unique books")
     return all_books
 
-def run_sync():
+def run_sync(shard=FULL_RUN):
+    """Crawl, embed and upsert this shard's work units; returns the run report"""
+    context.telemetry = telemetry = SyncTelemetry()
+    # Initialize explicitly so a missing model or client fails the run up front
+    db = context.db
+    active_model = active_embedding_model(db)
+    if active_model and active_model != context.model_name:
+        # Mixing models in the embedding column would break every search
+        raise RuntimeError(
+            f"EMBEDDING_MODEL is {context.model_name} but the catalog is embedded with {active_model}"
+        )
+    with telemetry.timed("load_model", items=0):
+        if context.pool is None:
+            context.model
     # Get targets from environment or use defaults
     movie_target = int(os.getenv('MOVIE_TARGET', '10000'))
     book_target = int(os.getenv('BOOK_TARGET', '5000'))
     
-    logger.info(f"Sync targets - Movies: {movie_target}, Books: {book_target}")
+    # MOVIE_TARGET / BOOK_TARGET are whole-run totals; each shard takes its share
+    movie_target = shard.target(movie_target)
+    book_target = shard.target(book_target)
+    
+    logger.info(f"Sync targets (shard {shard}) - Movies: {movie_target}, Books: {book_target}")
     
     # --- Sync Movies ---
-    movie_candidates = get_indian_movies(total_target=movie_target)
+    with telemetry.timed("crawl_movies", items=0):
+        movie_candidates = get_indian_movies(total_target=movie_target, shard=shard)
+    telemetry.add("crawl_movies", len(movie_candidates))
     logger.info(f"Processing {len(movie_candidates)} movies...")
     synced_movies = 0
     failed_movies = 0
     
-    for m in movie_candidates:
-        if not m.get('overview') or not m.get('title'): 
-            continue
-        
-        text = f"{m['title']}. {m['overview']}"
-        vector = get_embedding(text)
+    crawled = len(movie_candidates)
+    movie_candidates = [m for m in movie_candidates if m.get('overview') and m.get('title')]
+    telemetry.fail("crawl_movies", "missing_text", crawled - len(movie_candidates))
+    movie_texts = [f"{m['title']}. {m['overview']}" for m in movie_candidates]
+    vectors = telemetry.timed_iter("embed_movies", iter_embeddings(movie_texts))
+    for i, (m, vector) in enumerate(zip(movie_candidates, vectors), 1):
+        telemetry.progress("sync_movies", i, len(movie_candidates), unit=f"tmdb_id {m['id']}")
         if not vector: 
             failed_movies += 1
+            telemetry.fail("embed_movies", "embedding_failed")
             continue
 
         try:
             # Fetch detailed movie info including cast and crew
-            details = get_movie_details(m['id'])
+            with telemetry.timed("enrich_movies"):
+                details = get_movie_details(m['id'])
+            if details is None:
+                telemetry.fail("enrich_movies", "details_unavailable")
             
             payload = {
                 "tmdb_id": m['id'],
@@ -289,36 +531,43 @@ def run_sync():
                 if details.get('genres'):
                     payload['genres'] = details['genres']
             
-            supabase.table("movies").upsert(payload, on_conflict="tmdb_id").execute()
+            with telemetry.timed("write_movies"):
+                db.table("movies").upsert(payload, on_conflict="tmdb_id").execute()
             synced_movies += 1
+            telemetry.synced("movies", m['id'])
             if synced_movies % 100 == 0: 
                 logger.info(f"✓ Synced {synced_movies} movies (failed: {failed_movies})...")
             
-            # Rate limiting for TMDB API
-            time.sleep(0.3)
-            
         except Exception as e:
             logger.error(f"DB Insert Error (Movie): {e}")
             failed_movies += 1
+            telemetry.fail("write_movies", type(e).__name__)
 
     logger.info(f"Movies complete: {synced_movies} synced, {failed_movies} failed")
 
     # --- Sync Books ---
-    book_candidates = get_global_books(total_target=book_target)
+    with telemetry.timed("crawl_books", items=0):
+        book_candidates = get_global_books(total_target=book_target, shard=shard)
+    telemetry.add("crawl_books", len(book_candidates))
     logger.info(f"Processing {len(book_candidates)} books...")
     synced_books = 0
     failed_books = 0
     
-    for b in book_candidates:
-        vol = b.get('volumeInfo', {})
-        desc = vol.get('description', '')
-        if not desc or not vol.get('title'): 
-            continue
-
-        text = f"{vol['title']}. {desc}"
-        vector = get_embedding(text)
+    crawled = len(book_candidates)
+    book_candidates = [
+        b for b in book_candidates
+        if b.get('volumeInfo', {}).get('description') and b.get('volumeInfo', {}).get('title')
+    ]
+    telemetry.fail("crawl_books", "missing_text", crawled - len(book_candidates))
+    book_texts = [f"{b['volumeInfo']['title']}. {b['volumeInfo']['description']}" for b in book_candidates]
+    vectors = telemetry.timed_iter("embed_books", iter_embeddings(book_texts))
+    for i, (b, vector) in enumerate(zip(book_candidates, vectors), 1):
+        telemetry.progress("sync_books", i, len(book_candidates), unit=f"google_id {b['id']}")
+        vol = b['volumeInfo']
+        desc = vol['description']
         if not vector: 
             failed_books += 1
+            telemetry.fail("embed_books", "embedding_failed")
             continue
 
         try:
@@ -336,19 +585,128 @@ def run_sync():
                 "language": vol.get('language'),
                 "embedding": vector
             }
-            supabase.table("books").upsert(payload, on_conflict="google_id").execute()
+            with telemetry.timed("write_books"):
+                db.table("books").upsert(payload, on_conflict="google_id").execute()
             synced_books += 1
+            telemetry.synced("books", b['id'])
             if synced_books % 100 == 0: 
                 logger.info(f"✓ Synced {synced_books} books (failed: {failed_books})...")
         except Exception as e:
             logger.error(f"DB Insert Error (Book): {e}")
             failed_books += 1
+            telemetry.fail("write_books", type(e).__name__)
 
     logger.info(f"Books complete: {synced_books} synced, {failed_books} failed")
+    logger.info(f"HTTP cache: {context.http.stats}")
+    context.close()
     logger.info(f"🎉 SYNC COMPLETE - Movies: {synced_movies}, Books: {synced_books}")
+    return run_report(shard)
+
+def run_report(shard=FULL_RUN, status="completed", error=None):
+    """Telemetry report of the current run, plus the synced ids merge_reports needs
+
+    Also called when run_sync raises, so a failed run still says where it stopped.
+    """
+    telemetry = context.telemetry
+    report = telemetry.report(
+        shard=str(shard),
+        status=status,
+        error=error,
+        commit=os.getenv("GITHUB_SHA"),
+        embedding={"model": context.model_name, "workers": context.embed_workers,
+                   "threads": SYNC_EMBED_THREADS, "batch": SYNC_EMBED_BATCH},
+        units={"movies": len(movie_work_units(shard)), "books": len(book_work_units(shard))},
+        http_cache=context.http.stats,
+    )
+    for kind in ("movies", "books"):
+        ids = telemetry.ids.get(kind, [])
+        failed = sum(sum(telemetry.failures.get(f"{stage}_{kind}", {}).values()) for stage in ("embed", "write"))
+        report[kind] = {"synced": len(ids), "failed": failed, "ids": ids}
+    return report
+
+def _add_counts(total, part):
+    """Sum nested dicts of numbers into total"""
+    for key, value in (part or {}).items():
+        if isinstance(value, dict):
+            _add_counts(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            total[key] = round(total.get(key, 0) + value, 2)
+    return total
+
+def merge_reports(paths):
+    """Combine the shard reports of one sharded run into deduplicated totals
+
+    Shards crawl disjoint work units, but the same title can turn up in two
+    units (e.g. Popular and Top Rated); both shards then upsert it. Totals
+    count each tmdb_id / google_id once. Telemetry counters are summed; the
+    run's wall time is the slowest shard's.
+    """
+    reports = []
+    for path in paths:
+        with open(path) as f:
+            reports.append(json.load(f))
+    shards = [Shard.parse(r["shard"]) for r in reports]
+    counts = {s.count for s in shards}
+    if len(counts) != 1:
+        raise ValueError(f"reports come from different shard counts: {sorted(counts)}")
+    count = counts.pop()
+    seen = sorted(s.index for s in shards)
+    merged = {
+        "shards": count,
+        "missing_shards": sorted(set(range(1, count + 1)) - set(seen)),
+        "duplicate_reports": sorted({i for i in seen if seen.count(i) > 1}),
+        "failed_shards": sorted(r["shard"] for r in reports if r.get("status", "completed") != "completed"),
+        "wall_s": max((r.get("wall_s", 0) for r in reports), default=0),
+    }
+    for key in ("stages", "failures", "requests", "waits_s", "http_cache"):
+        merged[key] = {}
+        for r in reports:
+            _add_counts(merged[key], r.get(key))
+    for entry in merged["stages"].values():
+        # Per-runner throughput: items over the summed time the shards spent in the stage
+        entry["items_per_s"] = round(entry["items"] / entry["seconds"], 2) if entry["items"] and entry.get("seconds") else None
+    merged["rate_limit_wait_s"] = round(sum(r.get("rate_limit_wait_s", 0) for r in reports), 2)
+    for kind in ("movies", "books"):
+        ids = [item_id for r in reports for item_id in r[kind]["ids"]]
+        unique = len(set(ids))
+        merged[kind] = {
+            "synced": unique,
+            "written": len(ids),
+            "cross_shard_duplicates": len(ids) - unique,
+            "failed": sum(r[kind]["failed"] for r in reports),
+            "per_shard": {r["shard"]: r[kind]["synced"] for r in reports},
+        }
+    return merged
 
 if __name__ == "__main__":
-    if not all([TMDB_API_KEY, SUPABASE_URL, SUPABASE_KEY]):
+    parser = argparse.ArgumentParser(description="Crawl TMDB / Google Books, embed and upsert into Supabase")
+    parser.add_argument("--shard", type=Shard.parse, default=FULL_RUN,
+                        help="Run shard i of n (e.g. 2/6) of the crawl plan; default: the whole plan")
+    parser.add_argument("--report", help="Write the run report (telemetry and synced ids) as JSON to this path")
+    parser.add_argument("--merge", nargs="+", metavar="REPORT",
+                        help="Merge shard reports into deduplicated totals instead of syncing")
+    args = parser.parse_args()
+
+    if args.merge:
+        merged = merge_reports(args.merge)
+        print(json.dumps(merged, indent=2))
+        if args.report:
+            with open(args.report, "w") as f:
+                json.dump(merged, f, indent=2)
+        if merged["missing_shards"] or merged["duplicate_reports"] or merged["failed_shards"]:
+            logger.error(f"Incomplete sharded run: missing {merged['missing_shards']}, "
+                         f"duplicated {merged['duplicate_reports']}, failed {merged['failed_shards']}")
+            sys.exit(1)
+    elif not all([TMDB_API_KEY, SUPABASE_URL, SUPABASE_KEY]):
         logger.error("Missing Environment Variables!")
     else:
-        run_sync()
\ No newline at end of file
+        try:
+            report = run_sync(args.shard)
+        except BaseException as e:
+            # Still publish how far the run got
+            report = run_report(args.shard, status="failed", error=f"{type(e).__name__}: {e}")
+            raise
+        finally:
+            if args.report:
+                with open(args.report, "w") as f:
+                    json.dump(report, f)
\ No newline at end of file
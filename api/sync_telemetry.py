@@ -0,0 +1,142 @@
+"""
+Progress telemetry and run report for the sync engine
+Per-stage item counters and timers, failures by reason, per-source request
+counts (429s, retries, errors), time spent in rate-limit sleeps and the
+last progress position. progress() logs one JSON line per
+SYNC_PROGRESS_SECONDS with the current stage's rate and ETA; report()
+is the machine-readable summary written with --report.
+"""
+import json
+import logging
+import os
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+SYNC_PROGRESS_SECONDS = float(os.getenv("SYNC_PROGRESS_SECONDS", "30"))
+
+def _now_iso():
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+class SyncTelemetry:
+    """Counters for one sync run; not thread-safe (the engine drives it from one thread)"""
+
+    def __init__(self, progress_seconds=SYNC_PROGRESS_SECONDS):
+        self.progress_seconds = progress_seconds
+        self.started_at = _now_iso()
+        self._start = time.perf_counter()
+        self._last_log = 0.0
+        self.stages = {}
+        self.failures = {}
+        self.requests = {}
+        self.waits = {}
+        self.position = None
+        self.ids = {}
+        self._stage_start = {}
+
+    def _stage(self, stage):
+        return self.stages.setdefault(stage, {"items": 0, "failures": 0, "seconds": 0.0})
+
+    def add(self, stage, items=1, seconds=0.0):
+        entry = self._stage(stage)
+        entry["items"] += items
+        entry["seconds"] += seconds
+
+    def fail(self, stage, reason, items=1):
+        if items <= 0:
+            return
+        self._stage(stage)["failures"] += items
+        by_reason = self.failures.setdefault(stage, {})
+        by_reason[reason] = by_reason.get(reason, 0) + items
+
+    def synced(self, kind, item_id):
+        """Record an upserted movie / book id (the merge step dedupes on them)"""
+        self.ids.setdefault(kind, []).append(item_id)
+
+    @contextmanager
+    def timed(self, stage, items=1):
+        """Time a block and count it as items of stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, items, time.perf_counter() - start)
+
+    def timed_iter(self, stage, iterable):
+        """Yield from iterable, charging the time spent waiting on each item to stage"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, 0, time.perf_counter() - start)
+                return
+            self.add(stage, 1, time.perf_counter() - start)
+            yield item
+
+    def request(self, source, status=None, from_cache=False, retry=False, error=False):
+        """Count one HTTP request to source (tmdb_discover, tmdb_details, google_books)"""
+        entry = self.requests.setdefault(
+            source, {"requests": 0, "cached": 0, "rate_limited": 0, "retries": 0, "errors": 0}
+        )
+        entry["requests"] += 1
+        entry["cached"] += int(from_cache)
+        entry["rate_limited"] += int(status == 429)
+        entry["retries"] += int(retry)
+        entry["errors"] += int(error)
+
+    def wait(self, reason, seconds):
+        """Record a sleep (the caller sleeps): rate_limit, backoff, pacing"""
+        self.waits[reason] = self.waits.get(reason, 0.0) + seconds
+
+    def progress(self, stage, done, total=None, unit=None):
+        """Record the run's position; logs a JSON progress line at most every progress_seconds"""
+        now = time.perf_counter()
+        start = self._stage_start.setdefault(stage, now)
+        rate = done / (now - start) if now > start else 0.0
+        eta = (total - done) / rate if total and rate and total > done else None
+        self.position = {
+            "stage": stage, "done": done, "total": total, "unit": unit,
+            "items_per_s": round(rate, 2), "eta_s": round(eta) if eta is not None else None,
+        }
+        if now - self._last_log >= self.progress_seconds:
+            self._last_log = now
+            logger.info(f"progress {json.dumps(self.snapshot())}")
+
+    def snapshot(self):
+        return {
+            **(self.position or {}),
+            "elapsed_s": round(time.perf_counter() - self._start, 1),
+            "rate_limited": sum(r["rate_limited"] for r in self.requests.values()),
+            "rate_limit_wait_s": round(self.rate_limit_wait_s(), 1),
+        }
+
+    def rate_limit_wait_s(self):
+        """Seconds slept because of 429s and errors (everything but routine pacing)"""
+        return sum(seconds for reason, seconds in self.waits.items() if reason != "pacing")
+
+    def report(self, **extra):
+        """JSON-serializable summary of the run so far"""
+        wall = time.perf_counter() - self._start
+        return {
+            "started_at": self.started_at,
+            "finished_at": _now_iso(),
+            "wall_s": round(wall, 2),
+            **extra,
+            "stages": {
+                stage: {
+                    **entry,
+                    "seconds": round(entry["seconds"], 2),
+                    "items_per_s": round(entry["items"] / entry["seconds"], 2) if entry["items"] and entry["seconds"] else None,
+                }
+                for stage, entry in self.stages.items()
+            },
+            "failures": self.failures,
+            "requests": self.requests,
+            "waits_s": {reason: round(seconds, 2) for reason, seconds in self.waits.items()},
+            "rate_limit_wait_s": round(self.rate_limit_wait_s(), 2),
+            "last_progress": self.position,
+        }
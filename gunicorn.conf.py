@@ -0,0 +1,44 @@
+"""
+Gunicorn hooks, loaded automatically from the working directory
+With EMBED_SIDECAR=1 the master starts the embedding sidecar
+(api/embed_sidecar.py) before forking workers and stops it on exit, so the
+model is loaded once no matter how many workers run. Without it these hooks
+do nothing.
+"""
+import os
+import subprocess
+import sys
+import time
+
+_sidecar = None
+
+def on_starting(server):
+    global _sidecar
+    if os.getenv("EMBED_SIDECAR", "0") != "1":
+        return
+    from api.embed_sidecar import EMBED_SIDECAR_SOCKET, EMBED_SIDECAR_STARTUP_SECONDS, ping
+
+    if ping(EMBED_SIDECAR_SOCKET):
+        server.log.info(f"Using the embedding sidecar already running on {EMBED_SIDECAR_SOCKET}")
+        return
+    server.log.info("Starting the embedding sidecar...")
+    _sidecar = subprocess.Popen([sys.executable, "-m", "api.embed_sidecar"])
+    deadline = time.monotonic() + EMBED_SIDECAR_STARTUP_SECONDS
+    while time.monotonic() < deadline:
+        if _sidecar.poll() is not None:
+            # Workers fall back to their own model; the app still comes up
+            server.log.error(f"Embedding sidecar exited with {_sidecar.returncode}")
+            return
+        if ping(EMBED_SIDECAR_SOCKET):
+            server.log.info(f"Embedding sidecar ready on {EMBED_SIDECAR_SOCKET}")
+            return
+        time.sleep(0.2)
+    server.log.error("Embedding sidecar did not become ready; workers will embed in-process")
+
+def on_exit(server):
+    if _sidecar is not None and _sidecar.poll() is None:
+        _sidecar.terminate()
+        try:
+            _sidecar.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            _sidecar.kill()
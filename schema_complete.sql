@@ -5,6 +5,9 @@
 -- Enable pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
 
+-- Enable trigram matching for title/author lookups
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
 -- ==================== USERS TABLE ====================
 CREATE TABLE IF NOT EXISTS users (
   id BIGSERIAL PRIMARY KEY,
@@ -31,14 +34,28 @@ CREATE TABLE IF NOT EXISTS movies (
   "cast" JSONB,
   crew JSONB,
   embedding vector(384),
+  -- float16 copy for the compact indexes (pgvector >= 0.7); set from embedding by trigger
+  embedding_half halfvec(384),
+  -- Shadow column filled by api/reembed.py during a model change, with its compact copy
+  embedding_next vector(384),
+  embedding_next_half halfvec(384),
   created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_movies_tmdb ON movies(tmdb_id);
-CREATE INDEX IF NOT EXISTS idx_movies_embedding ON movies USING ivfflat (embedding vector_cosine_ops);
+-- HNSW needs no training data, so it is safe to create on an empty table
+CREATE INDEX IF NOT EXISTS idx_movies_embedding ON movies USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+-- Built while the shadow column fills, so promote_embedding_model only renames it
+CREATE INDEX IF NOT EXISTS idx_movies_embedding_next ON movies USING hnsw (embedding_next vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+-- Compact indexes for match_movies_compact: half the size (halfvec) or 1/32 (binary codes)
+CREATE INDEX IF NOT EXISTS idx_movies_embedding_half ON movies USING hnsw (embedding_half halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_movies_embedding_bit ON movies USING hnsw ((binary_quantize(embedding_half)::bit(384)) bit_hamming_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_movies_embedding_next_half ON movies USING hnsw (embedding_next_half halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_movies_embedding_next_bit ON movies USING hnsw ((binary_quantize(embedding_next_half)::bit(384)) bit_hamming_ops) WITH (m = 16, ef_construction = 64);
 CREATE INDEX IF NOT EXISTS idx_movies_language ON movies(language);
 CREATE INDEX IF NOT EXISTS idx_movies_director ON movies(director);
 CREATE INDEX IF NOT EXISTS idx_movies_genres ON movies USING GIN(genres);
+CREATE INDEX IF NOT EXISTS idx_movies_title_trgm ON movies USING gin (title gin_trgm_ops);
 
 -- ==================== BOOKS TABLE ====================
 CREATE TABLE IF NOT EXISTS books (
@@ -52,14 +69,24 @@ CREATE TABLE IF NOT EXISTS books (
   categories TEXT,
   language TEXT,
   embedding vector(384),
+  embedding_half halfvec(384),
+  embedding_next vector(384),
+  embedding_next_half halfvec(384),
   created_at TIMESTAMPTZ DEFAULT NOW()
 );
 
 CREATE INDEX IF NOT EXISTS idx_books_google ON books(google_id);
-CREATE INDEX IF NOT EXISTS idx_books_embedding ON books USING ivfflat (embedding vector_cosine_ops);
+CREATE INDEX IF NOT EXISTS idx_books_embedding ON books USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_books_embedding_next ON books USING hnsw (embedding_next vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_books_embedding_half ON books USING hnsw (embedding_half halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_books_embedding_bit ON books USING hnsw ((binary_quantize(embedding_half)::bit(384)) bit_hamming_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_books_embedding_next_half ON books USING hnsw (embedding_next_half halfvec_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX IF NOT EXISTS idx_books_embedding_next_bit ON books USING hnsw ((binary_quantize(embedding_next_half)::bit(384)) bit_hamming_ops) WITH (m = 16, ef_construction = 64);
 CREATE INDEX IF NOT EXISTS idx_books_language ON books(language);
 CREATE INDEX IF NOT EXISTS idx_books_categories ON books(categories);
 CREATE INDEX IF NOT EXISTS idx_books_published ON books(published_date);
+CREATE INDEX IF NOT EXISTS idx_books_title_trgm ON books USING gin (title gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_books_authors_trgm ON books USING gin (authors gin_trgm_ops);
 
 -- ==================== RATINGS TABLE ====================
 CREATE TABLE IF NOT EXISTS ratings (
@@ -77,27 +104,159 @@ CREATE INDEX IF NOT EXISTS idx_ratings_user ON ratings(user_id);
 CREATE INDEX IF NOT EXISTS idx_ratings_item ON ratings(item_id, item_type);
 CREATE INDEX IF NOT EXISTS idx_ratings_created ON ratings(created_at DESC);
 
+-- ==================== ITEM STATS TABLE ====================
+-- Per-item rating aggregates kept current by the ratings_item_stats trigger,
+-- so popularity is an index read instead of a GROUP BY over all ratings
+CREATE TABLE IF NOT EXISTS item_stats (
+  item_id UUID NOT NULL,
+  item_type TEXT NOT NULL CHECK (item_type IN ('movie', 'book')),
+  rating_count BIGINT NOT NULL DEFAULT 0,
+  rating_sum FLOAT NOT NULL DEFAULT 0,
+  -- Bayesian average: a prior of 5 ratings at 3.0 keeps one 5-star vote from topping the chart
+  score FLOAT GENERATED ALWAYS AS ((rating_sum + 15.0) / (rating_count + 5)) STORED,
+  last_rated_at TIMESTAMPTZ,
+  PRIMARY KEY (item_id, item_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_item_stats_score ON item_stats(score DESC) WHERE rating_count > 0;
+
 -- ==================== INTERACTIONS TABLE ====================
+-- Range-partitioned by month on created_at (UTC), one table per month named
+-- interactions_YYYY_MM. ensure_interaction_partitions() creates months ahead
+-- of time; expire_interaction_partitions() rolls months past retention into
+-- interaction_daily_items / interaction_daily_users and drops them.
 CREATE TABLE IF NOT EXISTS interactions (
-  id BIGSERIAL PRIMARY KEY,
+  id BIGSERIAL,
   user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
   item_id UUID NOT NULL,
   item_type TEXT NOT NULL CHECK (item_type IN ('movie', 'book')),
   interaction_type TEXT NOT NULL CHECK (interaction_type IN ('view', 'click', 'search')),
-  created_at TIMESTAMPTZ DEFAULT NOW()
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Catches rows outside every monthly partition (a skewed clock, or a month not
+-- created yet); ensure_interaction_partitions() moves them out
+CREATE TABLE IF NOT EXISTS interactions_default PARTITION OF interactions DEFAULT;
+
+-- Nothing reads raw interactions by item any more (item_trending and
+-- user_item_signals do), and rows arrive in created_at order, so a BRIN index
+-- serves time ranges at a fraction of a btree's insert cost
+CREATE INDEX IF NOT EXISTS idx_interactions_user ON interactions(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_interactions_created ON interactions USING brin (created_at);
+
+-- ==================== INTERACTION DAILY AGGREGATES ====================
+-- What is kept of interactions once their month passes retention
+CREATE TABLE IF NOT EXISTS interaction_daily_items (
+  day DATE NOT NULL,
+  item_id UUID NOT NULL,
+  item_type TEXT NOT NULL CHECK (item_type IN ('movie', 'book')),
+  views BIGINT NOT NULL DEFAULT 0,
+  clicks BIGINT NOT NULL DEFAULT 0,
+  searches BIGINT NOT NULL DEFAULT 0,
+  users BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, item_id, item_type)
+);
+
+CREATE TABLE IF NOT EXISTS interaction_daily_users (
+  day DATE NOT NULL,
+  user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  views BIGINT NOT NULL DEFAULT 0,
+  clicks BIGINT NOT NULL DEFAULT 0,
+  searches BIGINT NOT NULL DEFAULT 0,
+  items BIGINT NOT NULL DEFAULT 0,
+  PRIMARY KEY (day, user_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_interaction_daily_users_user ON interaction_daily_users(user_id);
+
+-- ==================== ITEM TRENDING TABLE ====================
+-- Time-decayed interaction counters per item, maintained by the
+-- interactions_item_trending trigger. Each event adds
+-- weight * exp((t - trending_epoch()) / tau), stored as a logarithm so it never
+-- overflows (forward decay). Every score decays by the same factor, so
+-- ordering by the stored value is ordering by the current decayed score.
+CREATE TABLE IF NOT EXISTS item_trending (
+  item_id UUID NOT NULL,
+  item_type TEXT NOT NULL CHECK (item_type IN ('movie', 'book')),
+  log_score_hour FLOAT NOT NULL,
+  log_score_day FLOAT NOT NULL,
+  log_score_week FLOAT NOT NULL,
+  last_interaction_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (item_id, item_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_item_trending_hour ON item_trending(log_score_hour DESC);
+CREATE INDEX IF NOT EXISTS idx_item_trending_day ON item_trending(log_score_day DESC);
+CREATE INDEX IF NOT EXISTS idx_item_trending_week ON item_trending(log_score_week DESC);
+
+-- ==================== EMBEDDING MODELS TABLE ====================
+-- Which model produced the vectors in each column. active: embedding,
+-- next: embedding_next (a backfill in progress, or the previous model after a
+-- promote), retired: neither. The API and sync engine refuse to mix models.
+CREATE TABLE IF NOT EXISTS embedding_models (
+  model_name TEXT PRIMARY KEY,
+  status TEXT NOT NULL CHECK (status IN ('active', 'next', 'retired')),
+  dim INTEGER NOT NULL DEFAULT 384,
+  created_at TIMESTAMPTZ DEFAULT NOW(),
+  activated_at TIMESTAMPTZ
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_embedding_models_status ON embedding_models(status) WHERE status IN ('active', 'next');
+
+INSERT INTO embedding_models (model_name, status, activated_at)
+VALUES ('sentence-transformers/all-MiniLM-L6-v2', 'active', NOW())
+ON CONFLICT (model_name) DO NOTHING;
+
+-- ==================== USER RECOMMENDATIONS TABLE ====================
+-- Top-N personalized recommendations per active user, precomputed nightly by
+-- api/precompute_recs.py from a ratings snapshot taken at computed_at. The
+-- ratings_user_recommendations trigger stamps invalidated_at when the user
+-- rates, so the API recomputes live until the next run.
+CREATE TABLE IF NOT EXISTS user_recommendations (
+  user_id BIGINT PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+  recommendations JSONB NOT NULL,
+  method TEXT NOT NULL,
+  computed_at TIMESTAMPTZ NOT NULL,
+  invalidated_at TIMESTAMPTZ,
+  stale BOOLEAN GENERATED ALWAYS AS (invalidated_at IS NOT NULL AND invalidated_at >= computed_at) STORED
 );
 
-CREATE INDEX IF NOT EXISTS idx_interactions_user ON interactions(user_id);
-CREATE INDEX IF NOT EXISTS idx_interactions_item ON interactions(item_id, item_type);
-CREATE INDEX IF NOT EXISTS idx_interactions_created ON interactions(created_at DESC);
+-- ==================== USER ITEM SIGNALS TABLE ====================
+-- Implicit feedback per (user, item), rolled up from interactions by
+-- rollup_user_item_signals(). log_score is the forward-decayed sum of
+-- interaction_weight over the user's events on the item (time constant
+-- signal_tau()), stored as a logarithm like item_trending.
+CREATE TABLE IF NOT EXISTS user_item_signals (
+  user_id BIGINT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+  item_id UUID NOT NULL,
+  item_type TEXT NOT NULL CHECK (item_type IN ('movie', 'book')),
+  log_score FLOAT NOT NULL,
+  interaction_count BIGINT NOT NULL,
+  last_interaction_at TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (user_id, item_id, item_type)
+);
+
+CREATE INDEX IF NOT EXISTS idx_user_item_signals_score ON user_item_signals(user_id, log_score DESC);
+
+-- ==================== ROLLUP WATERMARKS TABLE ====================
+-- Highest interactions.id each rollup has folded in
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+  rollup TEXT PRIMARY KEY,
+  last_id BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ DEFAULT NOW()
+);
 
 -- ==================== RPC FUNCTIONS ====================
 
 -- Function: Match Movies (Semantic Search)
+-- Orders by the raw distance operator so the HNSW index is used, then applies
+-- the threshold to the top candidates. ef_search trades recall for latency.
 CREATE OR REPLACE FUNCTION match_movies(
   query_embedding vector(384),
   match_threshold float,
-  match_count int
+  match_count int,
+  ef_search int DEFAULT 40
 )
 RETURNS TABLE (
   id uuid,
@@ -111,30 +270,41 @@ RETURNS TABLE (
   genres text[],
   similarity float
 )
-LANGUAGE sql STABLE
+LANGUAGE plpgsql STABLE
 AS $$
-  SELECT
-    id,
-    tmdb_id,
-    title,
-    overview,
-    release_date,
-    poster_url,
-    language,
-    director,
-    genres,
-    1 - (embedding <=> query_embedding) AS similarity
-  FROM movies
-  WHERE 1 - (embedding <=> query_embedding) > match_threshold
-  ORDER BY similarity DESC
-  LIMIT match_count;
+BEGIN
+  -- ef_search must be >= match_count or the index returns fewer rows
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(ef_search, match_count), 1000)::text, true);
+
+  RETURN QUERY
+  SELECT nearest.*
+  FROM (
+    SELECT
+      m.id,
+      m.tmdb_id,
+      m.title,
+      m.overview,
+      m.release_date,
+      m.poster_url,
+      m.language,
+      m.director,
+      m.genres,
+      1 - (m.embedding <=> query_embedding) AS similarity
+    FROM movies m
+    ORDER BY m.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.similarity > match_threshold
+  ORDER BY nearest.similarity DESC;
+END;
 $$;
 
 -- Function: Match Books (Semantic Search)
 CREATE OR REPLACE FUNCTION match_books(
   query_embedding vector(384),
   match_threshold float,
-  match_count int
+  match_count int,
+  ef_search int DEFAULT 40
 )
 RETURNS TABLE (
   id uuid,
@@ -148,26 +318,583 @@ RETURNS TABLE (
   language text,
   similarity float
 )
+LANGUAGE plpgsql STABLE
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(ef_search, match_count), 1000)::text, true);
+
+  RETURN QUERY
+  SELECT nearest.*
+  FROM (
+    SELECT
+      b.id,
+      b.google_id,
+      b.title,
+      b.authors,
+      b.description,
+      b.thumbnail_url,
+      b.published_date,
+      b.categories,
+      b.language,
+      1 - (b.embedding <=> query_embedding) AS similarity
+    FROM books b
+    ORDER BY b.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.similarity > match_threshold
+  ORDER BY nearest.similarity DESC;
+END;
+$$;
+
+-- Function: Match Movies on the compact index (halfvec or binary codes)
+-- Fetches match_count * rescore_factor candidates from the compact HNSW index,
+-- then rescores only those with the full-precision embedding.
+CREATE OR REPLACE FUNCTION match_movies_compact(
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  quantization text DEFAULT 'half',
+  rescore_factor int DEFAULT 4,
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+  id uuid,
+  tmdb_id integer,
+  title text,
+  overview text,
+  release_date date,
+  poster_url text,
+  language text,
+  director text,
+  genres text[],
+  similarity float
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+  candidate_count int := match_count * GREATEST(rescore_factor, 1);
+  candidate_ids uuid[];
+BEGIN
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(ef_search, candidate_count), 1000)::text, true);
+
+  IF quantization = 'binary' THEN
+    SELECT array_agg(c.id) INTO candidate_ids
+    FROM (
+      SELECT m.id
+      FROM movies m
+      ORDER BY binary_quantize(m.embedding_half)::bit(384) <~> binary_quantize(query_embedding)
+      LIMIT candidate_count
+    ) c;
+  ELSE
+    SELECT array_agg(c.id) INTO candidate_ids
+    FROM (
+      SELECT m.id
+      FROM movies m
+      ORDER BY m.embedding_half <=> query_embedding::halfvec(384)
+      LIMIT candidate_count
+    ) c;
+  END IF;
+
+  -- Exact rescoring; the 1 - distance ordering keeps the planner off the full index
+  RETURN QUERY
+  SELECT nearest.*
+  FROM (
+    SELECT
+      m.id,
+      m.tmdb_id,
+      m.title,
+      m.overview,
+      m.release_date,
+      m.poster_url,
+      m.language,
+      m.director,
+      m.genres,
+      1 - (m.embedding <=> query_embedding) AS similarity
+    FROM movies m
+    WHERE m.id = ANY(candidate_ids)
+    ORDER BY 1 - (m.embedding <=> query_embedding) DESC
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.similarity > match_threshold
+  ORDER BY nearest.similarity DESC;
+END;
+$$;
+
+-- Function: Match Books on the compact index (halfvec or binary codes)
+CREATE OR REPLACE FUNCTION match_books_compact(
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  quantization text DEFAULT 'half',
+  rescore_factor int DEFAULT 4,
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+  id uuid,
+  google_id text,
+  title text,
+  authors text,
+  description text,
+  thumbnail_url text,
+  published_date text,
+  categories text,
+  language text,
+  similarity float
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+  candidate_count int := match_count * GREATEST(rescore_factor, 1);
+  candidate_ids uuid[];
+BEGIN
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(ef_search, candidate_count), 1000)::text, true);
+
+  IF quantization = 'binary' THEN
+    SELECT array_agg(c.id) INTO candidate_ids
+    FROM (
+      SELECT b.id
+      FROM books b
+      ORDER BY binary_quantize(b.embedding_half)::bit(384) <~> binary_quantize(query_embedding)
+      LIMIT candidate_count
+    ) c;
+  ELSE
+    SELECT array_agg(c.id) INTO candidate_ids
+    FROM (
+      SELECT b.id
+      FROM books b
+      ORDER BY b.embedding_half <=> query_embedding::halfvec(384)
+      LIMIT candidate_count
+    ) c;
+  END IF;
+
+  RETURN QUERY
+  SELECT nearest.*
+  FROM (
+    SELECT
+      b.id,
+      b.google_id,
+      b.title,
+      b.authors,
+      b.description,
+      b.thumbnail_url,
+      b.published_date,
+      b.categories,
+      b.language,
+      1 - (b.embedding <=> query_embedding) AS similarity
+    FROM books b
+    WHERE b.id = ANY(candidate_ids)
+    ORDER BY 1 - (b.embedding <=> query_embedding) DESC
+    LIMIT match_count
+  ) nearest
+  WHERE nearest.similarity > match_threshold
+  ORDER BY nearest.similarity DESC;
+END;
+$$;
+
+-- Function: Match Movies with metadata filters (Filtered Semantic Search)
+-- Filters are applied inside the vector query so the top-k is not lost to
+-- client-side filtering. Selective filters that starve the HNSW scan fall back
+-- to an exact scan over the rows matched by idx_movies_language / idx_movies_genres.
+CREATE OR REPLACE FUNCTION match_movies_filtered(
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_language text DEFAULT NULL,
+  filter_genres text[] DEFAULT NULL,
+  min_year int DEFAULT NULL,
+  max_year int DEFAULT NULL,
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+  id uuid,
+  tmdb_id integer,
+  title text,
+  overview text,
+  release_date date,
+  poster_url text,
+  language text,
+  director text,
+  genres text[],
+  similarity float
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+  filters text := 'TRUE';
+  candidate_ids uuid[];
+BEGIN
+  -- Only active predicates go into the query so each one can use its index
+  IF filter_language IS NOT NULL THEN
+    filters := filters || ' AND m.language = $2';
+  END IF;
+  IF filter_genres IS NOT NULL THEN
+    filters := filters || ' AND m.genres && $3';
+  END IF;
+  IF min_year IS NOT NULL THEN
+    filters := filters || ' AND m.release_date >= make_date($4, 1, 1)';
+  END IF;
+  IF max_year IS NOT NULL THEN
+    filters := filters || ' AND m.release_date < make_date($5 + 1, 1, 1)';
+  END IF;
+
+  -- Over-fetch from the graph so filtered-out neighbours do not starve the result
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(ef_search, match_count * 4), 1000)::text, true);
+  -- pgvector >= 0.8 keeps walking the graph until enough rows pass the filters
+  BEGIN
+    PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  EXCEPTION WHEN OTHERS THEN
+    NULL;
+  END;
+
+  EXECUTE format(
+    'SELECT array_agg(c.id ORDER BY c.distance) FROM (
+       SELECT m.id, m.embedding <=> $1 AS distance
+       FROM movies m
+       WHERE %s
+       ORDER BY m.embedding <=> $1
+       LIMIT $6
+     ) c', filters)
+  INTO candidate_ids
+  USING query_embedding, filter_language, filter_genres, min_year, max_year, match_count;
+
+  -- Fewer candidates than requested means the filter is selective, so an exact
+  -- scan of the (few) matching rows is cheap and guarantees match_count results
+  IF COALESCE(array_length(candidate_ids, 1), 0) < match_count THEN
+    EXECUTE format(
+      'SELECT array_agg(c.id ORDER BY c.distance) FROM (
+         SELECT m.id, m.embedding <=> $1 AS distance
+         FROM movies m
+         WHERE %s AND m.embedding IS NOT NULL
+         ORDER BY (m.embedding <=> $1) + 0
+         LIMIT $6
+       ) c', filters)
+    INTO candidate_ids
+    USING query_embedding, filter_language, filter_genres, min_year, max_year, match_count;
+  END IF;
+
+  RETURN QUERY
+  SELECT
+    m.id,
+    m.tmdb_id,
+    m.title,
+    m.overview,
+    m.release_date,
+    m.poster_url,
+    m.language,
+    m.director,
+    m.genres,
+    1 - (m.embedding <=> query_embedding) AS similarity
+  FROM movies m
+  WHERE m.id = ANY(candidate_ids)
+    AND 1 - (m.embedding <=> query_embedding) > match_threshold
+  ORDER BY m.embedding <=> query_embedding;
+END;
+$$;
+
+-- Function: Match Books with metadata filters (Filtered Semantic Search)
+-- Year bounds compare against the ISO published_date text, so idx_books_published applies.
+CREATE OR REPLACE FUNCTION match_books_filtered(
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_language text DEFAULT NULL,
+  filter_category text DEFAULT NULL,
+  filter_author text DEFAULT NULL,
+  min_year int DEFAULT NULL,
+  max_year int DEFAULT NULL,
+  ef_search int DEFAULT 40
+)
+RETURNS TABLE (
+  id uuid,
+  google_id text,
+  title text,
+  authors text,
+  description text,
+  thumbnail_url text,
+  published_date text,
+  categories text,
+  language text,
+  similarity float
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+  filters text := 'TRUE';
+  candidate_ids uuid[];
+BEGIN
+  IF filter_language IS NOT NULL THEN
+    filters := filters || ' AND b.language = $2';
+  END IF;
+  IF filter_category IS NOT NULL THEN
+    filters := filters || ' AND b.categories = $3';
+  END IF;
+  IF filter_author IS NOT NULL THEN
+    filters := filters || ' AND b.authors ILIKE ''%%'' || $4 || ''%%''';
+  END IF;
+  IF min_year IS NOT NULL THEN
+    filters := filters || ' AND b.published_date >= $5::text';
+  END IF;
+  IF max_year IS NOT NULL THEN
+    filters := filters || ' AND b.published_date < ($6 + 1)::text';
+  END IF;
+
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(ef_search, match_count * 4), 1000)::text, true);
+  BEGIN
+    PERFORM set_config('hnsw.iterative_scan', 'relaxed_order', true);
+  EXCEPTION WHEN OTHERS THEN
+    NULL;
+  END;
+
+  EXECUTE format(
+    'SELECT array_agg(c.id ORDER BY c.distance) FROM (
+       SELECT b.id, b.embedding <=> $1 AS distance
+       FROM books b
+       WHERE %s
+       ORDER BY b.embedding <=> $1
+       LIMIT $7
+     ) c', filters)
+  INTO candidate_ids
+  USING query_embedding, filter_language, filter_category, filter_author, min_year, max_year, match_count;
+
+  IF COALESCE(array_length(candidate_ids, 1), 0) < match_count THEN
+    EXECUTE format(
+      'SELECT array_agg(c.id ORDER BY c.distance) FROM (
+         SELECT b.id, b.embedding <=> $1 AS distance
+         FROM books b
+         WHERE %s AND b.embedding IS NOT NULL
+         ORDER BY (b.embedding <=> $1) + 0
+         LIMIT $7
+       ) c', filters)
+    INTO candidate_ids
+    USING query_embedding, filter_language, filter_category, filter_author, min_year, max_year, match_count;
+  END IF;
+
+  RETURN QUERY
+  SELECT
+    b.id,
+    b.google_id,
+    b.title,
+    b.authors,
+    b.description,
+    b.thumbnail_url,
+    b.published_date,
+    b.categories,
+    b.language,
+    1 - (b.embedding <=> query_embedding) AS similarity
+  FROM books b
+  WHERE b.id = ANY(candidate_ids)
+    AND 1 - (b.embedding <=> query_embedding) > match_threshold
+  ORDER BY b.embedding <=> query_embedding;
+END;
+$$;
+
+-- Function: Write shadow embeddings (api/reembed.py)
+-- items is a JSON array of {"id": uuid, "embedding": [384 floats]}; one call per page.
+CREATE OR REPLACE FUNCTION write_next_embeddings(target_table text, items jsonb)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  updated integer;
+BEGIN
+  IF target_table = 'movies' THEN
+    UPDATE movies m
+    SET embedding_next = i.embedding::vector(384)
+    FROM jsonb_to_recordset(items) AS i(id uuid, embedding text)
+    WHERE m.id = i.id;
+  ELSIF target_table = 'books' THEN
+    UPDATE books b
+    SET embedding_next = i.embedding::vector(384)
+    FROM jsonb_to_recordset(items) AS i(id uuid, embedding text)
+    WHERE b.id = i.id;
+  ELSE
+    RAISE EXCEPTION 'Unknown table: %', target_table;
+  END IF;
+  GET DIAGNOSTICS updated = ROW_COUNT;
+  RETURN updated;
+END;
+$$;
+
+-- Function: Discard the shadow embeddings before backfilling a different model
+CREATE OR REPLACE FUNCTION reset_next_embeddings()
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  UPDATE movies SET embedding_next = NULL WHERE embedding_next IS NOT NULL;
+  UPDATE books SET embedding_next = NULL WHERE embedding_next IS NOT NULL;
+  UPDATE embedding_models SET status = 'retired' WHERE status = 'next';
+END;
+$$;
+
+-- Function: Promote the backfilled model
+-- Swaps embedding and embedding_next, and their compact copies embedding_half
+-- and embedding_next_half (columns and HNSW indexes), by renaming, so the
+-- switch is atomic and the previous model's vectors stay in embedding_next
+-- for a rollback (promote it again). Nothing is rewritten under the lock. Writes are blocked from
+-- the completeness check to the commit; reads only during the swap itself.
+-- SECURITY DEFINER: renaming columns needs the table owner.
+CREATE OR REPLACE FUNCTION promote_embedding_model(new_model text)
+RETURNS jsonb
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+  previous_model text;
+  missing_movies bigint;
+  missing_books bigint;
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM embedding_models WHERE model_name = new_model AND status = 'next') THEN
+    RAISE EXCEPTION 'Model % is not the backfilled (next) model', new_model;
+  END IF;
+
+  -- No sync or TMDB insert can add a row without embedding_next after the check
+  LOCK TABLE movies, books IN SHARE ROW EXCLUSIVE MODE;
+  SELECT count(*) INTO missing_movies FROM movies WHERE embedding_next IS NULL;
+  SELECT count(*) INTO missing_books FROM books WHERE embedding_next IS NULL;
+  IF missing_movies + missing_books > 0 THEN
+    RAISE EXCEPTION 'Backfill incomplete: % movies and % books have no embedding_next', missing_movies, missing_books;
+  END IF;
+
+  ALTER TABLE movies RENAME COLUMN embedding TO embedding_swap;
+  ALTER TABLE movies RENAME COLUMN embedding_next TO embedding;
+  ALTER TABLE movies RENAME COLUMN embedding_swap TO embedding_next;
+  ALTER INDEX idx_movies_embedding RENAME TO idx_movies_embedding_swap;
+  ALTER INDEX idx_movies_embedding_next RENAME TO idx_movies_embedding;
+  ALTER INDEX idx_movies_embedding_swap RENAME TO idx_movies_embedding_next;
+
+  ALTER TABLE books RENAME COLUMN embedding TO embedding_swap;
+  ALTER TABLE books RENAME COLUMN embedding_next TO embedding;
+  ALTER TABLE books RENAME COLUMN embedding_swap TO embedding_next;
+  ALTER INDEX idx_books_embedding RENAME TO idx_books_embedding_swap;
+  ALTER INDEX idx_books_embedding_next RENAME TO idx_books_embedding;
+  ALTER INDEX idx_books_embedding_swap RENAME TO idx_books_embedding_next;
+
+  -- Compact copies (migration 9), filled by trigger during the backfill
+  ALTER TABLE movies RENAME COLUMN embedding_half TO embedding_swap;
+  ALTER TABLE movies RENAME COLUMN embedding_next_half TO embedding_half;
+  ALTER TABLE movies RENAME COLUMN embedding_swap TO embedding_next_half;
+  ALTER INDEX idx_movies_embedding_half RENAME TO idx_movies_embedding_swap;
+  ALTER INDEX idx_movies_embedding_next_half RENAME TO idx_movies_embedding_half;
+  ALTER INDEX idx_movies_embedding_swap RENAME TO idx_movies_embedding_next_half;
+  ALTER INDEX idx_movies_embedding_bit RENAME TO idx_movies_embedding_swap;
+  ALTER INDEX idx_movies_embedding_next_bit RENAME TO idx_movies_embedding_bit;
+  ALTER INDEX idx_movies_embedding_swap RENAME TO idx_movies_embedding_next_bit;
+
+  ALTER TABLE books RENAME COLUMN embedding_half TO embedding_swap;
+  ALTER TABLE books RENAME COLUMN embedding_next_half TO embedding_half;
+  ALTER TABLE books RENAME COLUMN embedding_swap TO embedding_next_half;
+  ALTER INDEX idx_books_embedding_half RENAME TO idx_books_embedding_swap;
+  ALTER INDEX idx_books_embedding_next_half RENAME TO idx_books_embedding_half;
+  ALTER INDEX idx_books_embedding_swap RENAME TO idx_books_embedding_next_half;
+  ALTER INDEX idx_books_embedding_bit RENAME TO idx_books_embedding_swap;
+  ALTER INDEX idx_books_embedding_next_bit RENAME TO idx_books_embedding_bit;
+  ALTER INDEX idx_books_embedding_swap RENAME TO idx_books_embedding_next_bit;
+
+  SELECT model_name INTO previous_model FROM embedding_models WHERE status = 'active';
+  UPDATE embedding_models SET status = 'retired' WHERE model_name = new_model;
+  UPDATE embedding_models SET status = 'next' WHERE status = 'active';
+  UPDATE embedding_models SET status = 'active', activated_at = NOW() WHERE model_name = new_model;
+
+  RETURN jsonb_build_object('active', new_model, 'previous', previous_model);
+END;
+$$;
+
+-- Supabase grants EXECUTE to the API roles by default; these rewrite the catalog
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+    REVOKE EXECUTE ON FUNCTION write_next_embeddings(text, jsonb), reset_next_embeddings(), promote_embedding_model(text)
+      FROM PUBLIC, anon, authenticated;
+  END IF;
+END;
+$$;
+
+-- Function: Lexical Movie Search (Hybrid Search)
+-- Trigram title match served by idx_movies_title_trgm; exact titles rank first.
+CREATE OR REPLACE FUNCTION search_movies_lexical(
+  query_text text,
+  match_count int
+)
+RETURNS TABLE (
+  id uuid,
+  tmdb_id integer,
+  title text,
+  overview text,
+  release_date date,
+  poster_url text,
+  language text,
+  director text,
+  genres text[],
+  similarity float,
+  exact_match boolean
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    m.id,
+    m.tmdb_id,
+    m.title,
+    m.overview,
+    m.release_date,
+    m.poster_url,
+    m.language,
+    m.director,
+    m.genres,
+    similarity(m.title, query_text)::float AS similarity,
+    lower(m.title) = lower(query_text) AS exact_match
+  FROM movies m
+  WHERE m.title ILIKE '%' || query_text || '%'
+     OR m.title % query_text
+  ORDER BY lower(m.title) = lower(query_text) DESC, similarity(m.title, query_text) DESC
+  LIMIT match_count;
+$$;
+
+-- Function: Lexical Book Search (Hybrid Search)
+-- Matches title or author via idx_books_title_trgm / idx_books_authors_trgm.
+CREATE OR REPLACE FUNCTION search_books_lexical(
+  query_text text,
+  match_count int
+)
+RETURNS TABLE (
+  id uuid,
+  google_id text,
+  title text,
+  authors text,
+  description text,
+  thumbnail_url text,
+  published_date text,
+  categories text,
+  language text,
+  similarity float,
+  exact_match boolean
+)
 LANGUAGE sql STABLE
 AS $$
   SELECT
-    id,
-    google_id,
-    title,
-    authors,
-    description,
-    thumbnail_url,
-    published_date,
-    categories,
-    language,
-    1 - (embedding <=> query_embedding) AS similarity
-  FROM books
-  WHERE 1 - (embedding <=> query_embedding) > match_threshold
-  ORDER BY similarity DESC
+    b.id,
+    b.google_id,
+    b.title,
+    b.authors,
+    b.description,
+    b.thumbnail_url,
+    b.published_date,
+    b.categories,
+    b.language,
+    GREATEST(similarity(b.title, query_text), similarity(COALESCE(b.authors, ''), query_text))::float AS similarity,
+    lower(b.title) = lower(query_text) AS exact_match
+  FROM books b
+  WHERE b.title ILIKE '%' || query_text || '%'
+     OR b.title % query_text
+     OR b.authors ILIKE '%' || query_text || '%'
+  ORDER BY
+    lower(b.title) = lower(query_text) DESC,
+    GREATEST(similarity(b.title, query_text), similarity(COALESCE(b.authors, ''), query_text)) DESC
   LIMIT match_count;
 $$;
 
--- Function: Get Popular Items (Based on ratings)
+-- Function: Get Popular Items (Based on item_stats)
 CREATE OR REPLACE FUNCTION get_popular_items(
   item_limit int DEFAULT 20
 )
@@ -177,45 +904,157 @@ RETURNS TABLE (
   title text,
   avg_rating float,
   rating_count bigint,
-  poster_url text
+  poster_url text,
+  score float
 )
 LANGUAGE sql STABLE
 AS $$
-  WITH movie_ratings AS (
-    SELECT 
-      r.item_id,
-      'movie' as item_type,
-      m.title,
-      AVG(r.rating) as avg_rating,
-      COUNT(*) as rating_count,
-      m.poster_url
-    FROM ratings r
-    JOIN movies m ON r.item_id = m.id
-    WHERE r.item_type = 'movie'
-    GROUP BY r.item_id, m.title, m.poster_url
-    HAVING COUNT(*) >= 1
-  ),
-  book_ratings AS (
-    SELECT 
-      r.item_id,
-      'book' as item_type,
-      b.title,
-      AVG(r.rating) as avg_rating,
-      COUNT(*) as rating_count,
-      b.thumbnail_url as poster_url
-    FROM ratings r
-    JOIN books b ON r.item_id = b.id
-    WHERE r.item_type = 'book'
-    GROUP BY r.item_id, b.title, b.thumbnail_url
-    HAVING COUNT(*) >= 1
-  )
-  SELECT * FROM (
-    SELECT * FROM movie_ratings
+  SELECT
+    s.item_id,
+    s.item_type,
+    COALESCE(m.title, b.title) as title,
+    s.rating_sum / s.rating_count as avg_rating,
+    s.rating_count,
+    COALESCE(m.poster_url, b.thumbnail_url) as poster_url,
+    s.score
+  FROM (
+    SELECT *
+    FROM item_stats st
+    WHERE rating_count > 0
+      -- Stats outlive deleted catalog rows; skip them before the LIMIT
+      AND (CASE st.item_type
+             WHEN 'movie' THEN EXISTS (SELECT 1 FROM movies WHERE id = st.item_id)
+             ELSE EXISTS (SELECT 1 FROM books WHERE id = st.item_id)
+           END)
+    ORDER BY score DESC
+    LIMIT item_limit
+  ) s
+  LEFT JOIN movies m ON s.item_type = 'movie' AND s.item_id = m.id
+  LEFT JOIN books b ON s.item_type = 'book' AND s.item_id = b.id
+  ORDER BY s.score DESC;
+$$;
+
+-- Function: Signal strength of an interaction (click > search > view)
+CREATE OR REPLACE FUNCTION interaction_weight(interaction_type text)
+RETURNS float
+LANGUAGE sql IMMUTABLE
+AS $$
+  SELECT CASE interaction_type
+    WHEN 'click' THEN 3.0
+    WHEN 'search' THEN 2.0
+    ELSE 1.0
+  END;
+$$;
+
+-- Function: Landmark time for forward-decayed trending scores
+CREATE OR REPLACE FUNCTION trending_epoch()
+RETURNS timestamptz
+LANGUAGE sql IMMUTABLE
+AS $$
+  SELECT '2024-01-01 00:00:00+00'::timestamptz;
+$$;
+
+-- Function: ln(exp(a) + exp(b)) without overflow
+CREATE OR REPLACE FUNCTION log_add_exp(a float, b float)
+RETURNS float
+LANGUAGE sql IMMUTABLE
+AS $$
+  SELECT CASE
+    WHEN a IS NULL THEN b
+    WHEN b IS NULL THEN a
+    -- exp() raises on underflow, and the smaller term is negligible anyway
+    WHEN abs(a - b) > 30 THEN GREATEST(a, b)
+    ELSE GREATEST(a, b) + ln(1 + exp(-abs(a - b)))
+  END;
+$$;
+
+-- Function: Get Trending Items (time-decayed interactions)
+-- trend_window is 'hour', 'day' or 'week'; reads item_trending by index only.
+CREATE OR REPLACE FUNCTION get_trending_items(
+  trend_window text DEFAULT 'day',
+  item_limit int DEFAULT 20,
+  filter_item_type text DEFAULT NULL
+)
+RETURNS TABLE (
+  item_id uuid,
+  item_type text,
+  title text,
+  poster_url text,
+  trending_score float,
+  last_interaction_at timestamptz
+)
+LANGUAGE plpgsql STABLE
+AS $$
+DECLARE
+  score_column text := 'log_score_' || CASE trend_window WHEN 'hour' THEN 'hour' WHEN 'week' THEN 'week' ELSE 'day' END;
+  tau float := CASE trend_window WHEN 'hour' THEN 3600 WHEN 'week' THEN 604800 ELSE 86400 END;
+  window_length interval := CASE trend_window WHEN 'hour' THEN interval '1 hour' WHEN 'week' THEN interval '7 days' ELSE interval '1 day' END;
+  now_offset float := EXTRACT(EPOCH FROM (NOW() - trending_epoch())) / tau;
+BEGIN
+  RETURN QUERY EXECUTE format(
+    'SELECT
+       t.item_id,
+       t.item_type,
+       COALESCE(m.title, b.title) AS title,
+       COALESCE(m.poster_url, b.thumbnail_url) AS poster_url,
+       exp(GREATEST(t.log_score - $1, -700)) AS trending_score,
+       t.last_interaction_at
+     FROM (
+       SELECT s.item_id, s.item_type, s.%1$I AS log_score, s.last_interaction_at
+       FROM item_trending s
+       WHERE s.last_interaction_at >= NOW() - $2
+         AND ($4::text IS NULL OR s.item_type = $4)
+       ORDER BY s.%1$I DESC
+       LIMIT $3
+     ) t
+     LEFT JOIN movies m ON t.item_type = ''movie'' AND t.item_id = m.id
+     LEFT JOIN books b ON t.item_type = ''book'' AND t.item_id = b.id
+     WHERE COALESCE(m.id, b.id) IS NOT NULL
+     ORDER BY t.log_score DESC', score_column)
+  USING now_offset, window_length, item_limit, filter_item_type;
+END;
+$$;
+
+-- Function: Titles for the /search/suggest prefix index (api/suggest.py)
+-- One keyset page of a type's titles with a popularity for ranking: ratings
+-- plus this week's decayed interaction score from item_trending
+CREATE OR REPLACE FUNCTION get_suggest_titles(
+  filter_item_type text,
+  after_id uuid DEFAULT NULL,
+  page_size int DEFAULT 1000
+)
+RETURNS TABLE (
+  item_id uuid,
+  title text,
+  year int,
+  poster_url text,
+  popularity float
+)
+LANGUAGE sql STABLE
+AS $$
+  WITH page AS (
+    SELECT m.id, m.title, EXTRACT(YEAR FROM m.release_date)::int AS year, m.poster_url
+    FROM movies m
+    WHERE filter_item_type = 'movie' AND (after_id IS NULL OR m.id > after_id)
     UNION ALL
-    SELECT * FROM book_ratings
-  ) combined
-  ORDER BY avg_rating DESC, rating_count DESC
-  LIMIT item_limit;
+    SELECT b.id, b.title, substring(b.published_date FROM '^\d{4}')::int, b.thumbnail_url
+    FROM books b
+    WHERE filter_item_type = 'book' AND (after_id IS NULL OR b.id > after_id)
+    ORDER BY 1
+    LIMIT page_size
+  )
+  SELECT
+    p.id,
+    p.title,
+    p.year,
+    p.poster_url,
+    COALESCE(s.rating_count, 0)
+      + CASE WHEN t.item_id IS NULL THEN 0
+        ELSE exp(GREATEST(t.log_score_week - EXTRACT(EPOCH FROM (NOW() - trending_epoch())) / 604800, -700)) END
+  FROM page p
+  LEFT JOIN item_stats s ON s.item_id = p.id AND s.item_type = filter_item_type
+  LEFT JOIN item_trending t ON t.item_id = p.id AND t.item_type = filter_item_type
+  ORDER BY p.id;
 $$;
 
 -- Function: Collaborative Filtering Recommendations
@@ -281,6 +1120,324 @@ BEGIN
 END;
 $$;
 
+-- Function: Users who rated or interacted since a point in time (api/precompute_recs.py)
+-- One array instead of a row set, so PostgREST's max-rows does not truncate it.
+CREATE OR REPLACE FUNCTION get_active_user_ids(since timestamptz)
+RETURNS bigint[]
+LANGUAGE sql STABLE
+AS $$
+  SELECT COALESCE(array_agg(user_id ORDER BY user_id), '{}')
+  FROM (
+    SELECT user_id FROM ratings WHERE updated_at >= since
+    UNION
+    SELECT user_id FROM interactions WHERE created_at >= since
+  ) active;
+$$;
+
+-- Function: Store precomputed recommendations (api/precompute_recs.py)
+-- items is a JSON array of {"user_id", "recommendations", "method"} computed
+-- from the ratings as of snapshot_at. Ratings written since then invalidate
+-- the new row straight away (the trigger only sees rows that already exist).
+CREATE OR REPLACE FUNCTION write_user_recommendations(items jsonb, snapshot_at timestamptz)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  written integer;
+BEGIN
+  INSERT INTO user_recommendations (user_id, recommendations, method, computed_at, invalidated_at)
+  SELECT i.user_id, i.recommendations, i.method, snapshot_at,
+         (SELECT max(r.updated_at) FROM ratings r WHERE r.user_id = i.user_id AND r.updated_at >= snapshot_at)
+  FROM jsonb_to_recordset(items) AS i(user_id bigint, recommendations jsonb, method text)
+  WHERE EXISTS (SELECT 1 FROM users u WHERE u.id = i.user_id)
+  ON CONFLICT (user_id) DO UPDATE
+  SET recommendations = EXCLUDED.recommendations,
+      method = EXCLUDED.method,
+      computed_at = EXCLUDED.computed_at,
+      invalidated_at = GREATEST(user_recommendations.invalidated_at, EXCLUDED.invalidated_at);
+  GET DIAGNOSTICS written = ROW_COUNT;
+  RETURN written;
+END;
+$$;
+
+-- Only the batch job (service key) writes precomputed recommendations
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+    REVOKE EXECUTE ON FUNCTION write_user_recommendations(jsonb, timestamptz), get_active_user_ids(timestamptz)
+      FROM PUBLIC, anon, authenticated;
+  END IF;
+END;
+$$;
+
+-- Function: Time constant (seconds) of the user_item_signals decay
+-- 30 days: an interaction counts half as much after about three weeks.
+CREATE OR REPLACE FUNCTION signal_tau()
+RETURNS float
+LANGUAGE sql IMMUTABLE
+AS $$
+  SELECT 2592000.0::float;
+$$;
+
+-- Function: Fold new interactions into user_item_signals
+-- Takes up to batch_size interactions past the watermark, in id order, and
+-- returns how many it folded in; call it until that is less than batch_size.
+-- Interactions from the last minute wait for the next call: ids are handed
+-- out at insert but become visible at commit, so a slow insert can still
+-- commit an id below one already folded in.
+CREATE OR REPLACE FUNCTION rollup_user_item_signals(batch_size int DEFAULT 50000)
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  watermark bigint;
+  horizon bigint;
+  batch_end bigint;
+  folded integer;
+BEGIN
+  INSERT INTO rollup_watermarks (rollup) VALUES ('user_item_signals') ON CONFLICT (rollup) DO NOTHING;
+  -- The row lock also keeps two concurrent runs from folding the same batch
+  SELECT w.last_id INTO watermark FROM rollup_watermarks w WHERE w.rollup = 'user_item_signals' FOR UPDATE;
+
+  -- Future-dated rows (clock skew, an explicit created_at) would pin the horizon
+  SELECT min(i.id) INTO horizon FROM interactions i
+  WHERE i.created_at >= NOW() - interval '1 minute' AND i.created_at <= NOW();
+  SELECT max(b.id), count(*) INTO batch_end, folded
+  FROM (
+    SELECT i.id FROM interactions i
+    WHERE i.id > watermark AND (horizon IS NULL OR i.id < horizon)
+    ORDER BY i.id
+    LIMIT batch_size
+  ) b;
+  IF batch_end IS NULL THEN
+    RETURN 0;
+  END IF;
+
+  -- Per-(user, item) log-sum-exp, shifted by the newest event to stay in range
+  INSERT INTO user_item_signals (user_id, item_id, item_type, log_score, interaction_count, last_interaction_at)
+  SELECT
+    e.user_id,
+    e.item_id,
+    e.item_type,
+    MAX(e.newest) + ln(SUM(exp(GREATEST(e.log_weight - e.newest, -700)))),
+    COUNT(*),
+    MAX(e.created_at)
+  FROM (
+    SELECT
+      i.user_id,
+      i.item_id,
+      i.item_type,
+      i.created_at,
+      w.log_weight,
+      MAX(w.log_weight) OVER (PARTITION BY i.user_id, i.item_id, i.item_type) AS newest
+    FROM interactions i
+    CROSS JOIN LATERAL (
+      SELECT ln(interaction_weight(i.interaction_type))
+        + EXTRACT(EPOCH FROM (i.created_at - trending_epoch())) / signal_tau() AS log_weight
+    ) w
+    WHERE i.id > watermark AND i.id <= batch_end
+  ) e
+  GROUP BY e.user_id, e.item_id, e.item_type
+  ON CONFLICT (user_id, item_id, item_type) DO UPDATE
+  SET log_score = log_add_exp(user_item_signals.log_score, EXCLUDED.log_score),
+      interaction_count = user_item_signals.interaction_count + EXCLUDED.interaction_count,
+      last_interaction_at = GREATEST(user_item_signals.last_interaction_at, EXCLUDED.last_interaction_at);
+
+  UPDATE rollup_watermarks SET last_id = batch_end, updated_at = NOW() WHERE rollup = 'user_item_signals';
+  RETURN folded;
+END;
+$$;
+
+-- Function: Each user's strongest implicit signals, strongest first
+-- score is the decayed weight as of now (a click today counts 3.0). One call
+-- covers a block of users, so the precompute job does not page per user.
+CREATE OR REPLACE FUNCTION get_user_signals(user_ids bigint[], per_user int DEFAULT 5)
+RETURNS TABLE (
+  user_id bigint,
+  item_id uuid,
+  item_type text,
+  score float,
+  interaction_count bigint,
+  last_interaction_at timestamptz
+)
+LANGUAGE sql STABLE
+AS $$
+  SELECT
+    s.user_id,
+    s.item_id,
+    s.item_type,
+    exp(GREATEST(s.log_score - EXTRACT(EPOCH FROM (NOW() - trending_epoch())) / signal_tau(), -700)),
+    s.interaction_count,
+    s.last_interaction_at
+  FROM unnest(user_ids) AS u(id)
+  CROSS JOIN LATERAL (
+    SELECT x.* FROM user_item_signals x
+    WHERE x.user_id = u.id
+    ORDER BY x.log_score DESC
+    LIMIT per_user
+  ) s
+  ORDER BY s.user_id, s.log_score DESC;
+$$;
+
+-- Only the batch job (service key) advances the rollup
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+    REVOKE EXECUTE ON FUNCTION rollup_user_item_signals(int) FROM PUBLIC, anon, authenticated;
+  END IF;
+END;
+$$;
+
+-- Function: Create the monthly interactions partitions from since's month to months_ahead past now
+-- Each month is built detached and then attached, so rows already sitting in
+-- interactions_default for that month move over without firing insert
+-- triggers again. Returns the number of partitions created.
+CREATE OR REPLACE FUNCTION ensure_interaction_partitions(months_ahead int DEFAULT 3, since timestamptz DEFAULT NOW())
+RETURNS integer
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  month_start timestamp := date_trunc('month', since AT TIME ZONE 'UTC');
+  last_month timestamp := date_trunc('month', NOW() AT TIME ZONE 'UTC') + make_interval(months => months_ahead);
+  lower_bound timestamptz;
+  upper_bound timestamptz;
+  partition_name text;
+  created integer := 0;
+BEGIN
+  WHILE month_start <= last_month LOOP
+    partition_name := 'interactions_' || to_char(month_start, 'YYYY_MM');
+    IF to_regclass(partition_name) IS NULL THEN
+      lower_bound := month_start AT TIME ZONE 'UTC';
+      upper_bound := (month_start + interval '1 month') AT TIME ZONE 'UTC';
+      EXECUTE format('CREATE TABLE %I (LIKE interactions INCLUDING DEFAULTS INCLUDING CONSTRAINTS)', partition_name);
+      EXECUTE format(
+        'WITH moved AS (DELETE FROM interactions_default WHERE created_at >= $1 AND created_at < $2 RETURNING *)
+         INSERT INTO %I SELECT * FROM moved', partition_name)
+      USING lower_bound, upper_bound;
+      EXECUTE format('ALTER TABLE interactions ATTACH PARTITION %I FOR VALUES FROM (%L) TO (%L)',
+                     partition_name, lower_bound, upper_bound);
+      created := created + 1;
+    END IF;
+    month_start := month_start + interval '1 month';
+  END LOOP;
+  RETURN created;
+END;
+$$;
+
+-- Function: Add interactions from source (created before until, id <= max_id) to the daily aggregates
+-- Days are UTC. Returns the number of interactions rolled up.
+CREATE OR REPLACE FUNCTION rollup_interaction_days(source regclass, until timestamptz, max_id bigint)
+RETURNS bigint
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  rolled bigint;
+BEGIN
+  EXECUTE format(
+    'INSERT INTO interaction_daily_items (day, item_id, item_type, views, clicks, searches, users)
+     SELECT (created_at AT TIME ZONE ''UTC'')::date, item_id, item_type,
+            COUNT(*) FILTER (WHERE interaction_type = ''view''),
+            COUNT(*) FILTER (WHERE interaction_type = ''click''),
+            COUNT(*) FILTER (WHERE interaction_type = ''search''),
+            COUNT(DISTINCT user_id)
+     FROM %s
+     WHERE created_at < $1 AND id <= $2
+     GROUP BY 1, 2, 3
+     ON CONFLICT (day, item_id, item_type) DO UPDATE
+     SET views = interaction_daily_items.views + EXCLUDED.views,
+         clicks = interaction_daily_items.clicks + EXCLUDED.clicks,
+         searches = interaction_daily_items.searches + EXCLUDED.searches,
+         users = interaction_daily_items.users + EXCLUDED.users', source)
+  USING until, max_id;
+
+  EXECUTE format(
+    'INSERT INTO interaction_daily_users (day, user_id, views, clicks, searches, items)
+     SELECT (created_at AT TIME ZONE ''UTC'')::date, user_id,
+            COUNT(*) FILTER (WHERE interaction_type = ''view''),
+            COUNT(*) FILTER (WHERE interaction_type = ''click''),
+            COUNT(*) FILTER (WHERE interaction_type = ''search''),
+            COUNT(DISTINCT (item_id, item_type))
+     FROM %s
+     WHERE created_at < $1 AND id <= $2
+     GROUP BY 1, 2
+     ON CONFLICT (day, user_id) DO UPDATE
+     SET views = interaction_daily_users.views + EXCLUDED.views,
+         clicks = interaction_daily_users.clicks + EXCLUDED.clicks,
+         searches = interaction_daily_users.searches + EXCLUDED.searches,
+         items = interaction_daily_users.items + EXCLUDED.items', source)
+  USING until, max_id;
+
+  EXECUTE format('SELECT COUNT(*) FROM %s WHERE created_at < $1 AND id <= $2', source)
+  INTO rolled USING until, max_id;
+  RETURN rolled;
+END;
+$$;
+
+-- Function: Roll monthly interactions partitions older than keep_months into the daily aggregates and drop them
+-- A month is only dropped once rollup_user_item_signals() has folded in all
+-- of it; until then it is reported under waiting_for_signals. Old rows that
+-- ended up in interactions_default are expired the same way.
+CREATE OR REPLACE FUNCTION expire_interaction_partitions(keep_months int DEFAULT 6)
+RETURNS jsonb
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  cutoff timestamptz := (date_trunc('month', NOW() AT TIME ZONE 'UTC') - make_interval(months => keep_months)) AT TIME ZONE 'UTC';
+  watermark bigint;
+  part record;
+  newest bigint;
+  dropped text[] := '{}';
+  waiting text[] := '{}';
+  rolled bigint := 0;
+  default_rows bigint;
+BEGIN
+  SELECT COALESCE(max(w.last_id), 0) INTO watermark FROM rollup_watermarks w WHERE w.rollup = 'user_item_signals';
+
+  FOR part IN
+    SELECT c.oid::regclass AS partition, c.relname
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    WHERE i.inhparent = 'interactions'::regclass
+      AND c.relname ~ '^interactions_\d{4}_\d{2}$'
+      AND (to_date(right(c.relname, 7), 'YYYY_MM') + interval '1 month') AT TIME ZONE 'UTC' <= cutoff
+    ORDER BY c.relname
+  LOOP
+    EXECUTE format('SELECT max(id) FROM %s', part.partition) INTO newest;
+    IF COALESCE(newest, 0) > watermark THEN
+      waiting := waiting || part.relname;
+      CONTINUE;
+    END IF;
+    rolled := rolled + rollup_interaction_days(part.partition, cutoff, watermark);
+    EXECUTE format('DROP TABLE %s', part.partition);
+    dropped := dropped || part.relname;
+  END LOOP;
+
+  default_rows := rollup_interaction_days('interactions_default'::regclass, cutoff, watermark);
+  DELETE FROM interactions_default WHERE created_at < cutoff AND id <= watermark;
+  rolled := rolled + default_rows;
+
+  RETURN jsonb_build_object(
+    'cutoff', cutoff,
+    'dropped', to_jsonb(dropped),
+    'waiting_for_signals', to_jsonb(waiting),
+    'default_rows_expired', default_rows,
+    'interactions_rolled_up', rolled
+  );
+END;
+$$;
+
+-- Only the batch job (service key) manages partitions
+DO $$
+BEGIN
+  IF EXISTS (SELECT 1 FROM pg_roles WHERE rolname = 'anon') THEN
+    REVOKE EXECUTE ON FUNCTION ensure_interaction_partitions(int, timestamptz),
+      rollup_interaction_days(regclass, timestamptz, bigint),
+      expire_interaction_partitions(int)
+      FROM PUBLIC, anon, authenticated;
+  END IF;
+END;
+$$;
+
 -- Function: Update timestamp on row update
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -290,9 +1447,109 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql;
 
+-- Function: Keep item_stats in sync with ratings
+CREATE OR REPLACE FUNCTION update_item_stats()
+RETURNS TRIGGER AS $$
+BEGIN
+  IF TG_OP = 'UPDATE'
+     AND OLD.rating = NEW.rating
+     AND OLD.item_id = NEW.item_id
+     AND OLD.item_type = NEW.item_type THEN
+    RETURN NULL;
+  END IF;
+
+  IF TG_OP IN ('UPDATE', 'DELETE') THEN
+    UPDATE item_stats
+    SET rating_count = rating_count - 1,
+        rating_sum = rating_sum - OLD.rating
+    WHERE item_id = OLD.item_id AND item_type = OLD.item_type;
+  END IF;
+
+  IF TG_OP IN ('INSERT', 'UPDATE') THEN
+    INSERT INTO item_stats (item_id, item_type, rating_count, rating_sum, last_rated_at)
+    VALUES (NEW.item_id, NEW.item_type, 1, NEW.rating, NOW())
+    ON CONFLICT (item_id, item_type) DO UPDATE
+    SET rating_count = item_stats.rating_count + 1,
+        rating_sum = item_stats.rating_sum + EXCLUDED.rating_sum,
+        last_rated_at = EXCLUDED.last_rated_at;
+  END IF;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Keep embedding_half and embedding_next_half float16 copies of
+-- embedding and embedding_next
+CREATE OR REPLACE FUNCTION sync_embedding_half()
+RETURNS TRIGGER AS $$
+BEGIN
+  NEW.embedding_half = NEW.embedding::halfvec(384);
+  NEW.embedding_next_half = NEW.embedding_next::halfvec(384);
+  RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Fold a new interaction into item_trending
+CREATE OR REPLACE FUNCTION update_item_trending()
+RETURNS TRIGGER AS $$
+DECLARE
+  event_at timestamptz := COALESCE(NEW.created_at, NOW());
+  age float := EXTRACT(EPOCH FROM (event_at - trending_epoch()));
+  log_weight float := ln(interaction_weight(NEW.interaction_type));
+BEGIN
+  INSERT INTO item_trending (item_id, item_type, log_score_hour, log_score_day, log_score_week, last_interaction_at)
+  VALUES (
+    NEW.item_id,
+    NEW.item_type,
+    log_weight + age / 3600,
+    log_weight + age / 86400,
+    log_weight + age / 604800,
+    event_at
+  )
+  ON CONFLICT (item_id, item_type) DO UPDATE
+  SET log_score_hour = log_add_exp(item_trending.log_score_hour, EXCLUDED.log_score_hour),
+      log_score_day = log_add_exp(item_trending.log_score_day, EXCLUDED.log_score_day),
+      log_score_week = log_add_exp(item_trending.log_score_week, EXCLUDED.log_score_week),
+      last_interaction_at = GREATEST(item_trending.last_interaction_at, EXCLUDED.last_interaction_at);
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Function: Invalidate a user's precomputed recommendations when they rate
+CREATE OR REPLACE FUNCTION invalidate_user_recommendations()
+RETURNS TRIGGER AS $$
+BEGIN
+  UPDATE user_recommendations
+  SET invalidated_at = NOW()
+  WHERE user_id = CASE WHEN TG_OP = 'DELETE' THEN OLD.user_id ELSE NEW.user_id END;
+
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
 -- Triggers for updated_at
 CREATE TRIGGER update_users_updated_at BEFORE UPDATE ON users
   FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 
 CREATE TRIGGER update_ratings_updated_at BEFORE UPDATE ON ratings
   FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Watches both columns: UPDATE OF lists them by position and promote swaps their names
+CREATE TRIGGER movies_embedding_half BEFORE INSERT OR UPDATE OF embedding, embedding_next ON movies
+  FOR EACH ROW EXECUTE FUNCTION sync_embedding_half();
+
+CREATE TRIGGER books_embedding_half BEFORE INSERT OR UPDATE OF embedding, embedding_next ON books
+  FOR EACH ROW EXECUTE FUNCTION sync_embedding_half();
+
+CREATE TRIGGER ratings_item_stats AFTER INSERT OR UPDATE OR DELETE ON ratings
+  FOR EACH ROW EXECUTE FUNCTION update_item_stats();
+
+CREATE TRIGGER interactions_item_trending AFTER INSERT ON interactions
+  FOR EACH ROW EXECUTE FUNCTION update_item_trending();
+
+CREATE TRIGGER ratings_user_recommendations AFTER INSERT OR UPDATE OR DELETE ON ratings
+  FOR EACH ROW EXECUTE FUNCTION invalidate_user_recommendations();
+
+-- This month and the next three
+SELECT ensure_interaction_partitions();
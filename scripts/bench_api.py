@@ -0,0 +1,358 @@
+"""
+End-to-end API benchmark for CineLibre
+Runs the FastAPI app from api/main.py in-process against local stand-ins
+(in-memory Supabase, stub embedder and a fake TMDB server), so it needs no
+credentials or network and is safe to run anywhere.
+
+    pip install -r requirements-bench.txt
+    python scripts/bench_api.py --requests 300 --concurrency 16
+    python scripts/bench_api.py --endpoints search_semantic movie_details --tmdb-latency-ms 150
+    python scripts/bench_api.py --real-model   # embed with the real FastEmbed model
+    python scripts/bench_api.py --soak 600 --max-rss-slope 0.5
+    python scripts/bench_api.py --sidecar --embed-call-ms 8   # embed through api/embed_sidecar.py
+    python scripts/bench_api.py --endpoints personalized --precomputed-recs   # serve from user_recommendations
+    python scripts/bench_api.py --overload --concurrency 24 --embed-ms 50   # search burst vs. cheap requests
+
+For every endpoint scenario it drives `--requests` requests at
+`--concurrency` and reports p50/p95/p99 latency, throughput, error count and
+process RSS. Results go to bench_results/api-<commit>.json.
+
+--soak runs a read-only mix of endpoints for the given number of seconds and
+exits non-zero if RSS grows faster than --max-rss-slope MB/minute after the
+warmup. Write endpoints are left out because the in-memory fakes keep every
+inserted row, which would look like a leak.
+
+--overload fires a burst of semantic searches at --concurrency while two
+clients fetch /books/{id}, once with admission control (api/admission.py)
+off and once on. The app runs behind uvicorn's limit_concurrency (503 past
+--limit-concurrency requests in flight), and the stub embedder runs one
+embed at a time, like CPU-bound inference on one core. Other runs keep
+admission control off so their numbers stay comparable.
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_common import RssSampler, summarize_latencies, write_results
+from api.memory import linear_slope
+from bench_fakes import FakeEmbedder, FakeSupabase, FakeTMDBServer, WORDS
+
+try:
+    import httpx
+except ImportError:
+    sys.exit("httpx is required: pip install -r requirements-bench.txt")
+
+QUERIES = [
+    "a gangster rises in the city", "family drama in a village", "love story across the river",
+    "heist thriller with a twist", "king returns to reclaim his land", "silent storm at night",
+    "coming of age journey", "detective hunts a hidden killer",
+]
+
+def build_scenarios(db, user_token):
+    """Endpoint name -> callable returning (method, url, kwargs) for the n-th request"""
+    movies = db.tables["movies"]
+    books = db.tables["books"]
+    auth = {"headers": {"Authorization": f"Bearer {user_token}"}}
+    query = lambda n: QUERIES[n % len(QUERIES)]
+    return {
+        "health": lambda n: ("GET", "/", {}),
+        "search_semantic": lambda n: ("GET", "/search/semantic", {"params": {"q": query(n), "limit": 12}}),
+        "search_filtered": lambda n: ("GET", "/search/semantic", {"params": {
+            "q": query(n), "language": "te", "year_from": 2010, "threshold": 0.0,
+        }}),
+        "search_hybrid": lambda n: ("GET", "/search/semantic", {"params": {
+            "q": WORDS[n % len(WORDS)] if n % 2 else query(n), "mode": "hybrid",
+        }}),
+        # Nothing clears the threshold, so every request falls through to TMDB
+        "search_tmdb_fallback": lambda n: ("GET", "/search/semantic", {"params": {"q": f"{query(n)} {n}", "threshold": 0.99}}),
+        "similar": lambda n: ("GET", f"/recommendations/similar/movie/{movies[n % len(movies)]['id']}", {}),
+        "personalized": lambda n: ("GET", "/recommendations/personalized", auth),
+        # Typeahead: 1-4 leading characters of a catalog title
+        "suggest": lambda n: ("GET", "/search/suggest", {"params": {"prefix": movies[n % len(movies)]["title"][:1 + n % 4]}}),
+        "popular": lambda n: ("GET", "/recommendations/popular", {}),
+        "trending": lambda n: ("GET", "/recommendations/trending", {"params": {"window": "day"}}),
+        "movie_details": lambda n: ("GET", f"/movies/{movies[n % len(movies)]['id']}", {"params": {"include_details": True}}),
+        "book": lambda n: ("GET", f"/books/{books[n % len(books)]['id']}", {}),
+        "list_movies": lambda n: ("GET", "/movies", {"params": {"skip": (n * 20) % len(movies), "limit": 20}}),
+        "interaction": lambda n: ("POST", "/interactions", {**auth, "json": {
+            "item_id": movies[n % len(movies)]["id"], "item_type": "movie", "interaction_type": "view",
+        }}),
+    }
+
+# Read-only endpoints for --soak; fakes never free written rows
+SOAK_ENDPOINTS = [
+    "health", "search_semantic", "search_filtered", "search_hybrid", "similar",
+    "personalized", "popular", "trending", "book", "list_movies", "suggest",
+]
+
+def parse_server_timing(header):
+    """Yield (name, milliseconds) pairs from a Server-Timing header"""
+    for metric in filter(None, (part.strip() for part in header.split(","))):
+        name, *params = metric.split(";")
+        for param in params:
+            if param.startswith("dur="):
+                yield name, float(param[4:])
+
+async def run_scenario(client, make_request, total, concurrency, backoff_s=0.0):
+    """Fire `total` requests from `concurrency` workers, returning latencies and failures
+
+    With backoff_s, a worker turned away (429 / 503) waits that long before its next request.
+    """
+    counter = itertools.count()
+    latencies, ok_latencies, errors, statuses, stage_ms = [], [], 0, {}, {}
+
+    async def worker():
+        nonlocal errors
+        while (n := next(counter)) < total:
+            method, url, kwargs = make_request(n)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+                status = response.status_code
+                for name, ms in parse_server_timing(response.headers.get("server-timing", "")):
+                    stage_ms[name] = stage_ms.get(name, 0.0) + ms
+            except Exception:
+                status = "exception"
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == "exception" or status >= 400:
+                errors += 1
+                if backoff_s and status in (429, 503):
+                    await asyncio.sleep(backoff_s)
+            else:
+                ok_latencies.append(latencies[-1])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    return {
+        "latency": summarize_latencies(latencies),
+        "ok_latency": summarize_latencies(ok_latencies),
+        "throughput_rps": round(total / elapsed, 2),
+        "ok_rps": round(len(ok_latencies) / elapsed, 2),
+        "errors": errors,
+        "status_codes": {str(k): v for k, v in statuses.items()},
+        # Mean per request, from the Server-Timing header
+        "stage_mean_ms": {name: round(ms / total, 3) for name, ms in stage_ms.items() if name != "total"},
+    }
+
+class LimitConcurrency:
+    """uvicorn's limit_concurrency: past `limit` requests in flight, answer 503 at once"""
+
+    def __init__(self, app, limit):
+        self.app = app
+        self.limit = limit
+        self.active = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if self.active >= self.limit:
+            await send({"type": "http.response.start", "status": 503, "headers": [(b"content-type", b"text/plain")]})
+            await send({"type": "http.response.body", "body": b"Service Unavailable"})
+            return
+        self.active += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.active -= 1
+
+async def run_overload(app, db, args):
+    """A burst of searches alongside a trickle of cheap requests, with admission control off, then on"""
+    from api import admission
+    from api.auth import create_access_token
+
+    # Spread over 50 users, so the burst stays within each client's quota
+    tokens = [create_access_token({"user_id": u, "email": f"user{u}@example.com"}) for u in range(1, 51)]
+    books = db.tables["books"]
+    search = lambda n: ("GET", "/search/semantic", {
+        "params": {"q": QUERIES[n % len(QUERIES)], "limit": 12},
+        "headers": {"Authorization": f"Bearer {tokens[n % len(tokens)]}"},
+    })
+    cheap = lambda n: ("GET", f"/books/{books[n % len(books)]['id']}", {})
+
+    results = {}
+    transport = httpx.ASGITransport(app=LimitConcurrency(app, args.limit_concurrency))
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        for enabled in (False, True):
+            admission.ADMISSION_CONTROL = enabled
+            burst, trickle = await asyncio.gather(
+                run_scenario(client, search, args.requests, args.concurrency, args.backoff_ms / 1000),
+                run_scenario(client, cheap, args.requests // 2, 2),
+            )
+            phase = "admission_on" if enabled else "admission_off"
+            results[phase] = {"search": burst, "book": trickle}
+            for name, outcome in (("search", burst), ("book", trickle)):
+                lat, ok = outcome["latency"], outcome["ok_latency"]
+                print(f"{phase:14s} {name:7s} p50={lat['p50_ms']:8.2f}ms p99={lat['p99_ms']:8.2f}ms "
+                      f"ok p99={ok.get('p99_ms', 0):8.2f}ms ok={outcome['ok_rps']:6.1f}/s "
+                      f"statuses={outcome['status_codes']}")
+    return results
+
+async def run_soak(client, scenarios, seconds, concurrency, warmup, max_slope):
+    """Cycle through the soak endpoints for `seconds` and fit a line to RSS after warmup"""
+    deadline = time.monotonic() + seconds
+    counter = itertools.count()
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            n = next(counter)
+            method, url, kwargs = scenarios[SOAK_ENDPOINTS[n % len(SOAK_ENDPOINTS)]](n)
+            start = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+
+    with RssSampler(interval=1.0) as rss:
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    start = rss.times[0]
+    points = [
+        ((t - start) / 60, b / 1024 / 1024)
+        for t, b in zip(rss.times, rss.samples) if t - start >= warmup
+    ]
+    slope = linear_slope(points)
+    return {
+        "seconds": seconds,
+        "warmup_s": warmup,
+        "requests": len(latencies),
+        "errors": errors,
+        "latency": summarize_latencies(latencies),
+        "rss_slope_mb_per_min": round(slope, 3),
+        "max_rss_slope_mb_per_min": max_slope,
+        "passed": slope <= max_slope,
+        **rss.summary(),
+    }
+
+async def run(args, app, db):
+    from api.auth import create_access_token
+
+    token = create_access_token({"user_id": 1, "email": "user1@example.com"})
+    scenarios = build_scenarios(db, token)
+    selected = args.endpoints or list(scenarios)
+
+    if args.overload:
+        return {"overload": await run_overload(app, db, args)}
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+        if args.soak:
+            warmup = args.soak * 0.2 if args.warmup is None else args.warmup
+            soak = await run_soak(client, scenarios, args.soak, args.concurrency, warmup, args.max_rss_slope)
+            print(f"soak {soak['requests']} requests in {args.soak}s, errors={soak['errors']}, "
+                  f"RSS {soak['rss_start_mb']} -> {soak['rss_end_mb']}MB, "
+                  f"slope {soak['rss_slope_mb_per_min']} MB/min (max {args.max_rss_slope}): "
+                  f"{'PASS' if soak['passed'] else 'FAIL'}")
+            return {"soak": soak}
+
+        for name in selected:
+            # One untimed request so first-call costs (model load, matrix build) are not in the numbers
+            method, url, kwargs = scenarios[name](0)
+            await client.request(method, url, **kwargs)
+
+            with RssSampler() as rss:
+                outcome = await run_scenario(client, scenarios[name], args.requests, args.concurrency)
+            outcome.update(rss.summary())
+            results[name] = outcome
+            lat = outcome["latency"]
+            print(f"{name:22s} p50={lat['p50_ms']:8.2f}ms p95={lat['p95_ms']:8.2f}ms "
+                  f"p99={lat['p99_ms']:8.2f}ms {outcome['throughput_rps']:8.1f} req/s "
+                  f"errors={outcome['errors']:<4d} rss={outcome['rss_peak_mb']}MB "
+                  + " ".join(f"{k}={v:.1f}" for k, v in outcome["stage_mean_ms"].items()))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="In-process CineLibre API benchmark")
+    parser.add_argument("--endpoints", nargs="+", help="Scenarios to run (default: all)")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--movies", type=int, default=5000)
+    parser.add_argument("--books", type=int, default=2000)
+    parser.add_argument("--db-latency-ms", type=float, default=3.0, help="Simulated PostgREST round trip")
+    parser.add_argument("--tmdb-latency-ms", type=float, default=80.0)
+    parser.add_argument("--embed-ms", type=float, default=10.0, help="Stub embedder cost per text")
+    parser.add_argument("--embed-call-ms", type=float, default=0.0, help="Stub embedder cost per embed() call")
+    parser.add_argument("--real-model", action="store_true", help="Use the real FastEmbed model instead of the stub")
+    parser.add_argument("--sidecar", action="store_true",
+                        help="Serve the embedder from an in-process embedding sidecar over a Unix socket")
+    parser.add_argument("--precomputed-recs", action="store_true",
+                        help="Run api/precompute_recs.py against the fake database first")
+    parser.add_argument("--soak", type=float, metavar="SECONDS", help="Soak test instead of per-endpoint runs")
+    parser.add_argument("--warmup", type=float, help="Seconds excluded from the soak slope (default: 20%% of --soak)")
+    parser.add_argument("--max-rss-slope", type=float, default=1.0, help="Soak fails above this RSS growth in MB/minute")
+    parser.add_argument("--overload", action="store_true",
+                        help="Search burst alongside cheap requests, with admission control off and on")
+    parser.add_argument("--limit-concurrency", type=int, default=10, help="uvicorn limit_concurrency for --overload")
+    parser.add_argument("--backoff-ms", type=float, default=100.0,
+                        help="--overload: pause after a 429 / 503 before a search client retries")
+    parser.add_argument("--output", help="Result file (default: bench_results/api-<commit>.json)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    os.environ.setdefault("TMDB_API_KEY", "bench")
+    # Quotas would turn the per-endpoint runs' single client away; --overload switches it per phase
+    os.environ.setdefault("ADMISSION_CONTROL", "0")
+
+    tmdb = FakeTMDBServer(latency_ms=args.tmdb_latency_ms).start()
+    db = FakeSupabase(movies=args.movies, books=args.books, latency_ms=args.db_latency_ms)
+
+    if args.precomputed_recs:
+        from api.precompute_recs import precompute
+        recs = precompute(db)
+        print(f"precomputed recommendations for {recs['written']} users in {recs['seconds']}s")
+
+    from api import main as api_main
+    from api.metrics import TimedClient
+    timed_db = TimedClient(db)
+    api_main.get_db = lambda: timed_db
+    api_main.TMDB_BASE_URL = tmdb.base_url
+    if args.real_model:
+        embedder = api_main.load_local_model()
+    else:
+        embedder = FakeEmbedder(cost_ms=args.embed_ms, call_ms=args.embed_call_ms, serial=args.overload)
+    sidecar = None
+    if args.sidecar:
+        from api.embed_sidecar import EmbedServer, SidecarEmbedder
+        path = os.path.join(tempfile.mkdtemp(), "embed.sock")
+        sidecar = EmbedServer(embedder)
+        threading.Thread(target=asyncio.run, args=(sidecar.serve(path),), daemon=True).start()
+        api_main._model = SidecarEmbedder(fallback=lambda: embedder, path=path)
+        if not api_main._model.wait_ready(10):
+            sys.exit("Embedding sidecar did not start")
+    else:
+        api_main._model = embedder
+
+    unknown = set(args.endpoints or []) - set(build_scenarios(db, ""))
+    if unknown:
+        sys.exit(f"Unknown endpoints: {', '.join(sorted(unknown))}")
+
+    results = asyncio.run(run(args, api_main.app, db))
+    tmdb.stop()
+
+    path = write_results("api-soak" if args.soak else "api-overload" if args.overload else "api", {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "tmdb_requests": tmdb.requests,
+        **({"sidecar": sidecar.stats} if sidecar else {}),
+        **(results if args.soak or args.overload else {"endpoints": results}),
+    }, args.output)
+    if sidecar:
+        batches = sidecar.stats["batches"]
+        print(f"sidecar: {sidecar.stats['texts']} texts in {batches} batches "
+              f"({sidecar.stats['texts'] / batches if batches else 0:.1f} per batch)")
+    print(f"Results written to {path}")
+    if args.soak and not results["soak"]["passed"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
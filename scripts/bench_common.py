@@ -0,0 +1,105 @@
+"""
+Shared helpers for the CineLibre benchmark scripts
+Latency summaries and JSON result files that can be diffed between commits
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import threading
+import time
+from datetime import datetime, timezone
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bench_results")
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = min(len(sorted_values) - 1, max(0, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def summarize_latencies(latencies_s):
+    """Summarize a list of latencies (seconds) as milliseconds"""
+    values = sorted(latencies_s)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "mean_ms": round(sum(values) / len(values) * 1000, 3),
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3),
+    }
+
+class RssSampler:
+    """Background thread recording the process RSS"""
+
+    def __init__(self, interval=0.05):
+        import psutil
+
+        self.interval = interval
+        self.process = psutil.Process()
+        self.samples = []
+        self.times = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._record()
+            self._stop.wait(self.interval)
+
+    def _record(self):
+        self.times.append(time.monotonic())
+        self.samples.append(self.process.memory_info().rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._record()
+
+    def summary(self):
+        mb = [s / 1024 / 1024 for s in self.samples]
+        return {"rss_start_mb": round(mb[0], 1), "rss_end_mb": round(mb[-1], 1), "rss_peak_mb": round(max(mb), 1)}
+
+def git_commit():
+    """Short hash of the checked-out commit, or None outside a git tree"""
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5,
+            cwd=os.path.dirname(RESULTS_DIR)
+        )
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def write_results(name, payload, output=None):
+    """Write benchmark results as JSON and return the path
+
+    Defaults to bench_results/<name>-<commit>.json so runs on different
+    commits sit side by side and can be compared.
+    """
+    commit = git_commit()
+    document = {
+        "benchmark": name,
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": payload,
+    }
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, f"{name}-{commit or int(time.time())}.json")
+    with open(output, "w") as f:
+        json.dump(document, f, indent=2, default=str)
+    return output
@@ -0,0 +1,726 @@
+"""
+Local stand-ins for the services the API talks to, used by the benchmarks
+- FakeSupabase: in-memory replacement for the client returned by get_db()
+- FakeEmbedder: deterministic embeddings with a configurable per-text cost
+- FakeTMDBServer / FakeGoogleBooksServer: HTTP servers answering the external
+  API calls made by the API and the sync engine, with injectable 429s and slow pages
+"""
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+DIM = 384
+LANGUAGES = ["en", "te", "hi", "ta", "kn", "ml"]
+GENRES = ["Action", "Drama", "Comedy", "Thriller", "Romance", "Crime", "Family", "Horror"]
+CATEGORIES = ["Fiction", "History", "Science", "Biography", "Poetry", "Travel"]
+WORDS = [
+    "love", "war", "city", "night", "river", "king", "shadow", "storm", "journey", "secret",
+    "village", "dream", "fire", "silent", "broken", "golden", "return", "last", "hidden", "road",
+]
+
+# Columns returned by the match_* / search_*_lexical RPCs
+MOVIE_RPC_COLUMNS = ["id", "tmdb_id", "title", "overview", "release_date", "poster_url", "language", "director", "genres"]
+BOOK_RPC_COLUMNS = ["id", "google_id", "title", "authors", "description", "thumbnail_url", "published_date", "categories", "language"]
+
+def now_iso():
+    return datetime.now(timezone.utc).isoformat()
+
+def vector_to_text(vec):
+    """pgvector columns come back from PostgREST as text"""
+    return "[" + ",".join(f"{x:.6f}" for x in vec) + "]"
+
+def ilike_contains(pattern, text):
+    """text ILIKE '%' || pattern || '%', with backslash escapes as in Postgres"""
+    regex, chars = [], iter(pattern)
+    for c in chars:
+        if c == "\\":
+            regex.append(re.escape(next(chars, "\\")))
+        else:
+            regex.append(".*" if c == "%" else "." if c == "_" else re.escape(c))
+    return re.search("".join(regex), text, re.IGNORECASE | re.DOTALL) is not None
+
+def parse_vector(value):
+    if isinstance(value, str):
+        return np.array(json.loads(value), dtype=np.float32)
+    return np.asarray(value, dtype=np.float32)
+
+def cluster_centers(count=32, seed=7):
+    """Topic centres shared by the synthetic catalog and FakeEmbedder"""
+    vecs = np.random.default_rng(seed).normal(size=(count, DIM)).astype(np.float32)
+    return vecs / np.linalg.norm(vecs, axis=1, keepdims=True)
+
+def near(center, rng, spread=0.04):
+    """Unit vector around a centre; spread 0.04 gives ~0.6 cosine between two neighbours"""
+    vec = center + rng.normal(scale=spread, size=DIM).astype(np.float32)
+    return vec / np.linalg.norm(vec)
+
+def fake_title(rng):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 3)))
+
+# ==================== EMBEDDER ====================
+
+class FakeEmbedder:
+    """Drop-in for fastembed.TextEmbedding: same text -> same unit vector
+
+    Texts land near one of the catalog's topic centres, so searches return
+    matches above the API's default similarity threshold.
+    """
+
+    def __init__(self, cost_ms=10.0, seed=7, call_ms=0.0, serial=False):
+        self.cost_s = cost_ms / 1000
+        # Fixed cost per embed() call (session run overhead), which batching amortizes
+        self.call_s = call_ms / 1000
+        self.centers = cluster_centers(seed=seed)
+        # serial: one core, so concurrent embed() calls take turns like CPU-bound inference
+        self._cpu = threading.Lock() if serial else None
+
+    def _spend(self, seconds):
+        if not seconds:
+            return
+        if self._cpu is None:
+            time.sleep(seconds)
+        else:
+            with self._cpu:
+                time.sleep(seconds)
+
+    def embed(self, documents, batch_size=256, **kwargs):
+        self._spend(self.call_s)
+        for text in documents:
+            self._spend(self.cost_s)
+            seed = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "little")
+            rng = np.random.default_rng(seed)
+            yield near(self.centers[seed % len(self.centers)], rng)
+
+# ==================== SUPABASE ====================
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+
+class FakeQuery:
+    """The subset of the postgrest query builder used by the API and sync engine"""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.action = "select"
+        self.columns = None
+        self.filters = []
+        self.order_by = []
+        self.limit_n = None
+        self.offset = 0
+        self.payload = None
+        self.on_conflict = None
+
+    # --- query shape ---
+    def select(self, columns="*", **kwargs):
+        if self.action == "select":
+            self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def _filter(self, column, predicate):
+        self.filters.append(lambda row: predicate(row.get(column)))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, lambda v: v is not None and str(v) == str(value))
+
+    def neq(self, column, value):
+        return self._filter(column, lambda v: str(v) != str(value))
+
+    def gt(self, column, value):
+        return self._filter(column, lambda v: v is not None and v > value)
+
+    def gte(self, column, value):
+        return self._filter(column, lambda v: v is not None and v >= value)
+
+    def lt(self, column, value):
+        return self._filter(column, lambda v: v is not None and v < value)
+
+    def lte(self, column, value):
+        return self._filter(column, lambda v: v is not None and v <= value)
+
+    def in_(self, column, values):
+        allowed = {str(v) for v in values}
+        return self._filter(column, lambda v: str(v) in allowed)
+
+    def is_(self, column, value):
+        return self._filter(column, lambda v: v is None if value in (None, "null") else v == value)
+
+    def order(self, column, desc=False, **kwargs):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, count, **kwargs):
+        self.limit_n = count
+        return self
+
+    def range(self, start, end, **kwargs):
+        self.offset = start
+        self.limit_n = end - start + 1
+        return self
+
+    # --- writes ---
+    def insert(self, payload, **kwargs):
+        self.action, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict=None, **kwargs):
+        self.action, self.payload, self.on_conflict = "upsert", payload, on_conflict
+        return self
+
+    def update(self, payload, **kwargs):
+        self.action, self.payload = "update", payload
+        return self
+
+    def delete(self, **kwargs):
+        self.action = "delete"
+        return self
+
+    def execute(self):
+        self.client.simulate_round_trip()
+        with self.client.lock:
+            return FakeResponse(getattr(self, f"_run_{self.action}")())
+
+    # --- execution ---
+    def _matching(self):
+        return [r for r in self.client.tables.setdefault(self.table, []) if all(f(r) for f in self.filters)]
+
+    def _project(self, row):
+        if self.columns is None:
+            return dict(row)
+        return {c: row.get(c) for c in self.columns}
+
+    def _run_select(self):
+        rows = self._matching()
+        for column, desc in reversed(self.order_by):
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column) or 0), reverse=desc)
+        end = None if self.limit_n is None else self.offset + self.limit_n
+        return [self._project(r) for r in rows[self.offset:end]]
+
+    def _run_insert(self):
+        payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+        return [self.client.insert_row(self.table, p) for p in payloads]
+
+    def _run_upsert(self):
+        payloads = self.payload if isinstance(self.payload, list) else [self.payload]
+        keys = [k.strip() for k in (self.on_conflict or "id").split(",")]
+        saved = []
+        for payload in payloads:
+            existing = next((
+                r for r in self.client.tables.setdefault(self.table, [])
+                if all(str(r.get(k)) == str(payload.get(k)) for k in keys)
+            ), None)
+            if existing is None:
+                saved.append(self.client.insert_row(self.table, payload))
+            else:
+                existing.update(payload)
+                self.client.mark_dirty(self.table)
+                saved.append(dict(existing))
+        return saved
+
+    def _run_update(self):
+        rows = self._matching()
+        for row in rows:
+            row.update(self.payload)
+        self.client.mark_dirty(self.table)
+        return [dict(r) for r in rows]
+
+    def _run_delete(self):
+        rows = self._matching()
+        table = self.client.tables.setdefault(self.table, [])
+        self.client.tables[self.table] = [r for r in table if r not in rows]
+        self.client.mark_dirty(self.table)
+        return [dict(r) for r in rows]
+
+class FakeRpc:
+    def __init__(self, client, name, params):
+        self.client, self.name, self.params = client, name, params
+
+    def execute(self):
+        self.client.simulate_round_trip()
+        handler = getattr(self.client, f"rpc_{self.name}", None)
+        if handler is None:
+            raise Exception(f"Could not find the function public.{self.name} in the schema cache")
+        with self.client.lock:
+            return FakeResponse(handler(**self.params))
+
+class FakeSupabase:
+    """In-memory stand-in for the supabase Client with a synthetic catalog
+
+    Every execute() sleeps for `latency_ms` to model the PostgREST round trip.
+    Vector RPCs do exact numpy search over the catalog.
+    """
+
+    def __init__(self, movies=5000, books=2000, users=50, ratings=2000, interactions=5000, latency_ms=3.0, seed=7):
+        self.latency_s = latency_ms / 1000
+        self.lock = threading.RLock()
+        self.tables = {"movies": [], "books": [], "users": [], "ratings": [], "interactions": [], "embedding_models": []}
+        self._matrix_cache = {}
+        self._populate(movies, books, users, ratings, interactions, seed)
+
+    def simulate_round_trip(self):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+
+    # --- client API ---
+    def table(self, name):
+        return FakeQuery(self, name)
+
+    def rpc(self, name, params=None):
+        return FakeRpc(self, name, params or {})
+
+    # --- storage helpers ---
+    def insert_row(self, table, payload):
+        row = {"id": str(uuid.uuid4()), "created_at": now_iso(), **payload}
+        if table in ("users", "ratings", "interactions") and "id" not in payload:
+            row["id"] = len(self.tables.setdefault(table, [])) + 1
+        if isinstance(row.get("embedding"), list):
+            row["embedding"] = vector_to_text(row["embedding"])
+        self.tables.setdefault(table, []).append(row)
+        if table in self._matrix_cache and row.get("embedding"):
+            # Append instead of re-parsing every stored vector
+            rows, matrix = self._matrix_cache[table]
+            self._matrix_cache[table] = (rows + [row], np.vstack([matrix, parse_vector(row["embedding"])]))
+        return dict(row)
+
+    def mark_dirty(self, table):
+        self._matrix_cache.pop(table, None)
+
+    def _matrix(self, table):
+        """Embedding matrix for a table, rebuilt after writes"""
+        if table not in self._matrix_cache:
+            rows = [r for r in self.tables[table] if r.get("embedding")]
+            matrix = np.stack([parse_vector(r["embedding"]) for r in rows]) if rows else np.zeros((0, DIM), np.float32)
+            self._matrix_cache[table] = (rows, matrix)
+        return self._matrix_cache[table]
+
+    def _populate(self, movies, books, users, ratings, interactions, seed):
+        rng = random.Random(seed)
+        np_rng = np.random.default_rng(seed)
+
+        centers = cluster_centers(seed=seed)
+
+        def unit_vectors(n):
+            return [near(centers[i % len(centers)], np_rng) for i in range(n)]
+
+        for i, vec in enumerate(unit_vectors(movies)):
+            self.tables["movies"].append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "tmdb_id": 100000 + i,
+                "title": fake_title(rng),
+                "overview": " ".join(rng.choice(WORDS) for _ in range(30)),
+                "release_date": f"{rng.randint(1990, 2026)}-{rng.randint(1, 12):02d}-01",
+                "poster_url": f"https://image.tmdb.org/t/p/w500/{i}.jpg",
+                "language": rng.choice(LANGUAGES),
+                "director": fake_title(rng),
+                "genres": rng.sample(GENRES, rng.randint(1, 3)),
+                "embedding": vector_to_text(vec),
+                "created_at": now_iso(),
+            })
+        for i, vec in enumerate(unit_vectors(books)):
+            self.tables["books"].append({
+                "id": str(uuid.UUID(int=rng.getrandbits(128))),
+                "google_id": f"g{i}",
+                "title": fake_title(rng),
+                "authors": fake_title(rng),
+                "description": " ".join(rng.choice(WORDS) for _ in range(40)),
+                "thumbnail_url": f"https://books.google.com/{i}.jpg",
+                "published_date": str(rng.randint(1950, 2026)),
+                "categories": rng.choice(CATEGORIES),
+                "language": "en",
+                "embedding": vector_to_text(vec),
+                "created_at": now_iso(),
+            })
+        for i in range(1, users + 1):
+            self.tables["users"].append({
+                "id": i, "email": f"user{i}@example.com", "name": f"User {i}",
+                "password_hash": "x", "created_at": now_iso(),
+            })
+        catalog = [("movie", m["id"]) for m in self.tables["movies"]] + [("book", b["id"]) for b in self.tables["books"]]
+        seen = set()
+        for i in range(ratings):
+            user_id = rng.randint(1, users)
+            item_type, item_id = rng.choice(catalog[:500])
+            if (user_id, item_id) in seen:
+                continue
+            seen.add((user_id, item_id))
+            self.tables["ratings"].append({
+                "id": i + 1, "user_id": user_id, "item_id": item_id, "item_type": item_type,
+                "rating": rng.choice([2.5, 3.0, 3.5, 4.0, 4.5, 5.0]), "created_at": now_iso(),
+            })
+        start = datetime.now(timezone.utc) - timedelta(days=7)
+        for i in range(interactions):
+            item_type, item_id = rng.choice(catalog[:1000])
+            self.tables["interactions"].append({
+                "id": i + 1, "user_id": rng.randint(1, users), "item_id": item_id, "item_type": item_type,
+                "interaction_type": rng.choice(["view", "view", "click", "search"]),
+                "created_at": (start + timedelta(seconds=rng.randint(0, 7 * 86400))).isoformat(),
+            })
+
+    # ==================== RPC FUNCTIONS ====================
+
+    def _vector_match(self, table, columns, query_embedding, match_threshold, match_count, predicate=None):
+        rows, matrix = self._matrix(table)
+        if not rows:
+            return []
+        scores = matrix @ parse_vector(query_embedding)
+        if predicate is not None:
+            mask = np.array([predicate(r) for r in rows])
+            scores = np.where(mask, scores, -np.inf)
+        top = np.argsort(-scores)[:match_count]
+        return [
+            {**{c: rows[i].get(c) for c in columns}, "similarity": float(scores[i])}
+            for i in top if scores[i] > match_threshold
+        ]
+
+    def rpc_match_movies(self, query_embedding, match_threshold, match_count, ef_search=40):
+        return self._vector_match("movies", MOVIE_RPC_COLUMNS, query_embedding, match_threshold, match_count)
+
+    def rpc_match_books(self, query_embedding, match_threshold, match_count, ef_search=40):
+        return self._vector_match("books", BOOK_RPC_COLUMNS, query_embedding, match_threshold, match_count)
+
+    # Compact search rescores exactly, so the fake returns the exact ranking
+    def rpc_match_movies_compact(self, query_embedding, match_threshold, match_count, quantization="half",
+                                 rescore_factor=4, ef_search=40):
+        return self._vector_match("movies", MOVIE_RPC_COLUMNS, query_embedding, match_threshold, match_count)
+
+    def rpc_match_books_compact(self, query_embedding, match_threshold, match_count, quantization="half",
+                                rescore_factor=4, ef_search=40):
+        return self._vector_match("books", BOOK_RPC_COLUMNS, query_embedding, match_threshold, match_count)
+
+    def rpc_match_movies_filtered(self, query_embedding, match_threshold, match_count, filter_language=None,
+                                  filter_genres=None, min_year=None, max_year=None, ef_search=40):
+        def predicate(r):
+            year = int((r.get("release_date") or "0")[:4])
+            return ((not filter_language or r.get("language") == filter_language)
+                    and (not filter_genres or set(filter_genres) & set(r.get("genres") or []))
+                    and (not min_year or year >= min_year)
+                    and (not max_year or year <= max_year))
+        return self._vector_match("movies", MOVIE_RPC_COLUMNS, query_embedding, match_threshold, match_count, predicate)
+
+    def rpc_match_books_filtered(self, query_embedding, match_threshold, match_count, filter_language=None,
+                                 filter_category=None, filter_author=None, min_year=None, max_year=None, ef_search=40):
+        def predicate(r):
+            year = int((r.get("published_date") or "0")[:4])
+            return ((not filter_language or r.get("language") == filter_language)
+                    and (not filter_category or r.get("categories") == filter_category)
+                    and (not filter_author or ilike_contains(filter_author, r.get("authors") or ""))
+                    and (not min_year or year >= min_year)
+                    and (not max_year or year <= max_year))
+        return self._vector_match("books", BOOK_RPC_COLUMNS, query_embedding, match_threshold, match_count, predicate)
+
+    def _lexical(self, table, columns, fields, query_text, match_count):
+        needle = query_text.lower()
+        hits = []
+        for r in self.tables[table]:
+            haystacks = [(r.get(f) or "").lower() for f in fields]
+            if any(needle in h for h in haystacks):
+                exact = haystacks[0] == needle
+                hits.append({**{c: r.get(c) for c in columns}, "similarity": 1.0 if exact else 0.5, "exact_match": exact})
+        hits.sort(key=lambda h: (h["exact_match"], h["similarity"]), reverse=True)
+        return hits[:match_count]
+
+    def rpc_search_movies_lexical(self, query_text, match_count):
+        return self._lexical("movies", MOVIE_RPC_COLUMNS, ["title"], query_text, match_count)
+
+    def rpc_search_books_lexical(self, query_text, match_count):
+        return self._lexical("books", BOOK_RPC_COLUMNS, ["title", "authors"], query_text, match_count)
+
+    def _titles(self):
+        titles = {}
+        for m in self.tables["movies"]:
+            titles[("movie", m["id"])] = (m["title"], m.get("poster_url"))
+        for b in self.tables["books"]:
+            titles[("book", b["id"])] = (b["title"], b.get("thumbnail_url"))
+        return titles
+
+    def rpc_get_popular_items(self, item_limit=20):
+        stats = {}
+        for r in self.tables["ratings"]:
+            count, total = stats.get((r["item_type"], r["item_id"]), (0, 0.0))
+            stats[(r["item_type"], r["item_id"])] = (count + 1, total + r["rating"])
+        titles = self._titles()
+        ranked = sorted(stats.items(), key=lambda kv: (kv[1][1] + 15.0) / (kv[1][0] + 5), reverse=True)
+        return [{
+            "item_id": key[1], "item_type": key[0], "title": titles[key][0],
+            "avg_rating": total / count, "rating_count": count, "poster_url": titles[key][1],
+            "score": (total + 15.0) / (count + 5),
+        } for key, (count, total) in ranked[:item_limit] if key in titles]
+
+    def rpc_get_trending_items(self, trend_window="day", item_limit=20, filter_item_type=None):
+        tau = {"hour": 3600, "week": 604800}.get(trend_window, 86400)
+        now = datetime.now(timezone.utc)
+        weights = {"click": 3.0, "search": 2.0, "view": 1.0}
+        scores = {}
+        for r in self.tables["interactions"]:
+            if filter_item_type and r["item_type"] != filter_item_type:
+                continue
+            age = (now - datetime.fromisoformat(r["created_at"])).total_seconds()
+            if age > tau:
+                continue
+            key = (r["item_type"], r["item_id"])
+            scores[key] = scores.get(key, 0.0) + weights[r["interaction_type"]] * math.exp(-age / tau)
+        titles = self._titles()
+        ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)[:item_limit]
+        return [{
+            "item_id": key[1], "item_type": key[0], "title": titles[key][0], "poster_url": titles[key][1],
+            "trending_score": score, "last_interaction_at": now_iso(),
+        } for key, score in ranked if key in titles]
+
+    def rpc_get_suggest_titles(self, filter_item_type, after_id=None, page_size=1000):
+        table, poster, date = ("movies", "poster_url", "release_date") if filter_item_type == "movie" else \
+            ("books", "thumbnail_url", "published_date")
+        counts = {}
+        for r in self.tables["ratings"]:
+            if r["item_type"] == filter_item_type:
+                counts[r["item_id"]] = counts.get(r["item_id"], 0) + 1
+        rows = sorted((r for r in self.tables[table] if after_id is None or str(r["id"]) > str(after_id)),
+                      key=lambda r: str(r["id"]))[:page_size]
+        return [{
+            "item_id": r["id"], "title": r["title"], "year": int(r[date][:4]) if r.get(date) else None,
+            "poster_url": r.get(poster), "popularity": float(counts.get(r["id"], 0)),
+        } for r in rows]
+
+    def rpc_get_collaborative_recommendations(self, target_user_id, recommendation_count=20):
+        # Sparse synthetic ratings rarely correlate, so exercise the content-based fallback like most real users
+        return []
+
+    def rpc_get_active_user_ids(self, since):
+        active = {r["user_id"] for r in self.tables["ratings"] if (r.get("updated_at") or r["created_at"]) >= since}
+        active |= {r["user_id"] for r in self.tables["interactions"] if r["created_at"] >= since}
+        return sorted(active)
+
+    def rpc_write_user_recommendations(self, items, snapshot_at):
+        rows = self.tables.setdefault("user_recommendations", [])
+        for item in items:
+            rows[:] = [r for r in rows if r["user_id"] != item["user_id"]]
+            rows.append({**item, "computed_at": snapshot_at, "invalidated_at": None, "stale": False})
+        return len(items)
+
+    def rpc_rollup_user_item_signals(self, batch_size=50000):
+        # get_user_signals reads interactions directly, so this only advances the watermark
+        watermark = getattr(self, "_signals_watermark", 0)
+        pending = [r["id"] for r in self.tables["interactions"] if r["id"] > watermark][:batch_size]
+        if pending:
+            self._signals_watermark = pending[-1]
+        return len(pending)
+
+    def rpc_get_user_signals(self, user_ids, per_user=5):
+        now = datetime.now(timezone.utc)
+        weights = {"click": 3.0, "search": 2.0, "view": 1.0}
+        wanted = set(user_ids)
+        signals = {}
+        for r in self.tables["interactions"]:
+            if r["user_id"] not in wanted:
+                continue
+            age = (now - datetime.fromisoformat(r["created_at"])).total_seconds()
+            key = (r["user_id"], r["item_type"], r["item_id"])
+            score, count = signals.get(key, (0.0, 0))
+            signals[key] = (score + weights[r["interaction_type"]] * math.exp(-age / 2592000), count + 1)
+        by_user = {}
+        for (user_id, item_type, item_id), (score, count) in signals.items():
+            by_user.setdefault(user_id, []).append({
+                "user_id": user_id, "item_id": item_id, "item_type": item_type,
+                "score": score, "interaction_count": count, "last_interaction_at": now_iso(),
+            })
+        return [row for user_id in sorted(by_user)
+                for row in sorted(by_user[user_id], key=lambda r: -r["score"])[:per_user]]
+
+# ==================== HTTP SERVERS ====================
+
+class FakeHTTPServer:
+    """Threaded JSON HTTP server with injectable latency and failures
+
+    - latency_ms: added to every request
+    - rate_limit_every: every n-th request answers 429 (0 disables)
+    - slow_every / slow_ms: every n-th request waits an extra slow_ms
+
+    200 responses carry an ETag and If-None-Match is answered with 304.
+    Subclasses implement route(). Start with .start(); base_url points at it.
+    """
+
+    def __init__(self, latency_ms=80.0, rate_limit_every=0, slow_every=0, slow_ms=1000.0, host="127.0.0.1", port=0):
+        self.latency_s = latency_ms / 1000
+        self.rate_limit_every = rate_limit_every
+        self.slow_every = slow_every
+        self.slow_s = slow_ms / 1000
+        self.requests = 0
+        self.rate_limited = 0
+        self.not_modified = 0
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                    n = server.requests
+                delay = server.latency_s
+                if server.slow_every and n % server.slow_every == 0:
+                    delay += server.slow_s
+                if delay:
+                    time.sleep(delay)
+                if server.rate_limit_every and n % server.rate_limit_every == 0:
+                    with server._lock:
+                        server.rate_limited += 1
+                    status, body = 429, {"status_message": "Your request count is over the allowed limit."}
+                else:
+                    parsed = urlparse(self.path)
+                    status, body = server.route(parsed.path, {k: v[0] for k, v in parse_qs(parsed.query).items()})
+                payload = json.dumps(body).encode()
+                etag = '"%s"' % hashlib.blake2b(payload, digest_size=8).hexdigest()
+                if status == 200 and self.headers.get("If-None-Match") == etag:
+                    with server._lock:
+                        server.not_modified += 1
+                    status, payload = 304, b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                if status in (200, 304):
+                    self.send_header("ETag", etag)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        return {"requests": self.requests, "rate_limited": self.rate_limited, "not_modified": self.not_modified}
+
+    def route(self, path, params):
+        """Return (status, json body) for a request path"""
+        raise NotImplementedError
+
+class FakeTMDBServer(FakeHTTPServer):
+    """Synthetic TMDB: /search/movie, /discover/movie and /movie/{id}
+
+    Discover slices (language + date range) each hold `discover_pages` pages.
+    Every sort order returns the same slice in a different order, so crawls
+    across strategies see the duplicates the real API produces.
+    """
+
+    def __init__(self, discover_pages=5, **kwargs):
+        super().__init__(**kwargs)
+        self.discover_pages = discover_pages
+
+    def route(self, path, params):
+        if path.endswith("/search/movie"):
+            rng = random.Random(params.get("query", ""))
+            return 200, {"page": 1, "results": [self.movie_summary(rng.randint(900000, 999999)) for _ in range(5)]}
+        if path.endswith("/discover/movie"):
+            return 200, self.discover(params)
+        if "/movie/" in path:
+            return 200, self.movie_details(int(path.rsplit("/", 1)[-1]))
+        return 404, {"status_message": "The resource you requested could not be found."}
+
+    def discover(self, params):
+        page = int(params.get("page", 1))
+        lang = params.get("with_original_language", "en")
+        year_from = int(params.get("primary_release_date.gte", "2000")[:4])
+        slice_key = f"{lang}:{year_from}"
+        base = 1_000_000 + int.from_bytes(hashlib.blake2b(slice_key.encode(), digest_size=3).digest(), "little") * 1000
+        ids = [base + i for i in range(self.discover_pages * 20)]
+        random.Random(f"{slice_key}:{params.get('sort_by')}").shuffle(ids)
+        results = [] if page > self.discover_pages else [
+            {**self.movie_summary(tmdb_id), "original_language": lang} for tmdb_id in ids[(page - 1) * 20:page * 20]
+        ]
+        return {"page": page, "results": results, "total_pages": self.discover_pages, "total_results": len(ids)}
+
+    @staticmethod
+    def movie_summary(tmdb_id):
+        rng = random.Random(tmdb_id)
+        return {
+            "id": tmdb_id,
+            "title": fake_title(rng),
+            "overview": " ".join(rng.choice(WORDS) for _ in range(30)),
+            "release_date": f"{rng.randint(1990, 2026)}-01-01",
+            "poster_path": f"/{tmdb_id}.jpg",
+            "original_language": rng.choice(LANGUAGES),
+            "popularity": rng.random() * 100,
+        }
+
+    @staticmethod
+    def movie_details(tmdb_id):
+        rng = random.Random(tmdb_id)
+        return {
+            **FakeTMDBServer.movie_summary(tmdb_id),
+            "genres": [{"id": i, "name": g} for i, g in enumerate(rng.sample(GENRES, 2))],
+            "runtime": rng.randint(90, 180),
+            "budget": rng.randint(0, 10**8),
+            "revenue": rng.randint(0, 10**9),
+            "vote_average": round(rng.random() * 10, 1),
+            "vote_count": rng.randint(0, 5000),
+            "credits": {
+                "cast": [{"name": fake_title(rng), "character": fake_title(rng), "profile_path": None} for _ in range(15)],
+                "crew": [
+                    {"name": fake_title(rng), "job": job, "department": dept}
+                    for job, dept in [("Director", "Directing"), ("Screenplay", "Writing"), ("Producer", "Production")]
+                ],
+            },
+        }
+
+class FakeGoogleBooksServer(FakeHTTPServer):
+    """Synthetic Google Books: /volumes with startIndex/maxResults paging
+
+    Each `q` holds `volumes_per_query` volumes; the two orderBy values share them.
+    """
+
+    def __init__(self, volumes_per_query=200, **kwargs):
+        super().__init__(**kwargs)
+        self.volumes_per_query = volumes_per_query
+
+    def route(self, path, params):
+        if not path.endswith("/volumes"):
+            return 404, {"error": {"code": 404, "message": "Not Found"}}
+        query = params.get("q", "")
+        start = int(params.get("startIndex", 0))
+        count = int(params.get("maxResults", 10))
+        ids = [f"{query.split(':')[-1][:8]}-{i}" for i in range(self.volumes_per_query)]
+        random.Random(f"{query}:{params.get('orderBy')}").shuffle(ids)
+        body = {"kind": "books#volumes", "totalItems": len(ids)}
+        items = [self.volume(v) for v in ids[start:start + count]]
+        if items:
+            # Like the real API, pages past the end have no "items" key at all
+            body["items"] = items
+        return 200, body
+
+    @staticmethod
+    def volume(volume_id):
+        rng = random.Random(volume_id)
+        return {
+            "id": volume_id,
+            "volumeInfo": {
+                "title": fake_title(rng),
+                "authors": [fake_title(rng)],
+                "description": " ".join(rng.choice(WORDS) for _ in range(80)),
+                "publishedDate": f"{rng.randint(1950, 2026)}-01-01",
+                "categories": [rng.choice(CATEGORIES)],
+                "imageLinks": {"thumbnail": f"https://books.google.com/{volume_id}.jpg"},
+                "language": "en",
+            },
+        }
@@ -0,0 +1,103 @@
+"""
+Cold-start import budget for CineLibre
+Imports api.main and api.sync_engine in fresh interpreters under
+`python -X importtime` and fails when either exceeds its time budget or pulls
+in a module that should only load on first use (fastembed / onnxruntime /
+supabase). Keeps tools and tests that only need a helper from paying for the
+model and the database client.
+
+    python scripts/bench_import_time.py
+    python scripts/bench_import_time.py --repeat 10 --budget-api-ms 1500 --budget-sync-ms 400
+
+Exits 1 on a budget or forbidden-import failure. Results go to
+bench_results/import-time-<commit>.json.
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from bench_common import write_results
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# module -> packages it must not import at module level
+TARGETS = {
+    "api.main": ["fastembed", "onnxruntime", "supabase"],
+    "api.sync_engine": ["fastembed", "onnxruntime", "supabase"],
+}
+
+def import_profile(module):
+    """One fresh-interpreter import: {name: (self us, cumulative us, depth)}"""
+    env = {k: v for k, v in os.environ.items() if k != "PRELOAD_MODEL"}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        sys.exit(f"import {module} failed:\n{proc.stderr[-2000:]}")
+    profile = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        # Each nesting level indents the name by two spaces after the first
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        profile[name.strip()] = (int(self_us), int(cumulative_us), depth)
+    return profile
+
+def measure(module, repeat):
+    totals, profile = [], None
+    for _ in range(repeat):
+        profile = import_profile(module)
+        totals.append(profile[module][1] / 1000)
+    # Direct imports of the module, heaviest first, from the last run
+    children = sorted(
+        ((name, cum) for name, (_, cum, depth) in profile.items() if depth == 1),
+        key=lambda item: -item[1]
+    )
+    forbidden = sorted(
+        name for name in profile
+        if any(name == pkg or name.startswith(pkg + ".") for pkg in TARGETS[module])
+    )
+    return {
+        "median_ms": round(statistics.median(totals), 1),
+        "min_ms": round(min(totals), 1),
+        "max_ms": round(max(totals), 1),
+        "modules": len(profile),
+        "top_imports_ms": {name: round(cum / 1000, 1) for name, cum in children[:8]},
+        "forbidden_imports": forbidden,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="CineLibre import-time budget")
+    parser.add_argument("--repeat", type=int, default=5, help="Fresh interpreters per module (median is compared)")
+    parser.add_argument("--budget-api-ms", type=float, default=2000.0, help="Budget for import api.main")
+    parser.add_argument("--budget-sync-ms", type=float, default=800.0, help="Budget for import api.sync_engine")
+    parser.add_argument("--output", help="Result file (default: bench_results/import-time-<commit>.json)")
+    args = parser.parse_args()
+
+    budgets = {"api.main": args.budget_api_ms, "api.sync_engine": args.budget_sync_ms}
+    results, failures = {}, []
+    for module, budget in budgets.items():
+        result = measure(module, args.repeat)
+        result["budget_ms"] = budget
+        results[module] = result
+        top = ", ".join(f"{name} {ms:.0f}ms" for name, ms in list(result["top_imports_ms"].items())[:4])
+        print(f"{module:18s} median {result['median_ms']:7.1f}ms (budget {budget:.0f}ms), "
+              f"{result['modules']} modules; heaviest: {top}")
+        if result["median_ms"] > budget:
+            failures.append(f"{module} took {result['median_ms']}ms, budget {budget:.0f}ms")
+        if result["forbidden_imports"]:
+            failures.append(f"{module} imports {', '.join(result['forbidden_imports'][:5])} at module level")
+
+    results["passed"] = not failures
+    print(f"Results written to {write_results('import-time', results, args.output)}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+"""
+Micro-benchmark for the MMR diversity re-ranking stage (api/ranking.py)
+Re-ranks a synthetic candidate pool (default 500 candidates x 384 dims,
+drawn from sub-topics around one query) down to a page of results and
+reports:
+- latency per call of maximal_marginal_relevance, with and without the
+  language / genre cap, against a per-pair pure-Python MMR for reference
+- how much more diverse the page is than the plain top-k: mean pairwise
+  cosine similarity, distinct clusters, languages and genres, and the mean
+  relevance given up for it
+
+    pip install -r requirements-bench.txt
+    python scripts/bench_mmr.py
+    python scripts/bench_mmr.py --candidates 500 --limit 12 20 50 --lambda 0.5 0.7 0.9
+    python scripts/bench_mmr.py --input array
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_common import summarize_latencies, write_results
+from bench_fakes import DIM, GENRES, LANGUAGES
+from api.ranking import diversity_groups, maximal_marginal_relevance
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+def make_pool(candidates, dim, seed, topics=8):
+    """Best-first candidates for one query, drawn from sub-topics around it
+
+    Sub-topic 0 sits closest to the query and supplies a third of the pool,
+    so the plain top-k is mostly near-duplicates from it, like the
+    neighbours of a single seed title.
+    """
+    rng = random.Random(seed)
+    np_rng = np.random.default_rng(seed)
+    query = unit(np_rng.normal(size=dim))
+    offsets = unit(np_rng.normal(size=(topics, dim)))
+    # Sub-topic 0 at ~0.85 cosine to the query, the others at ~0.6
+    centers = unit(np.vstack([query + 0.6 * offsets[0], query[None, :] + 1.3 * offsets[1:]]))
+    topic_of = [0 if i % 3 == 0 else rng.randrange(1, topics) for i in range(candidates)]
+    vectors = unit(centers[topic_of] + np_rng.normal(scale=0.6 / np.sqrt(dim), size=(candidates, dim))).astype(np.float32)
+    similarity = vectors @ query
+    order = np.argsort(-similarity)
+    items = [{
+        "id": int(i),
+        "similarity": float(similarity[i]),
+        "topic": topic_of[i],
+        # The closest sub-topic is mostly one language and genre, like a Telugu action seed
+        "language": "te" if topic_of[i] == 0 and rng.random() < 0.8 else rng.choice(LANGUAGES),
+        "genres": ["Action"] if topic_of[i] == 0 else rng.sample(GENRES, 2),
+    } for i in order]
+    return items, vectors[order]
+
+def naive_mmr(items, vectors, limit, lambda_):
+    """Textbook MMR: one dot product per (candidate, pick) pair, recomputed every step"""
+    picked, remaining = [], list(range(len(items)))
+    top = max(item["similarity"] for item in items)
+    while remaining and len(picked) < limit:
+        best, best_score = None, -float("inf")
+        for i in remaining:
+            redundancy = max((float(np.dot(vectors[i], vectors[j])) for j in picked), default=0.0)
+            score = lambda_ * items[i]["similarity"] / top - (1 - lambda_) * max(redundancy, 0.0)
+            if score > best_score:
+                best, best_score = i, score
+        picked.append(best)
+        remaining.remove(best)
+    return picked
+
+def page_stats(page, vectors_by_id, top_relevance):
+    ids = [item["id"] for item in page]
+    vecs = vectors_by_id[ids]
+    gram = vecs @ vecs.T
+    k = len(ids)
+    return {
+        "mean_pairwise_similarity": round(float((gram.sum() - k) / (k * (k - 1))), 4) if k > 1 else None,
+        "distinct_topics": len({item["topic"] for item in page}),
+        "distinct_languages": len({item["language"] for item in page}),
+        "distinct_genres": len({g for item in page for g in item["genres"]}),
+        "mean_relevance": round(float(np.mean([item["similarity"] for item in page])) / top_relevance, 4),
+    }
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark MMR diversity re-ranking")
+    parser.add_argument("--candidates", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=DIM)
+    parser.add_argument("--limit", type=int, nargs="+", default=[12, 20, 50])
+    parser.add_argument("--lambda", dest="lambdas", type=float, nargs="+", default=[0.5, 0.7])
+    parser.add_argument("--input", choices=["list", "array"], default="list",
+                        help="Embeddings as parsed pgvector lists (API) or one array (precompute job)")
+    parser.add_argument("--max-share", type=float, default=0.5, help="Group cap as a share of the page")
+    parser.add_argument("--repeat", type=int, default=200, help="Timed calls per configuration")
+    parser.add_argument("--naive-repeat", type=int, default=3, help="Timed calls of the pure-Python reference")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Result file (default: bench_results/mmr-<commit>.json)")
+    args = parser.parse_args()
+
+    items, vectors = make_pool(args.candidates, args.dim, args.seed)
+    # Lists in the API (parsed pgvector text), one array in the precompute job
+    embeddings = vectors.tolist() if args.input == "list" else vectors
+    vectors_by_id = np.zeros_like(vectors)
+    vectors_by_id[[item["id"] for item in items]] = vectors
+    top_relevance = items[0]["similarity"]
+    groups = {item["id"]: diversity_groups(item) for item in items}
+    group_of = lambda item: groups[item["id"]]
+
+    results = []
+    for limit in args.limit:
+        cap = max(1, round(args.max_share * limit))
+        baseline = page_stats(items[:limit], vectors_by_id, top_relevance)
+        print(f"top-{limit:<3d} plain      sim={baseline['mean_pairwise_similarity']:.3f} "
+              f"topics={baseline['distinct_topics']} languages={baseline['distinct_languages']} "
+              f"genres={baseline['distinct_genres']}")
+        for lambda_ in args.lambdas:
+            entry = {"limit": limit, "lambda": lambda_, "group_cap": cap, "plain_top_k": baseline}
+            for name, kwargs in (("mmr", {}), ("mmr_capped", {"groups": group_of, "max_per_group": cap})):
+                run = lambda: maximal_marginal_relevance(items, embeddings, limit, lambda_=lambda_, **kwargs)
+                entry[name] = {"latency": timed(run, args.repeat), **page_stats(run(), vectors_by_id, top_relevance)}
+                stats = entry[name]
+                print(f"top-{limit:<3d} {name:10s} lambda={lambda_:.2f} p50={stats['latency']['p50_ms']:7.3f}ms "
+                      f"p95={stats['latency']['p95_ms']:7.3f}ms sim={stats['mean_pairwise_similarity']:.3f} "
+                      f"topics={stats['distinct_topics']} languages={stats['distinct_languages']} "
+                      f"genres={stats['distinct_genres']} relevance={stats['mean_relevance']:.3f}")
+            if args.naive_repeat:
+                entry["naive_python"] = {"latency": timed(lambda: naive_mmr(items, vectors, limit, lambda_), args.naive_repeat)}
+                speedup = entry["naive_python"]["latency"]["p50_ms"] / entry["mmr"]["latency"]["p50_ms"]
+                entry["speedup_vs_naive"] = round(speedup, 1)
+                print(f"top-{limit:<3d} naive      lambda={lambda_:.2f} p50={entry['naive_python']['latency']['p50_ms']:7.1f}ms "
+                      f"({speedup:.0f}x slower)")
+            results.append(entry)
+
+    path = write_results("mmr", {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "runs": results,
+    }, args.output)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
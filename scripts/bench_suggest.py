@@ -0,0 +1,101 @@
+"""
+Micro-benchmark for the /search/suggest prefix index (api/suggest.py)
+Builds the index over synthetic movie and book titles (default 50k each)
+and reports:
+- build time and index size
+- lookup latency by prefix length, against a linear scan of the
+  normalized titles for reference
+- whether every lookup matches the linear scan's results
+
+    python scripts/bench_suggest.py
+    python scripts/bench_suggest.py --titles 5000 --limit 8 --repeat 5000
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_common import summarize_latencies, write_results
+from api.suggest import ITEM_TYPES, SuggestIndex, normalize, suggest
+
+def make_titles(count, seed, vocabulary=3000):
+    """Titles of 1-4 words from a fixed vocabulary, with skewed popularity"""
+    rng = random.Random(seed)
+    letters = "abcdefghijklmnoprstuvy"
+    words = ["".join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(vocabulary)]
+    rows = {}
+    for item_type in ITEM_TYPES:
+        rows[item_type] = [{
+            "id": f"{item_type}-{i}", "item_type": item_type,
+            "title": " ".join(rng.choice(words).capitalize() for _ in range(rng.randint(1, 4))),
+            "popularity": round(rng.paretovariate(1.2), 3),
+        } for i in range(count)]
+    return rows, words
+
+def linear_suggest(rows, prefix, limit):
+    """The same ranking from a scan over every normalized title"""
+    key, matches = normalize(prefix), []
+    for item_type, items in rows.items():
+        for item in items:
+            words = normalize(item["title"]).split(" ")
+            title_match = " ".join(words).startswith(key)
+            if title_match or any(" ".join(words[i:]).startswith(key) for i in range(1, len(words))):
+                matches.append((not title_match, -item["popularity"], item["title"], item["id"]))
+    return [m[3] for m in sorted(matches)[:limit]]
+
+def timed(fn, repeat):
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return summarize_latencies(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the title suggestion prefix index")
+    parser.add_argument("--titles", type=int, default=50000, help="Titles per item type")
+    parser.add_argument("--limit", type=int, default=8)
+    parser.add_argument("--prefixes", type=int, default=200, help="Random prefixes per length")
+    parser.add_argument("--repeat", type=int, default=2000, help="Timed lookups per prefix length")
+    parser.add_argument("--linear-repeat", type=int, default=3, help="Timed linear scans per prefix length")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="Result file (default: bench_results/suggest-<commit>.json)")
+    args = parser.parse_args()
+
+    rows, words = make_titles(args.titles, args.seed)
+    start = time.perf_counter()
+    indexes = {item_type: SuggestIndex(items) for item_type, items in rows.items()}
+    build_s = time.perf_counter() - start
+    size_mb = sum(index.nbytes() for index in indexes.values()) / 1e6
+    print(f"{2 * args.titles:,d} titles indexed in {build_s:.2f}s, {size_mb:.1f} MB of keys and codes")
+
+    rng = random.Random(args.seed)
+    results, mismatches = [], 0
+    for length in range(1, 7):
+        prefixes = [rng.choice(words)[:length] for _ in range(args.prefixes)]
+        for prefix in prefixes[:20]:
+            got = [r["id"] for r in suggest(indexes, prefix, args.limit)]
+            mismatches += got != linear_suggest(rows, prefix, args.limit)
+        n = iter(range(10 ** 9))
+        index_latency = timed(lambda: suggest(indexes, prefixes[next(n) % len(prefixes)], args.limit), args.repeat)
+        linear_latency = timed(lambda: linear_suggest(rows, prefixes[next(n) % len(prefixes)], args.limit),
+                               args.linear_repeat)
+        results.append({"prefix_length": length, "index": index_latency, "linear_scan": linear_latency})
+        print(f"prefix {length} chars  index p50={index_latency['p50_ms']:.4f}ms p99={index_latency['p99_ms']:.4f}ms  "
+              f"linear p50={linear_latency['p50_ms']:.0f}ms")
+    print(f"Mismatches against the linear scan: {mismatches}")
+
+    path = write_results("suggest", {
+        "config": {k: v for k, v in vars(args).items() if k != "output"},
+        "build_s": round(build_s, 3),
+        "index_mb": round(size_mb, 2),
+        "mismatches": mismatches,
+        "lookups": results,
+    }, args.output)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Sync engine benchmark for CineLibre
+Runs api/sync_engine.run_sync against fake TMDB / Google Books servers and an
+in-memory Supabase (scripts/bench_fakes.py), so no API quota is spent.
+
+    pip install -r requirements-bench.txt
+    python scripts/bench_sync.py --movies 300 --books 200
+    python scripts/bench_sync.py --rate-limit-every 20 --slow-every 10 --slow-ms 2000
+    python scripts/bench_sync.py --sleep-scale 1 --real-model   # production pacing and model
+    python scripts/bench_sync.py --shard 2/3 --shard-report /tmp/shard-2.json
+
+Reports per-stage throughput (movies/books crawled, details enriched, texts
+embedded, rows written), the engine's rate-limit sleeps, wall time and peak
+RSS. Results go to bench_results/sync-<commit>.json.
+"""
+import argparse
+import functools
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_common import RssSampler, write_results
+from bench_fakes import FakeEmbedder, FakeGoogleBooksServer, FakeQuery, FakeSupabase, FakeTMDBServer
+
+class StageTimer:
+    """Accumulates calls, items, failures and time per sync stage"""
+
+    def __init__(self):
+        self.stats = {}
+
+    def record(self, stage, seconds, items=1, failed=False):
+        entry = self.stats.setdefault(stage, {"calls": 0, "items": 0, "failures": 0, "seconds": 0.0})
+        entry["calls"] += 1
+        entry["items"] += items
+        entry["failures"] += int(failed)
+        entry["seconds"] += seconds
+
+    def wrap(self, stage, fn, count=lambda result: 1, failed=lambda result: result is None):
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            result = None
+            try:
+                result = fn(*args, **kwargs)
+                return result
+            finally:
+                self.record(stage, time.perf_counter() - start, count(result) if result is not None else 0, failed(result))
+        return timed
+
+    def summary(self):
+        return {
+            stage: {
+                **entry,
+                "seconds": round(entry["seconds"], 3),
+                "items_per_s": round(entry["items"] / entry["seconds"], 2) if entry["seconds"] else None,
+            }
+            for stage, entry in self.stats.items()
+        }
+
+class ScaledTime:
+    """Stands in for the time module inside sync_engine, scaling its sleeps"""
+
+    def __init__(self, scale, timer):
+        self.scale = scale
+        self.timer = timer
+        self.requested_s = 0.0
+
+    def sleep(self, seconds):
+        self.requested_s += seconds
+        start = time.perf_counter()
+        time.sleep(seconds * self.scale)
+        self.timer.record("rate_limit_sleep", time.perf_counter() - start, items=0)
+
+    def __getattr__(self, name):
+        return getattr(time, name)
+
+def load_sync_engine(db, embedder, embed_workers=1, http_cache=None):
+    """Import sync_engine with its clients replaced by the fakes (the real model if embedder is None)"""
+    from api import sync_engine
+    from api.http_cache import HTTPCache
+    sync_engine.context = sync_engine.SyncContext(
+        db=db, model=embedder, embed_workers=embed_workers, http=HTTPCache(http_cache)
+    )
+    return sync_engine
+
+def main():
+    parser = argparse.ArgumentParser(description="CineLibre sync engine benchmark")
+    parser.add_argument("--movies", type=int, default=300, help="MOVIE_TARGET for the run")
+    parser.add_argument("--books", type=int, default=200, help="BOOK_TARGET for the run")
+    parser.add_argument("--discover-pages", type=int, default=5, help="Pages per TMDB discover slice")
+    parser.add_argument("--volumes-per-query", type=int, default=120, help="Volumes per Google Books subject")
+    parser.add_argument("--tmdb-latency-ms", type=float, default=30.0)
+    parser.add_argument("--books-latency-ms", type=float, default=30.0)
+    parser.add_argument("--db-latency-ms", type=float, default=5.0, help="Simulated PostgREST round trip")
+    parser.add_argument("--rate-limit-every", type=int, default=50, help="Every n-th external request gets a 429 (0 disables)")
+    parser.add_argument("--slow-every", type=int, default=40, help="Every n-th external request is slow (0 disables)")
+    parser.add_argument("--slow-ms", type=float, default=1000.0)
+    parser.add_argument("--embed-ms", type=float, default=5.0, help="Stub embedder cost per text")
+    parser.add_argument("--sleep-scale", type=float, default=0.1, help="Multiplier for the engine's rate-limit sleeps")
+    parser.add_argument("--real-model", action="store_true", help="Use the real FastEmbed model instead of the stub")
+    parser.add_argument("--embed-workers", type=int, default=1,
+                        help="Embedding processes with --real-model (the stub always embeds in-process)")
+    parser.add_argument("--http-cache", help="Response cache file; run twice to measure a warm re-run (default: no cache)")
+    parser.add_argument("--ttl-scale", type=float, default=1.0, help="Multiplier for the engine's cache TTLs (0 forces revalidation)")
+    parser.add_argument("--shard", default="1/1", help="Run one shard of the crawl plan, e.g. 2/6")
+    parser.add_argument("--shard-report", help="Also write the engine's run report here (input for --merge)")
+    parser.add_argument("--output", help="Result file (default: bench_results/sync-<commit>.json)")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    faults = {"rate_limit_every": args.rate_limit_every, "slow_every": args.slow_every, "slow_ms": args.slow_ms}
+    # Cache keys include the server URL, so cached runs need stable ports
+    ports = (18431, 18432) if args.http_cache else (0, 0)
+    tmdb = FakeTMDBServer(discover_pages=args.discover_pages, latency_ms=args.tmdb_latency_ms, port=ports[0], **faults).start()
+    books = FakeGoogleBooksServer(volumes_per_query=args.volumes_per_query, latency_ms=args.books_latency_ms,
+                                  port=ports[1], **faults).start()
+    db = FakeSupabase(movies=0, books=0, users=0, ratings=0, interactions=0, latency_ms=args.db_latency_ms)
+
+    os.environ.update({"TMDB_API_KEY": "bench", "MOVIE_TARGET": str(args.movies), "BOOK_TARGET": str(args.books)})
+    sync_engine = load_sync_engine(
+        db, None if args.real_model else FakeEmbedder(cost_ms=args.embed_ms), args.embed_workers, args.http_cache
+    )
+    for ttl in ("TTL_TMDB_DISCOVER", "TTL_TMDB_DETAILS", "TTL_GOOGLE_BOOKS"):
+        setattr(sync_engine, ttl, getattr(sync_engine, ttl) * args.ttl_scale)
+    sync_engine.TMDB_BASE_URL = tmdb.base_url
+    sync_engine.GOOGLE_BOOKS_BASE_URL = books.base_url
+
+    timer = StageTimer()
+    clock = ScaledTime(args.sleep_scale, timer)
+    sync_engine.time = clock
+    sync_engine.get_indian_movies = timer.wrap("crawl_movies", sync_engine.get_indian_movies, count=len, failed=lambda r: False)
+    sync_engine.get_global_books = timer.wrap("crawl_books", sync_engine.get_global_books, count=len, failed=lambda r: False)
+    sync_engine.get_movie_details = timer.wrap("enrich", sync_engine.get_movie_details)
+    # In-process batches only; with --real-model and --embed-workers > 1 the pool's time shows in wall_s
+    sync_engine.embed_batch = timer.wrap("embed", sync_engine.embed_batch, count=len,
+                                         failed=lambda r: any(v is None for v in r))
+    FakeQuery.execute = timer.wrap("write", FakeQuery.execute, failed=lambda r: False)
+
+    start = time.perf_counter()
+    with RssSampler() as rss:
+        run_report = sync_engine.run_sync(sync_engine.Shard.parse(args.shard))
+    wall = time.perf_counter() - start
+    tmdb.stop()
+    books.stop()
+
+    stages = timer.summary()
+    results = {
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "shard_report")},
+        "wall_s": round(wall, 3),
+        "synced": {"movies": len(db.tables["movies"]), "books": len(db.tables["books"])},
+        "stages": stages,
+        "rate_limit_sleep_requested_s": round(clock.requested_s, 3),
+        "servers": {"tmdb": tmdb.stats(), "google_books": books.stats()},
+        "http_cache": sync_engine.context.http.stats,
+        # The engine's own telemetry (python -m api.sync_engine --report), minus the id lists
+        "engine_report": {k: v for k, v in run_report.items() if k not in ("movies", "books")},
+        **rss.summary(),
+    }
+
+    for stage, entry in stages.items():
+        rate = f"{entry['items_per_s']:10.1f} items/s" if entry["items"] else " " * 18
+        print(f"{stage:18s} {entry['items']:6d} items {entry['seconds']:9.2f}s {rate} failures={entry['failures']}")
+    print(f"wall {wall:.2f}s, synced {results['synced']}, peak RSS {results['rss_peak_mb']}MB, "
+          f"429s {tmdb.rate_limited + books.rate_limited}, http cache {results['http_cache']}")
+    print(f"Results written to {write_results('sync', results, args.output)}")
+    if args.shard_report:
+        with open(args.shard_report, "w") as f:
+            json.dump(run_report, f)
+
+if __name__ == "__main__":
+    main()
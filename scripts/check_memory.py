@@ -6,6 +6,8 @@ import psutil
 import os
 import sys
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 def get_process_memory():
     """Get current process memory usage in MB"""
     process = psutil.Process(os.getpid())
@@ -39,11 +41,12 @@ def test_model_loading():
     os.environ["MKL_NUM_THREADS"] = "1"
     os.environ["ONNXRUNTIME_ENABLE_TELEMETRY"] = "0"
     
-    # Load FastEmbed
+    # Load FastEmbed (same model selection as the API, see EMBEDDING_MODEL)
     print("\nLoading FastEmbed model...")
     try:
-        from fastembed import TextEmbedding
-        model = TextEmbedding(model_name="sentence-transformers/all-MiniLM-L6-v2")
+        from api.embeddings import EMBEDDING_MODEL, load_embedding_model
+        print(f"Model: {EMBEDDING_MODEL}")
+        model = load_embedding_model()
         after_model = get_process_memory()
         model_size = after_model - baseline
         print(f"After model load: {after_model:.1f} MB")
@@ -0,0 +1,81 @@
+"""
+Compare two sync run reports (python -m api.sync_engine --report / --merge)
+Prints per-stage throughput, request, failure and wait deltas between a
+baseline run (e.g. last night's) and the current one, and flags
+regressions beyond --threshold.
+
+    python scripts/compare_sync_reports.py previous/sync-report.json sync-report.json
+    python scripts/compare_sync_reports.py old.json new.json --threshold 0.2 --strict
+
+Regressions are printed as GitHub Actions warnings when run in Actions.
+Exits 1 on a regression only with --strict (network variance makes
+nightly runs noisy).
+"""
+import argparse
+import json
+import os
+import sys
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+def total_failures(report):
+    return sum(sum(reasons.values()) for reasons in report.get("failures", {}).values())
+
+def total_rate_limited(report):
+    return sum(r.get("rate_limited", 0) for r in report.get("requests", {}).values())
+
+def change(old, new):
+    if not old:
+        return None
+    return (new - old) / old
+
+def compare(old, new, threshold):
+    """(rows, regressions); rows are (metric, old, new, relative change)"""
+    rows, regressions = [], []
+
+    def check(metric, a, b, worse_if_higher, min_abs=0):
+        rel = change(a, b)
+        rows.append((metric, a, b, rel))
+        if rel is None or abs(b - a) < min_abs:
+            return
+        if (rel > threshold) if worse_if_higher else (rel < -threshold):
+            regressions.append(f"{metric}: {a} -> {b} ({rel:+.0%})")
+
+    check("wall_s", old.get("wall_s", 0), new.get("wall_s", 0), True, min_abs=60)
+    for kind in ("movies", "books"):
+        check(f"{kind}.synced", old[kind]["synced"], new[kind]["synced"], False)
+    for stage in sorted(set(old.get("stages", {})) & set(new.get("stages", {}))):
+        a = old["stages"][stage].get("items_per_s")
+        b = new["stages"][stage].get("items_per_s")
+        if a is not None and b is not None:
+            check(f"{stage}.items_per_s", a, b, False)
+    check("failures", total_failures(old), total_failures(new), True, min_abs=10)
+    check("rate_limited", total_rate_limited(old), total_rate_limited(new), True, min_abs=10)
+    check("rate_limit_wait_s", old.get("rate_limit_wait_s", 0), new.get("rate_limit_wait_s", 0), True, min_abs=60)
+    check("bytes_downloaded", old.get("http_cache", {}).get("bytes_downloaded", 0),
+          new.get("http_cache", {}).get("bytes_downloaded", 0), True, min_abs=10 * 1024 * 1024)
+    return rows, regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two sync run reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.25, help="Relative change that counts as a regression")
+    parser.add_argument("--strict", action="store_true", help="Exit 1 when a regression is found")
+    args = parser.parse_args()
+
+    rows, regressions = compare(load(args.baseline), load(args.current), args.threshold)
+    for metric, a, b, rel in rows:
+        delta = f"{rel:+8.1%}" if rel is not None else " " * 8
+        print(f"{metric:28s} {a:>14} {b:>14} {delta}")
+    for regression in regressions:
+        if os.getenv("GITHUB_ACTIONS"):
+            print(f"::warning title=Sync regression::{regression}")
+        else:
+            print(f"REGRESSION: {regression}")
+    sys.exit(1 if regressions and args.strict else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+Offline comparison of embedding models for CineLibre
+Embeds a sample of the catalog with each candidate model and reports
+throughput, model RSS and how closely each model's nearest neighbours match
+the reference model's (top-k overlap). Useful before changing EMBEDDING_MODEL.
+
+    pip install -r requirements-bench.txt
+    python scripts/eval_embedding_models.py --sample 2000
+    python scripts/eval_embedding_models.py --catalog catalog.jsonl --models \\
+        sentence-transformers/all-MiniLM-L6-v2-int8 BAAI/bge-small-en-v1.5
+
+The catalog sample comes from Supabase (SUPABASE_URL / SUPABASE_KEY) or from
+--catalog, a JSONL file with a "text" field per line. Each model runs in its
+own process so its RSS is measured in isolation. Models are downloaded on
+first use.
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from bench_common import write_results
+from api.embeddings import DEFAULT_EMBEDDING_MODEL
+
+CANDIDATES = [
+    "sentence-transformers/all-MiniLM-L6-v2-int8",
+    "BAAI/bge-small-en-v1.5",
+    "snowflake/snowflake-arctic-embed-xs",
+    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2",
+]
+
+def load_catalog(path, sample):
+    """Texts as the sync engine embeds them: "<title>. <overview/description>\""""
+    if path:
+        with open(path) as f:
+            texts = [json.loads(line)["text"] for line in f if line.strip()]
+        return texts[:sample]
+
+    from supabase import create_client
+    url, key = os.getenv("SUPABASE_URL"), os.getenv("SUPABASE_KEY")
+    if not (url and key):
+        sys.exit("Set SUPABASE_URL / SUPABASE_KEY or pass --catalog")
+    db = create_client(url, key)
+    movies = db.table("movies").select("title, overview").range(0, sample * 2 // 3 - 1).execute().data
+    books = db.table("books").select("title, description").range(0, sample // 3 - 1).execute().data
+    texts = [f"{m['title']}. {m['overview']}" for m in movies if m.get("overview")]
+    texts += [f"{b['title']}. {b['description']}" for b in books if b.get("description")]
+    return texts[:sample]
+
+def embed_in_child(model_name, texts, threads, queue):
+    """Child process: load one model, embed everything, report timings and RSS"""
+    os.environ.setdefault("OMP_NUM_THREADS", str(threads))
+    import psutil
+    from api.embeddings import load_embedding_model
+
+    process = psutil.Process()
+    baseline = process.memory_info().rss
+    start = time.perf_counter()
+    model = load_embedding_model(model_name, threads=threads)
+    list(model.embed(["warmup"]))
+    load_s = time.perf_counter() - start
+    loaded = process.memory_info().rss
+
+    start = time.perf_counter()
+    vectors = np.stack(list(model.embed([t[:2000] for t in texts])))
+    embed_s = time.perf_counter() - start
+    queue.put({
+        "model": model_name,
+        "load_s": round(load_s, 2),
+        "texts_per_s": round(len(texts) / embed_s, 1),
+        "model_rss_mb": round((loaded - baseline) / 1024 / 1024, 1),
+        "peak_rss_mb": round(process.memory_info().rss / 1024 / 1024, 1),
+        "vectors": vectors.astype(np.float32),
+    })
+
+def run_model(model_name, texts, threads):
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    child = ctx.Process(target=embed_in_child, args=(model_name, texts, threads, queue))
+    child.start()
+    result = queue.get()
+    child.join()
+    return result
+
+def top_k(vectors, k):
+    """Indices of each row's k nearest neighbours (cosine), excluding itself"""
+    normed = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    sims = normed @ normed.T
+    np.fill_diagonal(sims, -np.inf)
+    return np.argpartition(-sims, k, axis=1)[:, :k]
+
+def overlap(reference, candidate):
+    return float(np.mean([len(set(r) & set(c)) / len(r) for r, c in zip(reference, candidate)]))
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare embedding models on the CineLibre catalog")
+    parser.add_argument("--models", nargs="+", default=CANDIDATES, help="Candidate models")
+    parser.add_argument("--reference", default=DEFAULT_EMBEDDING_MODEL, help="Model the overlap is measured against")
+    parser.add_argument("--catalog", help="JSONL file with a \"text\" field (default: read from Supabase)")
+    parser.add_argument("--sample", type=int, default=2000)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=1, help="ONNX threads per model (production uses 1)")
+    parser.add_argument("--output", help="Result file (default: bench_results/embedding-models-<commit>.json)")
+    args = parser.parse_args()
+
+    texts = load_catalog(args.catalog, args.sample)
+    if len(texts) <= args.k:
+        sys.exit(f"Need more than {args.k} catalog texts, got {len(texts)}")
+    print(f"Embedding {len(texts)} texts, overlap@{args.k} against {args.reference}")
+
+    reference = run_model(args.reference, texts, args.threads)
+    reference_top = top_k(reference.pop("vectors"), args.k)
+    reference[f"overlap_at_{args.k}"] = 1.0
+    results = [reference]
+    for name in args.models:
+        if name == args.reference:
+            continue
+        result = run_model(name, texts, args.threads)
+        result[f"overlap_at_{args.k}"] = round(overlap(reference_top, top_k(result.pop("vectors"), args.k)), 4)
+        results.append(result)
+
+    print(f"{'model':62s} {'texts/s':>9s} {'load s':>7s} {'RSS MB':>7s} {'overlap':>8s}")
+    for r in results:
+        print(f"{r['model']:62s} {r['texts_per_s']:9.1f} {r['load_s']:7.2f} {r['model_rss_mb']:7.1f} "
+              f"{r[f'overlap_at_{args.k}']:8.3f}")
+
+    path = write_results("embedding-models", {
+        "sample": len(texts), "k": args.k, "threads": args.threads,
+        "reference": args.reference, "models": results,
+    }, args.output)
+    print(f"Results written to {path}")
+
+if __name__ == "__main__":
+    main()
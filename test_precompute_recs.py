@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test that precomputing recommendations stays within a memory bound
+Runs api/precompute_recs.py against the benchmark fakes (scripts/bench_fakes.py)
+with a catalog and rating history too large for dense users x items matrices
+(each would take 1.6GB), so no database or credentials are needed:
+
+    python test_precompute_recs.py
+"""
+import os
+import random
+import sys
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+
+from bench_fakes import FakeSupabase
+from api import precompute_recs
+
+USERS = 20000
+ITEMS = 10000
+RATINGS_PER_USER = 10
+ACTIVE_USERS = 300
+MEMORY_BOUND_MB = 200
+
+def make_db(seed=7):
+    rng = random.Random(seed)
+    db = FakeSupabase(movies=0, books=0, users=0, ratings=0, interactions=0, latency_ms=0)
+    for i in range(ITEMS):
+        db.tables["movies"].append({
+            "id": f"m{i:05d}", "title": f"Movie {i}", "poster_url": None, "language": "en",
+            "genres": [], "embedding": [rng.gauss(0, 1) for _ in range(8)],
+        })
+    recent = datetime.now(timezone.utc).isoformat()
+    old = (datetime.now(timezone.utc) - timedelta(days=365)).isoformat()
+    for user_id in range(1, USERS + 1):
+        # Users rate one of a few tastes, so neighbours share items
+        taste = rng.randrange(50) * (ITEMS // 50)
+        for i in rng.sample(range(ITEMS // 50), RATINGS_PER_USER):
+            db.tables["ratings"].append({
+                "id": len(db.tables["ratings"]) + 1, "user_id": user_id,
+                "item_id": f"m{taste + i:05d}", "item_type": "movie",
+                "rating": rng.choice([2.0, 3.5, 4.0, 4.5, 5.0]),
+                "created_at": recent if user_id <= ACTIVE_USERS else old,
+            })
+    return db
+
+def test_precompute_memory_bound():
+    db = make_db()
+    tracemalloc.start()
+    try:
+        report = precompute_recs.precompute(db, top_n=20, page_size=50000)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert report["active_users"] == ACTIVE_USERS
+    assert report["methods"]["collaborative_filtering"] > 0, report["methods"]
+    assert report["written"] == len(db.tables["user_recommendations"]) > 0
+    assert peak < MEMORY_BOUND_MB * 1e6, f"peak {peak / 1e6:.0f}MB > {MEMORY_BOUND_MB}MB"
+    print(f"✓ precomputed {report['written']} users over {len(db.tables['ratings'])} ratings, "
+          f"peak {peak / 1e6:.0f}MB")
+
+if __name__ == "__main__":
+    test_precompute_memory_bound()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Test that search filter values are matched literally
+Runs the API in-process against the benchmark fakes (scripts/bench_fakes.py),
+so no server, database or credentials are needed:
+
+    python test_search_filters.py
+"""
+import os
+import sys
+
+os.environ.setdefault("ADMISSION_CONTROL", "0")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "scripts"))
+
+from fastapi.testclient import TestClient
+from bench_fakes import FakeEmbedder, FakeSupabase
+from api import main as api_main
+
+def make_client():
+    db = FakeSupabase(movies=20, books=200)
+    api_main.get_db = lambda: db
+    api_main._model = FakeEmbedder()
+    return TestClient(api_main.app), db
+
+def search_books(client, author):
+    response = client.get("/search/semantic", params={
+        "q": "a story", "type": "book", "limit": 50, "threshold": -1, "author": author
+    })
+    assert response.status_code == 200, response.text
+    return response.json()["results"]
+
+def test_escape_like():
+    assert api_main.escape_like("100%") == "100\\%"
+    assert api_main.escape_like("a_b") == "a\\_b"
+    assert api_main.escape_like("c:\\d") == "c:\\\\d"
+    assert api_main.escape_like("Agatha Christie") == "Agatha Christie"
+
+def test_author_wildcards_are_literal():
+    client, db = make_client()
+    author = db.tables["books"][0]["authors"]
+
+    # A real author name still matches, case-insensitively and by substring
+    results = search_books(client, author.split(" ")[0].upper())
+    assert results, "author substring matched nothing"
+    assert all(author.split(" ")[0].lower() in r["authors"].lower() for r in results)
+
+    # No catalog author contains these characters, so nothing may match
+    for pattern in ("%", "_", "%%", "_%_"):
+        results = search_books(client, pattern)
+        assert results == [], f"author={pattern!r} matched {len(results)} books"
+    print("✓ author filter wildcards are matched literally")
+
+if __name__ == "__main__":
+    test_escape_like()
+    test_author_wildcards_are_literal()
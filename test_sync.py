@@ -8,7 +8,6 @@ from api.sync_engine import (
     get_indian_movies, 
     get_global_books, 
     get_embedding,
-    supabase,
     logger
 )
 